@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Cookie 验证缓存 - 短时间内复用验证结果，合并同一 Cookie 的并发验证，并在后台定期重新验证
+"""
+import time
+import asyncio
+import hashlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from api.config import settings
+from api.log import get_logger
+from api.models import UserInfo
+from api.quark_service import QuarkService
+
+logger = get_logger("auth_cache")
+
+
+class VerifyEntry:
+    """一次验证的结果：成功时保存用户信息，失败时保存异常"""
+
+    def __init__(self, user_info: Optional[UserInfo] = None, error: Optional[Exception] = None):
+        self.user_info = user_info
+        self.error = error
+        self.verified_at = time.time()
+
+    @property
+    def is_valid(self) -> bool:
+        return self.error is None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.verified_at
+
+    def is_fresh(self) -> bool:
+        ttl = settings.AUTH_VERIFY_TTL if self.is_valid else settings.AUTH_VERIFY_FAIL_TTL
+        return self.age < ttl
+
+
+class VerifyCache:
+    """
+    Cookie 验证缓存
+
+    以 Cookie 摘要为键：同一账号的多个 Session 共用一份结果；
+    缓存过期后第一个请求发起上游验证，同时到达的其他请求等待同一个结果
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, VerifyEntry] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def make_key(cookies: str) -> str:
+        return hashlib.sha256(cookies.encode('utf-8')).hexdigest()
+
+    def peek(self, cookies: str) -> Optional[VerifyEntry]:
+        """读取缓存的验证结果（不论是否过期），没有时返回 None"""
+        return self._entries.get(self.make_key(cookies))
+
+    async def verify(self, cookies: str, service: Optional[QuarkService] = None,
+                     force: bool = False) -> Tuple[VerifyEntry, bool]:
+        """
+        验证 Cookie，缓存未过期时直接返回缓存结果
+
+        Args:
+            cookies: Cookie 字符串
+            service: 复用的 QuarkService，为空时临时创建
+            force: 忽略缓存重新验证（仍会与进行中的验证合并）
+
+        Returns:
+            (验证结果, 是否来自缓存) 元组
+        """
+        key = self.make_key(cookies)
+        entry = self._entries.get(key)
+        if entry is not None and not force and entry.is_fresh():
+            return entry, True
+
+        task = self._inflight.get(key)
+        if task is None:
+            # 上游验证在独立任务中执行，发起请求的客户端断开也不影响其他等待者
+            task = asyncio.create_task(self._verify_upstream(cookies, service))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task), False
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            self._entries[key] = task.result()
+
+    @staticmethod
+    async def _verify_upstream(cookies: str, service: Optional[QuarkService]) -> VerifyEntry:
+        owned = service is None
+        service = service or QuarkService(cookies=cookies)
+        try:
+            return VerifyEntry(user_info=await service.verify_cookies())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return VerifyEntry(error=e)
+        finally:
+            if owned:
+                await service.aclose()
+
+    def invalidate(self, cookies: str) -> None:
+        self._entries.pop(self.make_key(cookies), None)
+
+    def prune(self, live_cookies: Iterable[str]) -> None:
+        """删除已没有对应 Session 的缓存结果"""
+        live = {self.make_key(cookies) for cookies in live_cookies}
+        for key in [key for key in self._entries if key not in live]:
+            del self._entries[key]
+
+    async def start_refresh_task(self, session_manager) -> None:
+        """
+        启动后台重新验证任务：定期验证进程内缓存的 Session，
+        使失效的 Cookie 在客户端请求之前就被发现，验证结果写入缓存
+
+        每 AUTH_REVERIFY_INTERVAL 秒运行一次，刷新在下次运行前就会过期的结果，
+        客户端请求始终命中未过期的缓存，不需要等待上游验证
+        """
+        semaphore = asyncio.Semaphore(settings.AUTH_REVERIFY_CONCURRENCY)
+
+        async def reverify(session) -> None:
+            async with semaphore:
+                entry, _ = await self.verify(session.cookies, session.manager, force=True)
+            if not entry.is_valid:
+                logger.warning("Session 登录状态已失效", error=str(entry.error))
+
+        while True:
+            await asyncio.sleep(settings.AUTH_REVERIFY_INTERVAL)
+            sessions = list(session_manager.sessions.values())
+            self.prune(session.cookies for session in sessions)
+            # 同一 Cookie 只验证一次，只验证结果在下次运行前就会过期的 Session
+            refresh_age = settings.AUTH_VERIFY_TTL - settings.AUTH_REVERIFY_INTERVAL
+            due = {}
+            for session in sessions:
+                entry = self.peek(session.cookies)
+                if entry is None or not entry.is_valid or entry.age >= refresh_age:
+                    due.setdefault(session.cookies, session)
+            await asyncio.gather(*(reverify(session) for session in due.values()), return_exceptions=True)
+
+
+# 创建全局 VerifyCache 实例
+verify_cache = VerifyCache()
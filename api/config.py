@@ -3,6 +3,7 @@
 API 配置文件
 """
 from typing import Optional
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -19,16 +20,86 @@ class Settings(BaseSettings):
     TOKEN_EXPIRE_HOURS: int = 24  # Token 有效期（小时）
     TOKEN_CLEANUP_INTERVAL: int = 3600  # Session 清理间隔（秒）
 
+    # Session 存储配置
+    SESSION_BACKEND: str = "sqlite"  # sqlite（多 worker 共享、重启不丢失）或 memory（仅当前进程）
+    SESSION_DB_PATH: str = "data/sessions.db"  # SQLite 存储的数据库文件
+    SESSION_MAX_LIVE: int = 1000  # 进程内最多缓存的 Session 数，超出后释放最久未访问的
+    SESSION_IDLE_SECONDS: int = 900  # Session 空闲超过该秒数后释放其 QuarkService 和连接池
+
+    # 登录状态验证配置
+    AUTH_VERIFY_TTL: int = 300  # Cookie 验证成功结果的缓存时间（秒）
+    AUTH_VERIFY_FAIL_TTL: int = 10  # Cookie 验证失败结果的缓存时间（秒）
+    AUTH_REVERIFY_INTERVAL: int = 60  # 后台重新验证的运行间隔（秒），需小于 AUTH_VERIFY_TTL，在缓存过期前刷新
+    AUTH_REVERIFY_CONCURRENCY: int = 4  # 后台重新验证的并发数
+
     # 服务器配置
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = 1  # uvicorn worker 进程数，大于 1 时需使用 sqlite 存储
+
+    # 下载配置
+    DOWNLOAD_DIR: str = "downloads"  # 服务端下载保存目录
+    DOWNLOAD_MAX_JOBS: int = 2  # 同时运行的下载任务数
+    DOWNLOAD_CONCURRENCY: int = 3  # 单个下载任务默认并发文件数
+    DOWNLOAD_MAX_CONCURRENCY: int = 8  # 单个下载任务允许的最大并发文件数
+    DOWNLOAD_CHUNK_SIZE: int = 64 * 1024  # 流式读写的数据块大小（字节）
+    DOWNLOAD_SMALL_FILE_BYTES: int = 8 * 1024 ** 2  # 小于该大小的文件走快速通道
+    DOWNLOAD_EST_BYTES_PER_SEC: int = 5 * 1024 ** 2  # 单个连接的预估下载速度，用于预估完成时间
+    ZIP_PREFETCH_FILES: int = 2  # ZIP 流式打包时预取的后续文件数
+
+    # 本地内容缓存配置
+    CACHE_ENABLED: bool = True  # 是否缓存下载过的文件
+    CACHE_DIR: str = "cache"  # 缓存目录
+    CACHE_MAX_BYTES: int = 10 * 1024 ** 3  # 缓存占用磁盘上限（字节），超出后按 LRU 淘汰
+
+    # 批量分享配置
+    SHARE_MAX_JOBS: int = 2  # 同时运行的批量分享任务数
+    SHARE_CONCURRENCY: int = 5  # 单个批量分享任务默认并发数
+    SHARE_MAX_CONCURRENCY: int = 10  # 单个批量分享任务允许的最大并发数
+    SHARE_MIN_INTERVAL: float = 0.2  # 相邻两次创建分享之间的最小间隔（秒）
+    BATCH_DELAY_MIN: float = 2.0  # 批量转存时相邻两个链接之间随机等待的下限（秒）
+    BATCH_DELAY_MAX: float = 4.0  # 批量转存时相邻两个链接之间随机等待的上限（秒）
+
+    # 夸克网盘接口地址（为空时请求夸克网盘；设置后所有接口都发往该地址，用于本地模拟服务 bench/mock_server.py）
+    QUARK_BASE_URL: Optional[str] = None
 
     # CORS 配置
     CORS_ORIGINS: list = ["*"]
 
+    # 性能指标配置
+    METRICS_ENABLED: bool = True  # 是否开放 /metrics 接口（Prometheus 文本格式）
+
+    # 请求追踪配置
+    TRACE_ENABLED: bool = True  # 是否记录请求和后台任务的阶段耗时
+    TRACE_SERVER_TIMING: bool = False  # 是否对所有请求返回 Server-Timing 响应头（否则仅在请求头带 X-Debug-Timing: 1 时返回）
+    TRACE_MAX_SPANS: int = 500  # 单个 trace 保留的 span 明细上限，超出部分只计入汇总
+    TRACE_EXPORT_URL: Optional[str] = None  # trace 导出地址，设置后以 JSON 批量 POST
+
+    # 性能分析配置
+    ADMIN_TOKEN: Optional[str] = None  # 运维令牌（X-Admin-Token），未设置时按需性能分析不可用
+    PROFILE_DIR: str = "logs"  # 性能分析文件保存目录
+    PROFILE_SAMPLE_INTERVAL: float = 0.005  # 采样分析的采样间隔（秒）
+    PROFILE_MAX_SECONDS: int = 300  # 运维接口单次分析窗口的最长时间（秒）
+
+    # 事件循环监控配置
+    LOOP_MONITOR_ENABLED: bool = True  # 是否监控事件循环调度延迟
+    LOOP_MONITOR_INTERVAL: float = 0.1  # 测量间隔（秒）
+    LOOP_SLOW_THRESHOLD: float = 0.1  # 事件循环阻塞超过该时长（秒）时记录其调用栈
+
     # 日志配置
     LOG_LEVEL: str = "INFO"
     LOG_FILE: Optional[str] = "logs/api.log"
+    LOG_MAX_BYTES: int = 10 * 1024 ** 2  # 单个日志文件大小上限，超出后轮转
+    LOG_BACKUP_COUNT: int = 5  # 保留的历史日志文件数
+    LOG_DEBUG_SAMPLE_RATE: int = 10  # 轮询类调试日志每 N 条保留 1 条
+
+    @model_validator(mode="after")
+    def check_reverify_interval(self) -> "Settings":
+        # 后台重新验证需在缓存结果过期前完成，否则客户端请求仍要等待上游验证
+        if not 0 < self.AUTH_REVERIFY_INTERVAL < self.AUTH_VERIFY_TTL:
+            raise ValueError(f"AUTH_REVERIFY_INTERVAL（{self.AUTH_REVERIFY_INTERVAL}）需大于 0 且小于 "
+                             f"AUTH_VERIFY_TTL（{self.AUTH_VERIFY_TTL}）")
+        return self
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+本地内容缓存 - 以 fid + 文件哈希为键的磁盘缓存，超出容量时按 LRU 淘汰
+"""
+import os
+import uuid
+import shutil
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional
+
+from api.config import settings
+
+# 临时文件后缀，未完成的写入不会被当作缓存命中
+TMP_SUFFIX = '.tmp'
+
+
+def content_hash(info: Dict[str, Any]) -> str:
+    """从文件信息中提取内容哈希，没有哈希字段时退化为 大小+修改时间"""
+    for field in ('md5', 'hash', 'sha1'):
+        if info.get(field):
+            return str(info[field])
+    return f"{info.get('size', 0)}-{info.get('updated_at') or info.get('l_updated_at', 0)}"
+
+
+class ContentCache:
+    """磁盘内容缓存 - 写入临时文件后通过 rename 原子发布，按最近访问顺序淘汰"""
+
+    def __init__(self, root: str, max_bytes: int):
+        """
+        初始化缓存
+
+        Args:
+            root: 缓存目录
+            max_bytes: 缓存占用磁盘空间上限（字节）
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> 文件大小，按访问顺序排列
+        self._total = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    @staticmethod
+    def make_key(fid: str, file_hash: str) -> str:
+        return hashlib.sha1(f"{fid}:{file_hash}".encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def load(self) -> None:
+        """扫描缓存目录重建索引（服务启动时在线程中调用，避免首个请求在事件循环中扫描整个目录）"""
+        with self._lock:
+            self._load()
+
+    def _load(self) -> None:
+        """尚未加载时扫描缓存目录重建索引，按访问时间排序，并清理残留的临时文件（调用方需持有锁）"""
+        if self._loaded:
+            return
+        entries = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if filename.endswith(TMP_SUFFIX):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                        continue
+                    stat = os.stat(path)
+                    entries.append((stat.st_atime, filename, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+        self._loaded = True
+        self._evict()
+
+    def get(self, fid: str, file_hash: str) -> Optional[str]:
+        """
+        查询缓存（涉及文件系统操作，在事件循环中应通过 asyncio.to_thread 调用）
+
+        Returns:
+            命中时返回缓存文件路径，否则返回 None
+        """
+        key = self.make_key(fid, file_hash)
+        with self._lock:
+            self._load()
+            if key not in self._index:
+                return None
+            path = self._path(key)
+            if not os.path.exists(path):
+                self._total -= self._index.pop(key)
+                return None
+            self._index.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def new_tmp_path(self, fid: str, file_hash: str) -> str:
+        """生成写入用的临时文件路径（与正式文件位于同一目录，保证 rename 原子性）"""
+        key = self.make_key(fid, file_hash)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{uuid.uuid4().hex}{TMP_SUFFIX}"
+
+    def publish(self, fid: str, file_hash: str, tmp_path: str) -> str:
+        """将写入完成的临时文件原子地发布为缓存文件"""
+        key = self.make_key(fid, file_hash)
+        path = self._path(key)
+        size = os.path.getsize(tmp_path)
+        if size > self.max_bytes:
+            os.remove(tmp_path)
+            return path
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._load()
+            if key in self._index:
+                self._total -= self._index[key]
+            self._index[key] = size
+            self._index.move_to_end(key)
+            self._total += size
+            self._evict(keep=key)
+        return path
+
+    def store_file(self, fid: str, file_hash: str, src_path: str) -> None:
+        """将已下载的文件加入缓存（优先硬链接，不额外占用磁盘）"""
+        tmp_path = self.new_tmp_path(fid, file_hash)
+        try:
+            os.link(src_path, tmp_path)
+        except OSError:
+            shutil.copyfile(src_path, tmp_path)
+        self.publish(fid, file_hash, tmp_path)
+
+    async def tee(
+        self,
+        fid: str,
+        file_hash: str,
+        chunks: AsyncIterator[bytes],
+        expected_size: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """
+        边透传边写入缓存，数据完整读取后才发布；中途断开则丢弃临时文件
+
+        Args:
+            fid: 文件 ID
+            file_hash: 文件哈希
+            chunks: 上游数据块迭代器
+            expected_size: 预期文件大小，不一致时不发布
+        """
+        tmp_path = self.new_tmp_path(fid, file_hash)
+        f = await asyncio.to_thread(open, tmp_path, 'wb')
+        written = 0
+        completed = False
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(f.write, chunk)
+                written += len(chunk)
+                yield chunk
+            completed = True
+        finally:
+            await asyncio.to_thread(f.close)
+            if completed and (expected_size is None or written == expected_size):
+                await asyncio.to_thread(self.publish, fid, file_hash, tmp_path)
+            else:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """超出容量时淘汰最久未访问的文件（调用方需持有锁）"""
+        while self._total > self.max_bytes and self._index:
+            key, size = next(iter(self._index.items()))
+            if key == keep and len(self._index) == 1:
+                break
+            self._index.pop(key)
+            self._total -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._load()
+            return {"files": len(self._index), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+# 创建全局 ContentCache 实例（未启用时为 None）
+content_cache: Optional[ContentCache] = (
+    ContentCache(settings.CACHE_DIR, settings.CACHE_MAX_BYTES) if settings.CACHE_ENABLED else None
+)
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+下载管理器 - 服务端下载任务与 CDN 流式透传
+"""
+import os
+import time
+import shutil
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from api.config import settings
+from api.content_cache import content_cache, content_hash
+from api.jobs import Job, JobManager
+from api.metrics import record_download, track_job_manager
+from api.quark_service import QuarkService
+from download_scheduler import SizeAwareScheduler
+
+# 每次获取下载地址的文件数量
+DOWNLOAD_URL_BATCH = 50
+
+# 透传给客户端的上游响应头
+PASSTHROUGH_HEADERS = (
+    'content-type', 'content-length', 'content-range', 'content-encoding',
+    'accept-ranges', 'etag', 'last-modified',
+)
+
+
+def safe_relpath(path: str) -> str:
+    """清理相对路径，去除 ..、绝对路径等可能越出下载目录的部分"""
+    parts = [p for p in path.replace('\\', '/').split('/') if p not in ('', '.', '..')]
+    return os.path.join(*parts) if parts else '_'
+
+
+def range_length(range_header: Optional[str], size: int) -> int:
+    """按 Range 请求头计算实际发送的字节数（用于下载量统计），无法解析时按整个文件计算"""
+    if not range_header or not range_header.strip().lower().startswith('bytes='):
+        return size
+    total = 0
+    for part in range_header.split('=', 1)[1].split(','):
+        start, _, end = part.strip().partition('-')
+        try:
+            if not start:
+                # bytes=-N：末尾 N 个字节
+                total += min(int(end), size)
+            else:
+                last = min(int(end), size - 1) if end else size - 1
+                total += max(0, last - int(start) + 1)
+        except ValueError:
+            return size
+    return min(total, size)
+
+
+class DownloadManager:
+    """下载管理器 - 单个任务内并发下载文件，任务之间通过 JobManager 限流"""
+
+    def __init__(self):
+        self.jobs = JobManager(max_running=settings.DOWNLOAD_MAX_JOBS)
+        track_job_manager("download", self.jobs)
+
+    def start_job(
+        self,
+        service: QuarkService,
+        share_url: Optional[str] = None,
+        folder_id: Optional[str] = None,
+        concurrency: Optional[int] = None
+    ) -> Job:
+        """
+        创建下载任务，将分享链接或网盘目录中的文件下载到服务器
+
+        Args:
+            service: 当前账号的 QuarkService
+            share_url: 自己网盘文件的分享链接（与 folder_id 二选一）
+            folder_id: 网盘目录 ID（与 share_url 二选一）
+            concurrency: 单个任务内同时下载的文件数
+
+        Returns:
+            Job 对象
+        """
+        if not share_url and not folder_id:
+            raise Exception("share_url 和 folder_id 不能同时为空")
+
+        concurrency = max(1, min(concurrency or settings.DOWNLOAD_CONCURRENCY, settings.DOWNLOAD_MAX_CONCURRENCY))
+        params = {"share_url": share_url, "folder_id": folder_id, "concurrency": concurrency}
+
+        async def runner(job: Job) -> Dict[str, Any]:
+            return await self._run_job(job, service, share_url, folder_id, concurrency)
+
+        return self.jobs.submit("download", service.account_key, runner, params=params)
+
+    async def _run_job(
+        self,
+        job: Job,
+        service: QuarkService,
+        share_url: Optional[str],
+        folder_id: Optional[str],
+        concurrency: int
+    ) -> Dict[str, Any]:
+        if share_url:
+            files = await service.list_share_files(share_url)
+        else:
+            files = await service.list_folder_files(folder_id)
+
+        save_dir = os.path.join(settings.DOWNLOAD_DIR, job.job_id)
+        job.progress = {
+            "total_files": len(files),
+            "finished_files": 0,
+            "failed_files": 0,
+            "total_bytes": sum(int(f.get('size') or 0) for f in files),
+            "downloaded_bytes": 0,
+        }
+        results: List[Dict[str, Any]] = []
+        items: List[Dict[str, Any]] = []
+
+        # 分批获取下载地址，减少接口调用次数
+        for start in range(0, len(files), DOWNLOAD_URL_BATCH):
+            batch = files[start:start + DOWNLOAD_URL_BATCH]
+            infos = await service.get_download_info([f['fid'] for f in batch])
+            info_map = {info['fid']: info for info in infos}
+            for f in batch:
+                info = info_map.get(f['fid'], {})
+                items.append({**f, "download_url": info.get('download_url'), "hash": content_hash(info)})
+
+        # 按文件大小调度：大文件优先，小文件走快速通道
+        scheduler = SizeAwareScheduler(
+            items,
+            workers=concurrency,
+            small_file_bytes=settings.DOWNLOAD_SMALL_FILE_BYTES,
+            bytes_per_sec=settings.DOWNLOAD_EST_BYTES_PER_SEC
+        )
+        job.progress_reporters["schedule"] = scheduler.report
+
+        def on_chunk(size: int) -> None:
+            job.progress["downloaded_bytes"] += size
+
+        async def worker(worker_index: int) -> None:
+            lane = scheduler.lane_of(worker_index)
+            while True:
+                item = scheduler.next_item(lane)
+                if item is None:
+                    return
+                started = time.time()
+                save_path = os.path.join(save_dir, safe_relpath(item['path']))
+                record = {"fid": item['fid'], "path": item['path'], "size": item.get('size', 0),
+                          "success": False, "error": None}
+                try:
+                    cached = (await asyncio.to_thread(content_cache.get, item['fid'], item['hash'])
+                              if content_cache else None)
+                    if cached:
+                        # 缓存命中：直接从本地复制，不再访问 CDN
+                        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+                        await asyncio.to_thread(shutil.copyfile, cached, save_path)
+                        size = os.path.getsize(save_path)
+                        record_download(size, "cache")
+                        on_chunk(size)
+                    else:
+                        if not item.get('download_url'):
+                            raise Exception("未获取到下载地址")
+                        await self.download_to_file(item['download_url'], save_path, service.headers, on_chunk)
+                        if content_cache:
+                            await asyncio.to_thread(content_cache.store_file, item['fid'], item['hash'], save_path)
+                    record["success"] = True
+                    job.progress["finished_files"] += 1
+                except Exception as e:
+                    record["error"] = str(e) if str(e) else type(e).__name__
+                    job.progress["failed_files"] += 1
+                scheduler.record(int(item.get('size') or 0), time.time() - started)
+                results.append(record)
+
+        try:
+            await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        finally:
+            # 任务结束后固定最终的调度统计
+            scheduler.finished_at = time.time()
+            job.progress_reporters.pop("schedule", None)
+            job.progress["schedule"] = scheduler.report()
+
+        return {"save_dir": save_dir, "files": results}
+
+    @staticmethod
+    async def download_to_file(download_url: str, save_path: str, headers: Dict[str, str], on_chunk=None) -> None:
+        """
+        流式下载单个文件，先写入 .part 临时文件，完成后再重命名
+
+        Args:
+            download_url: 文件下载地址
+            save_path: 保存路径
+            headers: 请求头（需带 Cookie）
+            on_chunk: 每写入一个数据块后的回调，参数为数据块大小
+        """
+        os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+        tmp_path = save_path + '.part'
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            timeout = httpx.Timeout(60.0, connect=60.0)
+            async with client.stream("GET", download_url, headers=headers, timeout=timeout) as response:
+                if response.status_code != 200:
+                    raise Exception(f"HTTP 请求失败，状态码: {response.status_code}")
+                f = await asyncio.to_thread(open, tmp_path, 'wb')
+                try:
+                    async for chunk in response.aiter_bytes(settings.DOWNLOAD_CHUNK_SIZE):
+                        # 文件写入放到线程中执行，避免阻塞事件循环
+                        await asyncio.to_thread(f.write, chunk)
+                        record_download(len(chunk), "job")
+                        if on_chunk:
+                            on_chunk(len(chunk))
+                finally:
+                    await asyncio.to_thread(f.close)
+        os.replace(tmp_path, save_path)
+
+    @staticmethod
+    async def open_stream(
+        service: QuarkService,
+        fid: str,
+        range_header: Optional[str] = None,
+        info: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], httpx.Response, AsyncIterator[bytes]]:
+        """
+        打开上游 CDN 的文件流，用于直接透传给 HTTP 客户端
+
+        Args:
+            service: 当前账号的 QuarkService
+            fid: 文件 ID
+            range_header: 客户端的 Range 请求头，原样转发给 CDN
+            info: 已获取的下载信息，为空时重新获取
+
+        Returns:
+            (文件信息, 上游响应, 数据块迭代器)，迭代结束或中断时自动关闭连接
+        """
+        if info is None:
+            infos = await service.get_download_info([fid])
+            info = infos[0]
+        if not info.get('download_url'):
+            raise Exception("未获取到下载地址")
+
+        headers = dict(service.headers)
+        if range_header:
+            headers['range'] = range_header
+
+        client = httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(60.0, connect=60.0))
+        try:
+            request = client.build_request("GET", info['download_url'], headers=headers)
+            response = await client.send(request, stream=True)
+            if response.status_code not in (200, 206):
+                await response.aclose()
+                raise Exception(f"HTTP 请求失败，状态码: {response.status_code}")
+        except Exception:
+            await client.aclose()
+            raise
+
+        async def iter_chunks() -> AsyncIterator[bytes]:
+            try:
+                # 原样透传字节，不解码、不缓存
+                async for chunk in response.aiter_raw(settings.DOWNLOAD_CHUNK_SIZE):
+                    record_download(len(chunk), "stream")
+                    yield chunk
+            finally:
+                await response.aclose()
+                await client.aclose()
+
+        return info, response, iter_chunks()
+
+
+# 创建全局 DownloadManager 实例
+download_manager = DownloadManager()
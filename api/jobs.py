@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务管理器 - 基于内存的异步任务调度（下载、批量分享等长耗时操作）
+"""
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from api.log import get_logger, job_id_var
+from api.tracing import finish_trace, start_trace
+
+logger = get_logger("jobs")
+
+
+class Job:
+    """后台任务对象"""
+
+    def __init__(self, kind: str, owner: str, params: Optional[Dict[str, Any]] = None):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind
+        self.owner = owner
+        self.params = params or {}
+        self.status = "pending"  # pending / running / success / failed / cancelled
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        # 读取任务时才计算的进度项（如下载剩余时间），避免在执行过程中反复计算
+        self.progress_reporters: Dict[str, Callable[[], Any]] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.records: List[Dict[str, Any]] = []  # 执行过程中逐条产生的结果，可边执行边读取
+        self.timings: Dict[str, Dict[str, float]] = {}  # 各阶段耗时汇总（任务结束后填写）
+        self._task: Optional[asyncio.Task] = None
+        self._changed: Optional[asyncio.Event] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("success", "failed", "cancelled")
+
+    def add_record(self, record: Dict[str, Any]) -> None:
+        """追加一条结果并唤醒正在读取结果的客户端"""
+        self.records.append(record)
+        self.notify()
+
+    def notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def follow_records(self, start: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """
+        按产生顺序读取结果，任务未结束时等待新结果，任务结束后返回
+
+        Args:
+            start: 从第几条结果开始读取
+        """
+        index = start
+        while True:
+            while index < len(self.records):
+                yield self.records[index]
+                index += 1
+            if self.done:
+                return
+            if self._changed is None:
+                self._changed = asyncio.Event()
+            await self._changed.wait()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为接口返回数据"""
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {**self.progress, **{key: report() for key, report in self.progress_reporters.items()}},
+            "result": self.result,
+            "error": self.error,
+            "timings": self.timings,
+        }
+
+
+class JobManager:
+    """任务管理器 - 限制同时运行的任务数，保留最近的任务记录供查询"""
+
+    def __init__(self, max_running: int = 2, max_history: int = 200):
+        """
+        初始化任务管理器
+
+        Args:
+            max_running: 同时运行的任务数上限，超出的任务排队等待
+            max_history: 保留的已结束任务数量上限
+        """
+        self.max_running = max_running
+        self.max_history = max_history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # 延迟创建，确保绑定到运行中的事件循环
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_running)
+        return self._semaphore
+
+    def submit(
+        self,
+        kind: str,
+        owner: str,
+        runner: Callable[[Job], Awaitable[Any]],
+        params: Optional[Dict[str, Any]] = None
+    ) -> Job:
+        """
+        提交后台任务
+
+        Args:
+            kind: 任务类型
+            owner: 任务所属账号标识，仅该账号可查询和取消
+            runner: 任务执行函数，接收 Job 对象，返回值作为任务结果
+            params: 任务参数（用于展示）
+
+        Returns:
+            Job 对象
+        """
+        job = Job(kind=kind, owner=owner, params=params)
+        self.jobs[job.job_id] = job
+        job._task = asyncio.create_task(self._run(job, runner))
+        self._trim_history()
+        return job
+
+    async def _run(self, job: Job, runner: Callable[[Job], Awaitable[Any]]) -> None:
+        # 任务内的日志都带上任务 ID，并单独记录一个 trace（不并入创建任务的请求）
+        job_id_var.set(job.job_id)
+        trace = start_trace(job.job_id, f"job.{job.kind}", job_id=job.job_id, kind=job.kind)
+        try:
+            async with self._get_semaphore():
+                job.status = "running"
+                job.started_at = time.time()
+                logger.info("任务开始", kind=job.kind)
+                job.result = await runner(job)
+                job.status = "success"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e) if str(e) else f"未知错误：{type(e).__name__}"
+        finally:
+            job.finished_at = time.time()
+            finish_trace(trace)
+            if trace is not None:
+                job.timings = trace.summary()
+            logger.info("任务结束", kind=job.kind, status=job.status, error=job.error,
+                        seconds=round(job.finished_at - (job.started_at or job.created_at), 3))
+            job.notify()
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> Optional[Job]:
+        """获取任务，指定 owner 时只返回该账号的任务"""
+        job = self.jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def cancel(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """取消任务"""
+        job = self.get(job_id, owner)
+        if job is None or job.done or job._task is None:
+            return False
+        job._task.cancel()
+        return True
+
+    def running_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "running")
+
+    def pending_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.status == "pending")
+
+    def _trim_history(self) -> None:
+        """超出历史上限时，按提交顺序移除最早结束的任务"""
+        if len(self.jobs) <= self.max_history:
+            return
+        for job_id in [jid for jid, job in self.jobs.items() if job.done]:
+            if len(self.jobs) <= self.max_history:
+                break
+            del self.jobs[job_id]
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+结构化日志 - 日志记录先放入队列，由后台线程写控制台和文件，事件循环中不做同步 I/O
+
+每条日志自动带上当前请求 ID 和任务 ID；调试级别的轮询日志按比例采样
+"""
+import os
+import copy
+import json
+import uuid
+import queue
+import atexit
+import logging
+import itertools
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+
+from api.config import settings
+
+# 当前请求 / 后台任务的关联 ID，由中间件和任务管理器设置
+request_id_var: ContextVar[str] = ContextVar("request_id", default="")
+job_id_var: ContextVar[str] = ContextVar("job_id", default="")
+
+ROOT_LOGGER = "quark"
+_STANDARD_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+
+
+class ContextFilter(logging.Filter):
+    """在调用方的上下文中读取关联 ID（进入队列后就在其他线程了）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.job_id = job_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """对标记了 sample 的调试日志每 rate 条只保留一条，避免轮询日志刷屏"""
+
+    def __init__(self, rate: int):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not getattr(record, "sample", False):
+            return True
+        return next(self._counter) % self.rate == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "job_id"):
+            if getattr(record, key, ""):
+                entry[key] = getattr(record, key)
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """控制台格式：时间 级别 [关联 ID] 消息 key=value ..."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        ids = " ".join(f"{key}={getattr(record, key)}" for key in ("request_id", "job_id")
+                       if getattr(record, key, ""))
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = f"{datetime.fromtimestamp(record.created):%Y-%m-%d %H:%M:%S} {record.levelname:<7} " \
+               f"{'[' + ids + '] ' if ids else ''}{record.getMessage()}{' ' + fields if fields else ''}"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class _QueueHandler(QueueHandler):
+    """入队前只合并消息参数、展开异常堆栈（traceback 不能跨线程保留），其余格式化交给后台线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    支持以关键字参数附加字段：logger.info("转存完成", task_id=task_id)
+
+    sample=True 的调试日志会被采样
+    """
+
+    def process(self, msg: Any, kwargs: Dict[str, Any]):
+        extra = dict(kwargs.pop("extra", None) or {})
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _STANDARD_KWARGS}
+        extra["sample"] = fields.pop("sample", False)
+        if fields:
+            extra["fields"] = fields
+        kwargs["extra"] = extra
+        return msg, kwargs
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """获取模块日志记录器（统一挂在 quark 根记录器下）"""
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+
+class RequestIdMiddleware:
+    """
+    ASGI 中间件：为每个请求设置请求 ID（沿用客户端的 X-Request-ID，没有时生成），并在响应头中返回
+
+    请求中创建的后台任务会继承该请求 ID
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging() -> None:
+    """
+    按 LOG_LEVEL / LOG_FILE 配置日志：控制台输出文本格式，文件输出 JSON 格式（按大小轮转）
+
+    重复调用时直接返回
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handlers = [logging.StreamHandler()]
+    handlers[0].setFormatter(TextFormatter())
+    if settings.LOG_FILE:
+        os.makedirs(os.path.dirname(settings.LOG_FILE) or ".", exist_ok=True)
+        file_handler = RotatingFileHandler(settings.LOG_FILE, maxBytes=settings.LOG_MAX_BYTES,
+                                           backupCount=settings.LOG_BACKUP_COUNT, encoding="utf-8")
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter(settings.LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(settings.LOG_LEVEL.upper())
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
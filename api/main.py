@@ -4,14 +4,18 @@ QuarkPanTool FastAPI 应用主入口
 """
 import os
 import sys
+import json
 import time
 import asyncio
 from contextlib import asynccontextmanager
+from datetime import datetime
 from typing import Optional
 
+from urllib.parse import quote
+
 from fastapi import FastAPI, Header, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, PlainTextResponse
 
 # 添加父目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -29,9 +33,38 @@ from api.models import (
     TaskStatusResponse,
     BatchTransferAndShareRequest,
     BatchTransferAndShareResponse,
+    DownloadJobRequest,
+    ShareJobRequest,
 )
 from api.session_manager import session_manager
+from api.auth_cache import verify_cache
+from api.metrics import LOOP_LAG, record_download, registry as metrics_registry, track_loop_monitor
+from api.log import RequestIdMiddleware, get_logger, setup_logging, shutdown_logging
+from api.tracing import HttpExporter, TracingMiddleware, add_exporter
+from api.profiling import ProfileMiddleware, check_admin_token, profile_window
 from api.quark_service import QuarkService
+from api.download_manager import download_manager, range_length, PASSTHROUGH_HEADERS
+from api.zip_stream import stream_zip
+from api.content_cache import content_cache, content_hash
+from api.share_manager import share_manager
+from traverse import FolderSelector
+from share_groups import ShareGrouper
+from profiler import PROFILE_MODES
+from loop_monitor import LoopLagMonitor
+
+
+logger = get_logger("main")
+
+
+def report_loop_stall(blocked: float, stack: str) -> None:
+    """事件循环阻塞时记录其调用栈（在看门狗线程中调用）"""
+    logger.warning("事件循环阻塞", blocked_ms=round(blocked * 1000, 1), stack=stack)
+
+
+# 创建全局事件循环监控实例
+loop_monitor = LoopLagMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_SLOW_THRESHOLD,
+                              on_lag=LOOP_LAG.observe, on_slow=report_loop_stall)
+track_loop_monitor(loop_monitor)
 
 
 # ==================== 生命周期管理 ====================
@@ -40,17 +73,29 @@ from api.quark_service import QuarkService
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     # 启动时执行
-    print(f"🚀 {settings.APP_NAME} 正在启动...")
-    print(f"📝 API 文档地址: http://{settings.HOST}:{settings.PORT}/docs")
+    setup_logging()
+    if settings.TRACE_EXPORT_URL:
+        add_exporter(HttpExporter(settings.TRACE_EXPORT_URL))
+    logger.info(f"{settings.APP_NAME} 正在启动", docs=f"http://{settings.HOST}:{settings.PORT}/docs")
 
     # 启动 Session 清理任务
     cleanup_task = asyncio.create_task(session_manager.start_cleanup_task())
+    reverify_task = asyncio.create_task(verify_cache.start_refresh_task(session_manager))
+    monitor_task = asyncio.create_task(loop_monitor.run()) if settings.LOOP_MONITOR_ENABLED else None
+    # 在线程中扫描内容缓存目录建立索引，不阻塞事件循环
+    if content_cache:
+        await asyncio.to_thread(content_cache.load)
 
     yield
 
     # 关闭时执行
-    print(f"👋 {settings.APP_NAME} 正在关闭...")
+    logger.info(f"{settings.APP_NAME} 正在关闭")
     cleanup_task.cancel()
+    reverify_task.cancel()
+    if monitor_task:
+        monitor_task.cancel()
+    await session_manager.aclose()
+    shutdown_logging()
 
 
 # ==================== FastAPI 应用初始化 ====================
@@ -71,6 +116,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按需性能分析、请求追踪与请求 ID（后添加的中间件在外层，请求 ID 需先于追踪设置）
+app.add_middleware(ProfileMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+
 
 # ==================== 依赖注入 ====================
 
@@ -98,7 +148,7 @@ async def get_current_service(authorization: Optional[str] = Header(None)) -> Qu
     token = parts[1]
 
     # 获取 Session
-    session = session_manager.get_session(token)
+    session = await session_manager.get_session(token)
     if session is None:
         raise HTTPException(status_code=401, detail="Token 无效或已过期")
 
@@ -135,11 +185,60 @@ async def health_check():
         data={
             "status": "healthy",
             "version": settings.APP_VERSION,
-            "session_count": session_manager.get_session_count(),
+            "session_count": await session_manager.get_session_count(),
+            "live_session_count": session_manager.get_live_session_count(),
+            "coalesced_calls": QuarkService.coalesced_total,
+            "loop_lag_ms": {f"p{q * 100:g}": round(lag * 1000, 3) for q, lag in loop_monitor.percentiles().items()},
         }
     )
 
 
+@app.get("/metrics", tags=["健康检查"], response_class=PlainTextResponse)
+async def metrics():
+    """性能指标接口（Prometheus 文本格式）：上游接口耗时、任务轮询与重试次数、任务队列、并发名额、下载速度"""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="性能指标接口未开启")
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ==================== 运维接口 ====================
+
+@app.post(
+    f"{settings.API_PREFIX}/admin/profile",
+    response_model=ResponseModel,
+    tags=["运维"],
+    summary="性能分析",
+    description="在指定时间窗口内分析服务进程（事件循环线程），分析文件写入 PROFILE_DIR"
+)
+async def profile(mode: str = "sample", seconds: float = 10, x_admin_token: Optional[str] = Header(None)):
+    """
+    按时间窗口进行性能分析
+
+    - **mode**: cprofile（.prof，pstats 格式）或 sample（.folded，火焰图格式）
+    - **seconds**: 分析时长（秒），不超过 PROFILE_MAX_SECONDS
+    - 请求头 **X-Admin-Token** 需与配置的 ADMIN_TOKEN 一致
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="性能分析接口未开启")
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="运维令牌无效")
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode 只能为 {' / '.join(PROFILE_MODES)}")
+    if not 0 < seconds <= settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds 需在 0 到 {settings.PROFILE_MAX_SECONDS} 之间")
+
+    try:
+        path = await profile_window(mode, seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return ResponseModel(
+        code=200,
+        message="性能分析完成",
+        data={"mode": mode, "seconds": seconds, "path": path}
+    )
+
+
 # ==================== 认证相关接口 ====================
 
 @app.post(
@@ -160,14 +259,22 @@ async def login(request: LoginRequest):
         # 创建 QuarkService 实例
         service = QuarkService(cookies=request.cookies)
 
-        # 验证 Cookies 并获取用户信息
-        user_info = await service.verify_cookies()
-
-        # 创建 Session
-        token, session = await session_manager.create_session(
-            cookies=request.cookies,
-            user_id=request.user_id
-        )
+        try:
+            # 验证 Cookies 并获取用户信息（同一 Cookie 的并发登录只验证一次）
+            entry, _ = await verify_cache.verify(request.cookies, service)
+            if not entry.is_valid:
+                raise entry.error
+            user_info = entry.user_info
+
+            # 创建 Session
+            token, session = await session_manager.create_session(
+                cookies=request.cookies,
+                user_id=request.user_id
+            )
+        except BaseException:
+            # 登录失败时 service 不会存入 Session，需要在这里关闭其 HTTP 客户端
+            await service.aclose()
+            raise
 
         # 将 service 实例存储到 session 中
         session.manager = service
@@ -210,7 +317,7 @@ async def get_session_info(authorization: Optional[str] = Header(None)):
         raise HTTPException(status_code=401, detail="Authorization 格式错误")
 
     token = parts[1]
-    info = session_manager.get_session_info(token)
+    info = await session_manager.get_session_info(token)
 
     if info is None:
         raise HTTPException(status_code=401, detail="Token 无效或已过期")
@@ -229,26 +336,32 @@ async def get_session_info(authorization: Optional[str] = Header(None)):
     summary="验证登录状态",
     description="验证当前 Token 对应的夸克网盘登录状态是否有效"
 )
-async def verify_login_status(service: QuarkService = Depends(get_current_service)):
+async def verify_login_status(refresh: bool = False, service: QuarkService = Depends(get_current_service)):
     """
     验证登录状态接口
 
-    通过重新调用夸克网盘的用户信息接口来验证 Cookie 是否仍然有效
+    通过调用夸克网盘的用户信息接口来验证 Cookie 是否仍然有效；
+    验证结果缓存 AUTH_VERIFY_TTL 秒，后台任务会定期重新验证
+
+    - **refresh**: 是否忽略缓存重新验证
 
     Returns:
         - 登录状态有效：返回用户信息
         - 登录状态无效：返回错误信息
     """
     try:
-        # 重新验证 Cookie 是否有效
-        user_info = await service.verify_cookies()
+        entry, cached = await verify_cache.verify(service.cookies, service, force=refresh)
+        if not entry.is_valid:
+            raise entry.error
 
         return ResponseModel(
             code=200,
             message="登录状态有效",
             data={
                 "is_valid": True,
-                "user_info": user_info.model_dump()
+                "user_info": entry.user_info.model_dump(),
+                "cached": cached,
+                "verified_at": datetime.fromtimestamp(entry.verified_at).isoformat()
             }
         )
 
@@ -427,6 +540,293 @@ async def get_task_status(
         )
 
 
+# ==================== 批量分享接口 ====================
+
+@app.post(
+    f"{settings.API_PREFIX}/share/jobs",
+    response_model=ResponseModel,
+    tags=["批量分享"],
+    summary="创建批量分享任务",
+    description="遍历网盘目录，为符合条件的子文件夹批量生成分享链接，任务在后台并发执行"
+)
+async def create_share_job(
+    request: ShareJobRequest,
+    service: QuarkService = Depends(get_current_service)
+):
+    """
+    创建批量分享任务
+
+    - **folder_id**: 网盘目录 ID
+    - **depth**: 遍历深度
+    - **mode**: 分享范围（depth / leaf / all）
+    - **name_glob**: 文件夹名称通配符
+    - **share_expire_type**: 分享时长
+    - **share_url_type**: 分享类型
+    - **share_password**: 分享密码
+    - **concurrency**: 同时分享的文件夹数
+    - **group_mode**: 分组方式，多个文件夹合并为一个分享
+    """
+    try:
+        job = share_manager.start_job(
+            service,
+            folder_id=request.folder_id,
+            selector=FolderSelector(request.mode, depth=request.depth, name_glob=request.name_glob),
+            url_type=request.share_url_type,
+            expired_type=request.share_expire_type,
+            password=request.share_password or '',
+            concurrency=request.concurrency,
+            grouper=ShareGrouper(request.group_mode, size=request.group_size, prefix_len=request.group_prefix_len)
+        )
+
+        return ResponseModel(
+            code=200,
+            message="批量分享任务已创建",
+            data=job.to_dict()
+        )
+
+    except Exception as e:
+        return ResponseModel(
+            code=400,
+            message=f"创建批量分享任务失败: {str(e)}",
+            data=None
+        )
+
+
+@app.get(
+    f"{settings.API_PREFIX}/share/jobs/{{job_id}}",
+    response_model=ResponseModel,
+    tags=["批量分享"],
+    summary="查询批量分享任务",
+    description="查询批量分享任务的状态和进度，任务完成后 result 中包含全部分享结果"
+)
+async def get_share_job(job_id: str, service: QuarkService = Depends(get_current_service)):
+    """查询批量分享任务"""
+    job = share_manager.jobs.get(job_id, owner=service.account_key)
+    if job is None:
+        raise HTTPException(status_code=404, detail="批量分享任务不存在")
+
+    return ResponseModel(
+        code=200,
+        message="查询成功",
+        data=job.to_dict()
+    )
+
+
+@app.get(
+    f"{settings.API_PREFIX}/share/jobs/{{job_id}}/results",
+    tags=["批量分享"],
+    summary="流式获取批量分享结果",
+    description="以 NDJSON 格式逐行返回分享结果，任务执行中时边分享边返回，任务结束后连接关闭"
+)
+async def stream_share_results(job_id: str, start: int = 0, service: QuarkService = Depends(get_current_service)):
+    """
+    流式获取批量分享结果
+
+    - **start**: 从第几条结果开始返回（断线重连时使用）
+    """
+    job = share_manager.jobs.get(job_id, owner=service.account_key)
+    if job is None:
+        raise HTTPException(status_code=404, detail="批量分享任务不存在")
+
+    async def iter_lines():
+        async for record in job.follow_records(start=max(0, start)):
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(iter_lines(), media_type="application/x-ndjson")
+
+
+@app.delete(
+    f"{settings.API_PREFIX}/share/jobs/{{job_id}}",
+    response_model=ResponseModel,
+    tags=["批量分享"],
+    summary="取消批量分享任务",
+    description="取消排队中或执行中的批量分享任务，已生成的分享链接不会撤销"
+)
+async def cancel_share_job(job_id: str, service: QuarkService = Depends(get_current_service)):
+    """取消批量分享任务"""
+    if not share_manager.jobs.cancel(job_id, owner=service.account_key):
+        raise HTTPException(status_code=404, detail="批量分享任务不存在或已结束")
+
+    return ResponseModel(
+        code=200,
+        message="批量分享任务已取消",
+        data={"job_id": job_id}
+    )
+
+
+# ==================== 下载接口 ====================
+
+@app.post(
+    f"{settings.API_PREFIX}/download/jobs",
+    response_model=ResponseModel,
+    tags=["文件下载"],
+    summary="创建服务端下载任务",
+    description="将分享链接或网盘目录中的文件下载到服务器存储，任务在后台并发执行"
+)
+async def create_download_job(
+    request: DownloadJobRequest,
+    service: QuarkService = Depends(get_current_service)
+):
+    """
+    创建下载任务
+
+    - **share_url**: 自己网盘文件的分享链接（与 folder_id 二选一）
+    - **folder_id**: 网盘目录 ID（与 share_url 二选一）
+    - **concurrency**: 同时下载的文件数
+    """
+    try:
+        job = download_manager.start_job(
+            service,
+            share_url=request.share_url,
+            folder_id=request.folder_id,
+            concurrency=request.concurrency
+        )
+
+        return ResponseModel(
+            code=200,
+            message="下载任务已创建",
+            data=job.to_dict()
+        )
+
+    except Exception as e:
+        return ResponseModel(
+            code=400,
+            message=f"创建下载任务失败: {str(e)}",
+            data=None
+        )
+
+
+@app.get(
+    f"{settings.API_PREFIX}/download/jobs/{{job_id}}",
+    response_model=ResponseModel,
+    tags=["文件下载"],
+    summary="查询下载任务",
+    description="查询下载任务的状态、进度和结果"
+)
+async def get_download_job(job_id: str, service: QuarkService = Depends(get_current_service)):
+    """查询下载任务"""
+    job = download_manager.jobs.get(job_id, owner=service.account_key)
+    if job is None:
+        raise HTTPException(status_code=404, detail="下载任务不存在")
+
+    return ResponseModel(
+        code=200,
+        message="查询成功",
+        data=job.to_dict()
+    )
+
+
+@app.delete(
+    f"{settings.API_PREFIX}/download/jobs/{{job_id}}",
+    response_model=ResponseModel,
+    tags=["文件下载"],
+    summary="取消下载任务",
+    description="取消排队中或执行中的下载任务"
+)
+async def cancel_download_job(job_id: str, service: QuarkService = Depends(get_current_service)):
+    """取消下载任务"""
+    if not download_manager.jobs.cancel(job_id, owner=service.account_key):
+        raise HTTPException(status_code=404, detail="下载任务不存在或已结束")
+
+    return ResponseModel(
+        code=200,
+        message="下载任务已取消",
+        data={"job_id": job_id}
+    )
+
+
+@app.get(
+    f"{settings.API_PREFIX}/download/stream/{{fid}}",
+    tags=["文件下载"],
+    summary="流式下载单个文件",
+    description="从夸克 CDN 读取文件并逐块透传给客户端，同时写入本地缓存；缓存命中时直接返回本地文件，支持 Range 请求"
+)
+async def stream_download(
+    fid: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    service: QuarkService = Depends(get_current_service)
+):
+    """
+    流式下载单个文件
+
+    - **fid**: 自己网盘中的文件 ID
+    """
+    try:
+        info = (await service.get_download_info([fid]))[0]
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"获取下载地址失败: {str(e)}")
+
+    file_name = info.get('file_name') or fid
+    file_hash = content_hash(info)
+
+    # 缓存命中：由 FileResponse 直接发送本地文件（支持 Range，服务器支持时走零拷贝）
+    cached = await asyncio.to_thread(content_cache.get, fid, file_hash) if content_cache else None
+    if cached:
+        stat = await asyncio.to_thread(os.stat, cached)
+        record_download(range_length(range_header, stat.st_size), "cache")
+        return FileResponse(cached, stat_result=stat, filename=file_name, content_disposition_type="attachment")
+
+    try:
+        info, upstream, chunks = await download_manager.open_stream(
+            service, fid, range_header=range_header, info=info
+        )
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"获取文件流失败: {str(e)}")
+
+    headers = {k: upstream.headers[k] for k in PASSTHROUGH_HEADERS if k in upstream.headers}
+    headers['content-disposition'] = f"attachment; filename*=UTF-8''{quote(file_name)}"
+
+    # 完整的未编码响应才写入缓存，Range 请求只透传
+    if content_cache and upstream.status_code == 200 and 'content-encoding' not in upstream.headers:
+        content_length = upstream.headers.get('content-length')
+        chunks = content_cache.tee(fid, file_hash, chunks,
+                                   expected_size=int(content_length) if content_length else None)
+
+    return StreamingResponse(
+        chunks,
+        status_code=upstream.status_code,
+        headers=headers,
+        media_type=upstream.headers.get('content-type', 'application/octet-stream')
+    )
+
+
+@app.get(
+    f"{settings.API_PREFIX}/download/zip",
+    tags=["文件下载"],
+    summary="流式打包下载目录",
+    description="遍历分享链接或网盘目录，边下载边输出 ZIP（ZIP64），媒体文件使用存储模式，内存占用恒定"
+)
+async def stream_download_zip(
+    share_url: Optional[str] = None,
+    folder_id: Optional[str] = None,
+    name: Optional[str] = None,
+    service: QuarkService = Depends(get_current_service)
+):
+    """
+    流式打包下载目录
+
+    - **share_url**: 自己网盘文件的分享链接（与 folder_id 二选一）
+    - **folder_id**: 网盘目录 ID（与 share_url 二选一）
+    - **name**: ZIP 文件名（不含扩展名）
+    """
+    try:
+        if share_url:
+            entries = await service.list_share_files(share_url)
+        elif folder_id:
+            entries = await service.list_folder_files(folder_id)
+        else:
+            raise Exception("share_url 和 folder_id 不能同时为空")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"获取目录文件失败: {str(e)}")
+
+    zip_name = f"{name or folder_id or service.get_pwd_id(share_url)}.zip"
+    return StreamingResponse(
+        stream_zip(service, entries, on_chunk=lambda size: record_download(size, "zip")),
+        media_type="application/zip",
+        headers={"content-disposition": f"attachment; filename*=UTF-8''{quote(zip_name)}"}
+    )
+
+
 # ==================== 根路径 ====================
 
 @app.get("/", tags=["首页"])
@@ -445,14 +845,14 @@ async def root():
 if __name__ == "__main__":
     import uvicorn
 
-    # 创建日志目录
-    if settings.LOG_FILE:
-        os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
+    if settings.WORKERS > 1 and settings.SESSION_BACKEND == "memory":
+        print("⚠️ 多 worker 模式下 memory Session 存储无法在进程间共享，请使用 SESSION_BACKEND=sqlite")
 
-    # 启动服务
+    # 启动服务（多 worker 时需以导入字符串的形式传入应用）
     uvicorn.run(
-        app,
+        "api.main:app" if settings.WORKERS > 1 else app,
         host=settings.HOST,
         port=settings.PORT,
+        workers=settings.WORKERS,
         log_level=settings.LOG_LEVEL.lower(),
     )
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+性能指标 - 轻量的 Counter / Gauge / Histogram 实现，以 Prometheus 文本格式导出
+
+所有指标只在事件循环线程中更新，记录一次只是字典查找和整数加法，不加锁
+"""
+import time
+import bisect
+import weakref
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from api.tracing import span
+
+Labels = Tuple[str, ...]
+
+# 上游接口耗时的分桶（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 单个任务轮询次数的分桶
+POLL_BUCKETS = (1, 2, 3, 5, 8, 13, 20, 30, 50)
+# 事件循环调度延迟的分桶（秒）
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Labels, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric(ABC):
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]:
+        ...
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}', *self.samples()]
+
+
+class Counter(Metric):
+    """只增计数器"""
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, description, labels)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.values.items():
+            yield f'{self.name}{_format_labels(self.labels, labels)} {value}'
+
+
+class Gauge(Metric):
+    """瞬时值，在导出时调用 collect 获取 {标签: 值}"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 collect: Optional[Callable[[], Dict[Labels, float]]] = None):
+        super().__init__(name, description, labels)
+        self.collect = collect or (lambda: {})
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect().items():
+            yield f'{self.name}{_format_labels(self.labels, labels)} {value}'
+
+
+class CollectedCounter(Gauge):
+    """导出时调用 collect 读取的累计值（计数由其他线程或对象自行维护）"""
+    kind = 'counter'
+
+
+class Histogram(Metric):
+    """分桶直方图，每个标签组合保存各桶计数、总和与总数"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = buckets
+        self.series: Dict[Labels, List[float]] = {}  # [各桶计数..., +Inf 桶计数, 总和]
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labels, labels)} {series[-1]}'
+            yield f'{self.name}_count{_format_labels(self.labels, labels)} {cumulative}'
+
+
+class RateWindow:
+    """滑动窗口速率：按秒累计，导出最近 window 秒的平均速率"""
+
+    def __init__(self, window: int = 10):
+        self.window = window
+        self._buckets: deque = deque()  # (秒, 数量)
+
+    def add(self, amount: float) -> None:
+        now = int(time.monotonic())
+        if self._buckets and self._buckets[-1][0] == now:
+            self._buckets[-1][1] += amount
+        else:
+            self._buckets.append([now, amount])
+            while self._buckets and self._buckets[0][0] <= now - self.window:
+                self._buckets.popleft()
+
+    def rate(self) -> float:
+        cutoff = int(time.monotonic()) - self.window
+        return sum(amount for second, amount in self._buckets if second > cutoff) / self.window
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 上游接口路径 → 指标中的 endpoint 标签
+UPSTREAM_ENDPOINTS = {
+    '/account/info': 'account',
+    '/1/clouddrive/file': 'mkdir',
+    '/1/clouddrive/file/sort': 'sort',
+    '/1/clouddrive/file/download': 'download_info',
+    '/1/clouddrive/share': 'share',
+    '/1/clouddrive/share/password': 'password',
+    '/1/clouddrive/share/sharepage/token': 'stoken',
+    '/1/clouddrive/share/sharepage/detail': 'detail',
+    '/1/clouddrive/share/sharepage/save': 'save',
+    '/1/clouddrive/task': 'task',
+}
+
+registry = MetricsRegistry()
+
+UPSTREAM_LATENCY = registry.register(Histogram(
+    'quark_upstream_request_seconds', '夸克网盘接口耗时（到响应头返回为止）', ('endpoint',)))
+UPSTREAM_REQUESTS = registry.register(Counter(
+    'quark_upstream_requests_total', '夸克网盘接口请求数', ('endpoint', 'status')))
+TASK_POLLS = registry.register(Histogram(
+    'quark_task_polls', '单个转存/分享任务完成前的轮询次数', ('kind',), buckets=POLL_BUCKETS))
+RETRIES = registry.register(Counter(
+    'quark_retries_total', '失败后重试的次数', ('operation',)))
+COALESCED = registry.register(Counter(
+    'quark_coalesced_calls_total', '与进行中的相同请求合并、未发往上游的调用数', ('method',)))
+DOWNLOAD_BYTES = registry.register(Counter(
+    'quark_download_bytes_total',
+    '下载的字节数（job=服务端下载任务，stream=直接透传，zip=ZIP 打包下载，cache=本地缓存命中）',
+    ('mode',)))
+DOWNLOAD_RATE = RateWindow()
+registry.register(Gauge(
+    'quark_download_bytes_per_second', '最近 10 秒的平均下载速度（字节/秒）',
+    collect=lambda: {(): DOWNLOAD_RATE.rate()}))
+LOOP_LAG = registry.register(Histogram(
+    'quark_event_loop_lag_seconds', '事件循环调度延迟（定时器实际触发时间与预期之差）', buckets=LAG_BUCKETS))
+
+# 任务管理器、并发限制器与事件循环监控在创建时登记，导出时读取当前状态
+_job_managers: Dict[str, object] = {}
+_limiters: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_loop_monitor = None
+
+
+def _collect_jobs() -> Dict[Labels, float]:
+    values: Dict[Labels, float] = {}
+    for kind, manager in _job_managers.items():
+        values[(kind, 'pending')] = manager.pending_count()
+        values[(kind, 'running')] = manager.running_count()
+    return values
+
+
+def _collect_limiters(attr: str) -> Callable[[], Dict[Labels, float]]:
+    def collect() -> Dict[Labels, float]:
+        values: Dict[Labels, float] = {}
+        for limiter, name in list(_limiters.items()):
+            values[(name,)] = values.get((name,), 0) + getattr(limiter, attr)
+        return values
+    return collect
+
+
+registry.register(Gauge('quark_jobs', '后台任务数（pending 为排队中）', ('kind', 'status'), collect=_collect_jobs))
+registry.register(Gauge(
+    'quark_job_slots', '同时运行的任务数上限', ('kind',),
+    collect=lambda: {(kind,): manager.max_running for kind, manager in _job_managers.items()}))
+registry.register(Gauge(
+    'quark_limiter_slots_in_use', '并发限制器已占用的名额', ('name',), collect=_collect_limiters('in_use')))
+registry.register(Gauge(
+    'quark_limiter_slots', '并发限制器的名额总数', ('name',), collect=_collect_limiters('max_concurrency')))
+registry.register(Gauge(
+    'quark_event_loop_lag_recent_seconds', '最近一段时间事件循环调度延迟的分位数（quantile="1" 为最大值）', ('quantile',),
+    collect=lambda: {(f'{q:g}',): lag for q, lag in (_loop_monitor.percentiles() if _loop_monitor else {}).items()}))
+registry.register(CollectedCounter(
+    'quark_event_loop_stalls_total', '事件循环阻塞超过阈值并已记录调用栈的次数',
+    collect=lambda: {(): _loop_monitor.stalls} if _loop_monitor else {}))
+
+
+def track_job_manager(kind: str, manager) -> None:
+    """登记任务管理器，导出其排队和运行中的任务数"""
+    _job_managers[kind] = manager
+
+
+def track_limiter(name: str, limiter) -> None:
+    """登记并发限制器，限制器被回收后自动移除"""
+    _limiters[limiter] = name
+
+
+def track_loop_monitor(monitor) -> None:
+    """登记事件循环延迟监控，导出其最近的延迟分位数和阻塞次数"""
+    global _loop_monitor
+    _loop_monitor = monitor
+
+
+def record_download(size: int, mode: str = 'job') -> None:
+    DOWNLOAD_BYTES.inc(mode, amount=size)
+    DOWNLOAD_RATE.add(size)
+
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """包装 httpx 传输层，按接口记录每个上游请求的耗时和状态"""
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = UPSTREAM_ENDPOINTS.get(request.url.path, 'other')
+        start = time.perf_counter()
+        try:
+            with span(f'upstream.{endpoint}'):
+                response = await self._transport.handle_async_request(request)
+        except Exception:
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, endpoint)
+            UPSTREAM_REQUESTS.inc(endpoint, 'error')
+            raise
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, endpoint)
+        UPSTREAM_REQUESTS.inc(endpoint, f'{response.status_code // 100}xx')
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
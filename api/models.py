@@ -2,7 +2,7 @@
 """
 API 数据模型定义
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field
 
 
@@ -123,6 +123,37 @@ class TaskStatusResponse(BaseModel):
     result: Optional[Dict[str, Any]] = Field(None, description="任务结果")
 
 
+# ==================== 下载相关模型 ====================
+
+class DownloadJobRequest(BaseModel):
+    """创建下载任务请求模型"""
+    share_url: Optional[str] = Field(None, description="自己网盘文件的分享链接（与 folder_id 二选一）")
+    folder_id: Optional[str] = Field(None, description="网盘目录 ID（与 share_url 二选一）")
+    concurrency: Optional[int] = Field(None, description="同时下载的文件数，默认使用服务端配置", ge=1, le=32)
+
+
+# ==================== 批量分享相关模型 ====================
+
+class ShareJobRequest(BaseModel):
+    """创建批量分享任务请求模型"""
+    folder_id: str = Field(..., description="网盘目录 ID，分享该目录下的子文件夹", min_length=1)
+    depth: int = Field(1, description="遍历深度（depth 模式下为目标层级，leaf/all 模式下为最大深度）", ge=1, le=20)
+    mode: Literal["depth", "leaf", "all"] = Field(
+        "depth", description="分享范围：depth=只分享第 depth 级目录 leaf=只分享叶子目录 all=分享 1 到 depth 级的所有目录"
+    )
+    name_glob: str = Field("", description="文件夹名称通配符（如 *2024*），包含 / 时匹配相对路径")
+    share_expire_type: int = Field(2, description="分享时长：1=永久 2=1天 3=7天 4=30天", ge=1, le=4)
+    share_url_type: int = Field(1, description="分享类型：1=公开 2=加密", ge=1, le=2)
+    share_password: Optional[str] = Field("", description="分享密码（加密时需要，为空时随机生成）", max_length=6)
+    concurrency: Optional[int] = Field(None, description="同时分享的文件夹数，默认使用服务端配置", ge=1, le=32)
+    group_mode: Literal["none", "parent", "chunk", "prefix"] = Field(
+        "none", description="分组方式：none=每个文件夹单独分享 parent=同一父目录合并 chunk=同一父目录每 group_size 个合并 "
+                            "prefix=同一父目录下名称前缀相同的合并"
+    )
+    group_size: int = Field(50, description="chunk 分组时每个分享包含的文件夹数", ge=1, le=200)
+    group_prefix_len: int = Field(1, description="prefix 分组时比较的名称前缀长度", ge=1, le=50)
+
+
 # ==================== 错误响应模型 ====================
 
 class ErrorDetail(BaseModel):
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+按需性能分析 - 通过请求头分析一个请求处理期间的事件循环，或由运维接口分析一段时间窗口
+
+两种方式分析的都是整个事件循环线程：同一时间处理的其他请求和后台任务也会计入结果
+
+分析文件写入 PROFILE_DIR：cprofile 模式为 .prof（可用 pstats / snakeviz 查看），
+sample 模式为 .folded（可用 flamegraph.pl / speedscope 查看）；需设置 ADMIN_TOKEN 才会启用
+"""
+import hmac
+import asyncio
+from typing import Optional
+
+from api.config import settings
+from api.log import get_logger
+from profiler import PROFILE_MODES, Profile
+
+logger = get_logger("profiling")
+
+
+def check_admin_token(token: Optional[str]) -> bool:
+    """校验运维令牌，未配置 ADMIN_TOKEN 时一律拒绝"""
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), settings.ADMIN_TOKEN.encode("utf-8"))
+
+
+async def profile_window(mode: str, seconds: float, label: str = "window") -> str:
+    """
+    分析一段时间窗口内事件循环线程的执行情况
+
+    Args:
+        mode: cprofile 或 sample
+        seconds: 窗口时长（秒）
+        label: 文件名中的标签
+
+    Returns:
+        分析文件路径
+
+    Raises:
+        RuntimeError: 已有 cProfile 分析正在进行
+    """
+    profile = Profile(mode, label, settings.PROFILE_DIR, settings.PROFILE_SAMPLE_INTERVAL)
+    profile.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        # cProfile 只能在启用它的线程中停止，因此不放到线程池
+        path = profile.stop()
+    logger.info("性能分析完成", mode=mode, seconds=seconds, path=path)
+    return path
+
+
+class ProfileMiddleware:
+    """
+    ASGI 中间件：请求头带 X-Profile: cprofile|sample 和正确的 X-Admin-Token 时，分析该请求处理期间的事件循环
+
+    分析结果包含同一时间处理的其他请求和后台任务，并非只属于该请求。带分析的请求逐个执行，互不重叠；
+    响应头 X-Profile-Path 返回分析文件路径，X-Profile-Concurrent 返回分析期间（到响应开始为止）
+    同时处理的其他请求数，为 0 时结果才基本只反映该请求。已有 cProfile 分析进行时该请求照常处理、不做分析
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._active = 0  # 正在处理的 HTTP 请求数
+        self._concurrent: Optional[int] = None  # 分析期间同时处理的其他请求数，未在分析时为 None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        self._active += 1
+        if self._concurrent is not None:
+            self._concurrent += 1
+        try:
+            await self._handle(scope, receive, send)
+        finally:
+            self._active -= 1
+
+    async def _handle(self, scope, receive, send):
+        if not settings.ADMIN_TOKEN:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        mode = headers.get(b"x-profile", b"").decode("latin-1").lower()
+        if mode not in PROFILE_MODES or not check_admin_token(headers.get(b"x-admin-token", b"").decode("latin-1")):
+            return await self.app(scope, receive, send)
+
+        # 延迟创建，确保绑定到运行中的事件循环；带分析的请求逐个执行
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            profile = Profile(mode, f'{scope["method"]}{scope["path"]}', settings.PROFILE_DIR,
+                              settings.PROFILE_SAMPLE_INTERVAL)
+            try:
+                profile.start()
+            except RuntimeError as e:
+                logger.warning("跳过请求分析", reason=str(e))
+                return await self.app(scope, receive, send)
+            self._concurrent = self._active - 1
+
+            async def send_with_path(message):
+                if message["type"] == "http.response.start":
+                    message["headers"] = [*message.get("headers", []),
+                                          (b"x-profile-path", profile.path.encode("latin-1")),
+                                          (b"x-profile-concurrent", str(self._concurrent).encode("latin-1"))]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_path)
+            finally:
+                path = profile.stop()
+                concurrent, self._concurrent = self._concurrent, None
+                logger.info("请求性能分析完成", mode=mode, path=path, concurrent_requests=concurrent)
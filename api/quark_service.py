@@ -6,10 +6,14 @@ import sys
 import os
 import re
 import time
+import hashlib
 import random
+import copy
 import asyncio
+import functools
 import httpx
-from typing import Optional, Dict, List, Any
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Any, AsyncIterator, Callable
 
 # 添加父目录到 Python 路径
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -23,20 +27,70 @@ from api.models import (
     BatchTransferResult,
     BatchTransferAndShareResponse,
 )
-from utils import get_timestamp
+from api.log import get_logger
+from api.metrics import COALESCED, RETRIES, TASK_POLLS, MetricsTransport
+from api.tracing import span
+from api.config import settings
+from utils import get_timestamp, quark_url
+import share_ops
+
+logger = get_logger("quark_service")
+
+
+def single_flight(func: Callable) -> Callable:
+    """
+    合并相同参数的并发只读请求：同一 QuarkService 上已有相同请求进行中时，后来的调用直接等待其结果
+
+    调用时传入 coalesce=False 可跳过合并（例如写操作之后需要读到最新数据）
+
+    结果可能是列表、字典等可变对象：最后取得结果的调用方直接使用原对象，其余调用方各得到一份深拷贝，
+    一方修改结果不会影响其他调用方；未发生合并时不产生拷贝
+    """
+    @functools.wraps(func)
+    async def wrapper(self: "QuarkService", *args, coalesce: bool = True, **kwargs):
+        if not coalesce:
+            return await func(self, *args, **kwargs)
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        flight = self._flights.get(key)
+        if flight is None:
+            # 请求在独立任务中执行，发起者被取消也不影响其他等待者
+            flight = [asyncio.create_task(func(self, *args, **kwargs)), 0]  # [任务, 尚未取得结果的调用方数量]
+            self._flights[key] = flight
+            flight[0].add_done_callback(
+                lambda t: self._flights.pop(key, None) if self._flights.get(key) is flight else None)
+        else:
+            self.coalesced_calls[func.__name__] = self.coalesced_calls.get(func.__name__, 0) + 1
+            QuarkService.coalesced_total[func.__name__] = QuarkService.coalesced_total.get(func.__name__, 0) + 1
+            COALESCED.inc(func.__name__)
+        flight[1] += 1
+        try:
+            result = await asyncio.shield(flight[0])
+        finally:
+            flight[1] -= 1
+        # 取得结果后同步完成拷贝，原对象交给最后一个调用方时其他调用方都已拷贝完毕
+        return result if flight[1] == 0 else copy.deepcopy(result)
+    return wrapper
 
 
 class QuarkService:
     """夸克网盘服务封装类 - 完全独立实现，避免依赖 QuarkPanFileManager"""
 
-    def __init__(self, cookies: str):
+    # 所有实例累计被合并的请求数（按方法名）
+    coalesced_total: Dict[str, int] = {}
+
+    def __init__(self, cookies: str, base_url: Optional[str] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
         """
         初始化服务
 
         Args:
             cookies: Cookie 字符串
+            base_url: 接口地址，为空时使用 QUARK_BASE_URL 配置（均未设置时请求夸克网盘）
+            transport: 底层 httpx 传输层（如故障注入的 bench.faults.FaultTransport），默认直接连接
         """
         self.cookies = cookies
+        self.base_url = base_url or settings.QUARK_BASE_URL
+        self.transport = transport
         self.headers: Dict[str, str] = {
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko)'
                           ' Chrome/94.0.4606.71 Safari/537.36 Core/1.94.225.400 QQBrowser/12.2.5544.400',
@@ -45,6 +99,59 @@ class QuarkService:
             'accept-language': 'zh-CN,zh;q=0.9',
             'cookie': self.cookies,
         }
+        # 账号标识（Cookie 摘要），用于区分后台任务归属，避免泄露 Cookie 原文
+        self.account_key = hashlib.sha256(self.cookies.encode('utf-8')).hexdigest()[:16]
+        # 同一账号的所有请求共用一个连接池，Session 释放时关闭
+        self._client: Optional[httpx.AsyncClient] = None
+        self._in_flight = 0
+        self._release_pending = False
+        # 进行中的只读请求，相同参数的并发调用共用一个结果
+        self._flights: Dict[tuple, list] = {}  # 参数 → [进行中的任务, 尚未取得结果的调用方数量]
+        self.coalesced_calls: Dict[str, int] = {}
+
+    def _url(self, path: str, host: str = 'drive-pc.quark.cn') -> str:
+        return quark_url(path, host, self.base_url)
+
+    @asynccontextmanager
+    async def _http(self) -> AsyncIterator[httpx.AsyncClient]:
+        """获取共用的 HTTP 客户端，首次使用时创建"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(transport=MetricsTransport(self.transport))
+            self._release_pending = False
+        self._in_flight += 1
+        try:
+            yield self._client
+        finally:
+            self._in_flight -= 1
+            if self._release_pending and self._in_flight == 0:
+                await self.aclose()
+
+    async def aclose(self) -> None:
+        """
+        关闭连接池；仍有请求进行中时延迟到最后一个请求结束后关闭
+        """
+        if self._in_flight:
+            self._release_pending = True
+            return
+        self._release_pending = False
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.aclose()
+
+    @property
+    def download_headers(self) -> Dict[str, str]:
+        """下载接口使用 PC 客户端 UA，才能绕过网页端的文件大小限制"""
+        return {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                          "quark-cloud-drive/2.5.56 Chrome/100.0.4896.160 Electron/18.3.5.12-a038f7b798 Safari/537.36 "
+                          "Channel/pckk_other_ch",
+            "Accept": "application/json, text/plain, */*",
+            "Content-Type": "application/json",
+            "accept-language": "zh-CN",
+            "origin": "https://pan.quark.cn",
+            "referer": "https://pan.quark.cn/",
+            "cookie": self.cookies,
+        }
 
     async def verify_cookies(self) -> UserInfo:
         """
@@ -62,10 +169,10 @@ class QuarkService:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with self._http() as client:
                 timeout = httpx.Timeout(60.0, connect=60.0)
                 response = await client.get(
-                    'https://pan.quark.cn/account/info',
+                    self._url('/account/info', 'pan.quark.cn'),
                     params=params,
                     headers=self.headers,
                     timeout=timeout
@@ -124,10 +231,10 @@ class QuarkService:
             'dir_init_lock': False,
         }
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             response = await client.post(
-                'https://drive-pc.quark.cn/1/clouddrive/file',
+                self._url('/1/clouddrive/file'),
                 params=params,
                 json=json_data,
                 headers=self.headers,
@@ -145,7 +252,8 @@ class QuarkService:
                 # 目录同名冲突，查询已存在的目录并返回其fid
                 file_list_result = await self.get_sorted_file_list(
                     pdir_fid=parent_dir_id,
-                    size='100'
+                    size='100',
+                    coalesce=False
                 )
 
                 # 在父目录下查找同名文件夹
@@ -169,6 +277,7 @@ class QuarkService:
         """从分享链接中提取 pwd_id"""
         return share_url.split('?')[0].split('/s/')[-1]
 
+    @single_flight
     async def get_stoken(self, pwd_id: str, password: str = '') -> str:
         """获取分享链接的 stoken"""
         params = {
@@ -178,11 +287,11 @@ class QuarkService:
             '__dt': random.randint(100, 9999),
             '__t': get_timestamp(13),
         }
-        api = "https://drive-pc.quark.cn/1/clouddrive/share/sharepage/token"
+        api = self._url('/1/clouddrive/share/sharepage/token')
         data = {"pwd_id": pwd_id, "passcode": password}
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with self._http() as client:
                 timeout = httpx.Timeout(60.0, connect=60.0)
                 response = await client.post(api, json=data, params=params, headers=self.headers, timeout=timeout)
 
@@ -191,7 +300,7 @@ class QuarkService:
                     raise Exception(f"HTTP 请求失败，状态码: {response.status_code}, 响应: {response.text[:200]}")
 
                 json_data = response.json()
-                print(f"[调试] get_stoken 响应: {json_data}")
+                logger.debug("get_stoken 响应", response=json_data)
 
                 # 检查响应状态
                 if not isinstance(json_data, dict):
@@ -218,14 +327,15 @@ class QuarkService:
                 raise
             raise Exception(f"获取 stoken 失败：{error_msg}")
 
+    @single_flight
     async def get_detail(self, pwd_id: str, stoken: str, pdir_fid: str = '0'):
         """获取分享文件详情"""
-        api = "https://drive-pc.quark.cn/1/clouddrive/share/sharepage/detail"
+        api = self._url('/1/clouddrive/share/sharepage/detail')
         page = 1
         file_list: List[Dict[str, Any]] = []
 
         try:
-            async with httpx.AsyncClient() as client:
+            async with self._http() as client:
                 while True:
                     params = {
                         'pr': 'ucpro',
@@ -250,7 +360,7 @@ class QuarkService:
                         raise Exception(f"HTTP 请求失败，状态码: {response.status_code}, 响应: {response.text[:200]}")
 
                     json_data = response.json()
-                    print(f"[调试] get_detail 响应: {json_data}")
+                    logger.debug("get_detail 响应", page=page, response=json_data)
 
                     # 检查响应数据
                     if not isinstance(json_data, dict):
@@ -278,6 +388,7 @@ class QuarkService:
                             "dir": file["dir"],
                             "pdir_fid": file["pdir_fid"],
                             "include_items": file.get("include_items", ''),
+                            "size": file.get("size", 0),
                             "share_fid_token": file["share_fid_token"],
                             "status": file["status"]
                         }
@@ -298,6 +409,7 @@ class QuarkService:
                 raise
             raise Exception(f"获取文件详情失败：{error_msg}")
 
+    @single_flight
     async def get_sorted_file_list(self, pdir_fid='0', page='1', size='100', fetch_total='false', sort=''):
         """获取文件列表"""
         params = {
@@ -314,10 +426,10 @@ class QuarkService:
             '__t': get_timestamp(13),
         }
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             response = await client.get(
-                'https://drive-pc.quark.cn/1/clouddrive/file/sort',
+                self._url('/1/clouddrive/file/sort'),
                 params=params,
                 headers=self.headers,
                 timeout=timeout
@@ -327,7 +439,7 @@ class QuarkService:
     async def get_share_save_task_id(self, pwd_id: str, stoken: str, fid_list: List[str],
                                      share_fid_tokens: List[str], to_pdir_fid: str = '0') -> str:
         """获取转存任务 ID"""
-        task_url = "https://drive.quark.cn/1/clouddrive/share/sharepage/save"
+        task_url = self._url('/1/clouddrive/share/sharepage/save', 'drive.quark.cn')
         params = {
             "pr": "ucpro",
             "fr": "pc",
@@ -345,7 +457,7 @@ class QuarkService:
             "scene": "link"
         }
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             response = await client.post(task_url, json=data, headers=self.headers, params=params, timeout=timeout)
             json_data = response.json()
@@ -362,20 +474,21 @@ class QuarkService:
             await asyncio.sleep(random.randint(500, 1000) / 1000)
 
             submit_url = (
-                f"https://drive-pc.quark.cn/1/clouddrive/task?pr=ucpro&fr=pc&uc_param_str=&"
+                f"{self._url('/1/clouddrive/task')}?pr=ucpro&fr=pc&uc_param_str=&"
                 f"task_id={task_id}&retry_index={i}&__dt=21192&__t={get_timestamp(13)}"
             )
 
             # 网络请求重试机制
             for attempt in range(network_retry_count):
                 try:
-                    async with httpx.AsyncClient() as client:
+                    async with self._http() as client:
                         timeout = httpx.Timeout(60.0, connect=60.0)
                         response = await client.get(submit_url, headers=self.headers, timeout=timeout)
 
                         if response.status_code != 200:
                             if attempt < network_retry_count - 1:
-                                print(f"[警告] 任务查询 HTTP 状态码 {response.status_code}，第 {attempt+1} 次重试...")
+                                RETRIES.inc('save_task_poll')
+                                logger.warning("任务查询 HTTP 状态码异常，重试", task_id=task_id, status_code=response.status_code, attempt=attempt + 1)
                                 await asyncio.sleep(1.0)
                                 continue
                             else:
@@ -386,7 +499,8 @@ class QuarkService:
 
                 except (httpx.ConnectError, httpx.TimeoutException, httpx.ReadError) as e:
                     if attempt < network_retry_count - 1:
-                        print(f"[警告] 网络错误 ({type(e).__name__})，第 {attempt+1} 次重试...")
+                        RETRIES.inc('save_task_poll')
+                        logger.warning("任务查询网络错误，重试", task_id=task_id, error=type(e).__name__, attempt=attempt + 1)
                         await asyncio.sleep(2.0)  # 网络错误时等待更长时间
                         continue
                     else:
@@ -394,7 +508,8 @@ class QuarkService:
                         raise Exception(f"网络连接失败，已重试 {network_retry_count} 次：{type(e).__name__}")
                 except Exception as e:
                     if attempt < network_retry_count - 1 and "JSON" not in str(e):
-                        print(f"[警告] 请求异常 ({str(e)[:50]})，第 {attempt+1} 次重试...")
+                        RETRIES.inc('save_task_poll')
+                        logger.warning("任务查询异常，重试", task_id=task_id, error=str(e)[:200], attempt=attempt + 1)
                         await asyncio.sleep(1.0)
                         continue
                     else:
@@ -403,12 +518,14 @@ class QuarkService:
             # 检查任务状态
             if json_data.get('message') == 'ok':
                 if json_data.get('data') and json_data['data'].get('status') == 2:
-                    print(f"[转存] 任务完成（第 {i+1}/{retry} 次轮询）")
+                    logger.info("转存任务完成", task_id=task_id, polls=i + 1)
+                    TASK_POLLS.observe(i + 1, 'save')
                     return json_data
                 elif json_data.get('data') and json_data['data'].get('status') == 1:
                     # 任务失败
                     raise Exception(f"任务失败：{json_data['data'].get('task_title', '未知错误')}")
                 # status == 0，任务进行中，继续轮询
+                logger.debug("转存任务进行中", task_id=task_id, poll=i + 1, sample=True)
             else:
                 if json_data.get('code') == 32003:
                     raise Exception("转存失败，网盘容量不足")
@@ -451,10 +568,10 @@ class QuarkService:
             'uc_param_str': '',
         }
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             response = await client.post(
-                'https://drive-pc.quark.cn/1/clouddrive/share',
+                self._url('/1/clouddrive/share'),
                 params=params,
                 json=json_data,
                 headers=self.headers,
@@ -497,10 +614,10 @@ class QuarkService:
             # 网络请求重试机制
             for attempt in range(network_retry_count):
                 try:
-                    async with httpx.AsyncClient() as client:
+                    async with self._http() as client:
                         timeout = httpx.Timeout(60.0, connect=60.0)
                         response = await client.get(
-                            'https://drive-pc.quark.cn/1/clouddrive/task',
+                            self._url('/1/clouddrive/task'),
                             params=params,
                             headers=self.headers,
                             timeout=timeout
@@ -508,7 +625,8 @@ class QuarkService:
 
                         if response.status_code != 200:
                             if attempt < network_retry_count - 1:
-                                print(f"[警告] 分享任务查询 HTTP 状态码 {response.status_code}，第 {attempt+1} 次重试...")
+                                RETRIES.inc('share_task_poll')
+                                logger.warning("分享任务查询 HTTP 状态码异常，重试", task_id=task_id, status_code=response.status_code, attempt=attempt + 1)
                                 await asyncio.sleep(1.0)
                                 continue
                             else:
@@ -519,7 +637,8 @@ class QuarkService:
 
                 except (httpx.ConnectError, httpx.TimeoutException, httpx.ReadError) as e:
                     if attempt < network_retry_count - 1:
-                        print(f"[警告] 网络错误 ({type(e).__name__})，第 {attempt+1} 次重试...")
+                        RETRIES.inc('share_task_poll')
+                        logger.warning("任务查询网络错误，重试", task_id=task_id, error=type(e).__name__, attempt=attempt + 1)
                         await asyncio.sleep(2.0)
                         continue
                     else:
@@ -527,7 +646,8 @@ class QuarkService:
                         raise Exception(f"网络连接失败，已重试 {network_retry_count} 次：{type(e).__name__}")
                 except Exception as e:
                     if attempt < network_retry_count - 1 and "JSON" not in str(e):
-                        print(f"[警告] 请求异常 ({str(e)[:50]})，第 {attempt+1} 次重试...")
+                        RETRIES.inc('share_task_poll')
+                        logger.warning("任务查询异常，重试", task_id=task_id, error=str(e)[:200], attempt=attempt + 1)
                         await asyncio.sleep(1.0)
                         continue
                     else:
@@ -542,12 +662,14 @@ class QuarkService:
 
                 # status = 2 表示任务完成
                 if status == 2 and data.get('share_id'):
-                    print(f"[分享] 任务完成（第 {i+1}/{retry} 次轮询）")
+                    logger.info("分享任务完成", task_id=task_id, polls=i + 1)
+                    TASK_POLLS.observe(i + 1, 'share')
                     return data['share_id']
                 # status = 1 表示任务失败
                 elif status == 1:
                     raise Exception(f"分享任务失败：{data.get('task_title', '未知错误')}")
                 # status = 0 或其他表示任务进行中，继续轮询
+                logger.debug("分享任务进行中", task_id=task_id, poll=i + 1, status=status, sample=True)
             else:
                 # 如果响应异常，继续重试
                 continue
@@ -555,6 +677,32 @@ class QuarkService:
         # 超过重试次数
         raise Exception(f"获取分享 ID 超时（已轮询 {retry} 次），任务可能仍在处理中（task_id: {task_id}）")
 
+    async def query_task(self, task_id: str, retry_index: int = 0) -> Dict[str, Any]:
+        """
+        查询一次任务状态（不轮询），返回接口原始 JSON，供共享轮询器使用
+
+        Args:
+            task_id: 任务 ID
+            retry_index: 第几次查询
+        """
+        params = {
+            'pr': 'ucpro',
+            'fr': 'pc',
+            'uc_param_str': '',
+            'task_id': task_id,
+            'retry_index': str(retry_index),
+        }
+
+        async with self._http() as client:
+            timeout = httpx.Timeout(60.0, connect=60.0)
+            response = await client.get(
+                self._url('/1/clouddrive/task'),
+                params=params,
+                headers=self.headers,
+                timeout=timeout
+            )
+            return response.json()
+
     async def submit_share(self, share_id: str) -> tuple:
         """提交分享并获取分享链接"""
         params = {
@@ -567,10 +715,10 @@ class QuarkService:
             'share_id': share_id,
         }
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             response = await client.post(
-                'https://drive-pc.quark.cn/1/clouddrive/share/password',
+                self._url('/1/clouddrive/share/password'),
                 params=params,
                 json=json_data,
                 headers=self.headers,
@@ -586,6 +734,111 @@ class QuarkService:
             else:
                 raise Exception(f"提交分享失败：{result.get('message', '未知错误')}")
 
+    async def get_download_info(self, fids: List[str]) -> List[Dict[str, Any]]:
+        """
+        获取文件下载地址（仅支持自己网盘中的文件）
+
+        Args:
+            fids: 文件 ID 列表
+
+        Returns:
+            下载信息列表，每项包含 fid、file_name、size、download_url 等字段
+        """
+        params = {
+            'pr': 'ucpro',
+            'fr': 'pc',
+            'sys': 'win32',
+            've': '2.5.56',
+            'ut': '',
+            'guid': '',
+        }
+
+        async with self._http() as client:
+            timeout = httpx.Timeout(60.0, connect=60.0)
+            response = await client.post(
+                self._url('/1/clouddrive/file/download'),
+                json={'fids': fids},
+                headers=self.download_headers,
+                params=params,
+                timeout=timeout
+            )
+            json_data = response.json()
+            if json_data.get('status') != 200 or not json_data.get('data'):
+                raise Exception(f"获取下载地址失败：{json_data.get('message', '未知错误')}")
+            return json_data['data']
+
+    async def list_share_files(self, share_url: str) -> List[Dict[str, Any]]:
+        """
+        递归列出分享链接中的所有文件（分享必须来自自己的网盘，否则无法下载）
+
+        Args:
+            share_url: 分享链接
+
+        Returns:
+            文件列表，每项包含 fid、file_name、size 以及相对分享根目录的 path
+        """
+        pwd_id = self.get_pwd_id(share_url).split("#")[0]
+        match_password = re.search("pwd=(.*?)(?=$|&)", share_url)
+        password = match_password.group(1) if match_password else ""
+        if not pwd_id:
+            raise Exception("分享链接格式不正确")
+
+        stoken = await self.get_stoken(pwd_id, password)
+        is_owner, data_list = await self.get_detail(pwd_id, stoken)
+        if is_owner == 0:
+            raise Exception("下载文件必须是自己的网盘内文件，请先转存至网盘，再使用自己网盘的分享链接下载")
+
+        files: List[Dict[str, Any]] = []
+        pending = [("", data_list)]
+        while pending:
+            base_path, items = pending.pop(0)
+            for item in items:
+                path = f"{base_path}/{item['file_name']}" if base_path else item['file_name']
+                if item['dir']:
+                    _, children = await self.get_detail(pwd_id, stoken, pdir_fid=item['fid'])
+                    pending.append((path, children))
+                else:
+                    files.append({"fid": item['fid'], "file_name": item['file_name'],
+                                  "size": item.get('size', 0), "path": path})
+        return files
+
+    async def list_folder_files(self, folder_id: str) -> List[Dict[str, Any]]:
+        """
+        递归列出网盘目录下的所有文件
+
+        Args:
+            folder_id: 网盘目录 ID
+
+        Returns:
+            文件列表，每项包含 fid、file_name、size 以及相对该目录的 path
+        """
+        files: List[Dict[str, Any]] = []
+        pending = [("", folder_id)]
+        while pending:
+            base_path, pdir_fid = pending.pop(0)
+            page = 1
+            while True:
+                json_data = await self.get_sorted_file_list(pdir_fid=pdir_fid, page=str(page), size='100',
+                                                            fetch_total='1', sort='file_type:asc,file_name:asc')
+                if not json_data.get('data'):
+                    raise Exception(f"获取目录文件列表失败：{json_data.get('message', '未知错误')}")
+                for item in json_data['data'].get('list', []):
+                    path = f"{base_path}/{item['file_name']}" if base_path else item['file_name']
+                    if item.get('dir'):
+                        pending.append((path, item['fid']))
+                    else:
+                        files.append({"fid": item['fid'], "file_name": item['file_name'],
+                                      "size": item.get('size', 0), "path": path})
+                metadata = json_data.get('metadata', {})
+                if metadata.get('_size', 0) * metadata.get('_page', page) >= metadata.get('_total', 0):
+                    break
+                page += 1
+        return files
+
+    async def list_child_folders(self, pdir_fid: str, limiter=None) -> List[Dict[str, Any]]:
+        """列出目录下的所有子文件夹，按名称排序（与命令行共用 share_ops.list_child_folders）"""
+        return await share_ops.list_child_folders(self.get_sorted_file_list, pdir_fid, limiter)
+
     async def transfer_and_share(
         self,
         share_url: str,
@@ -610,27 +863,25 @@ class QuarkService:
         Raises:
             Exception: 转存或分享失败时抛出异常
         """
-        print(f"[转存] 开始处理链接: {share_url}")
+        logger.info("开始转存", share_url=share_url)
 
         # 1. 解析分享链接
         pwd_id = self.get_pwd_id(share_url)
         match_password = re.search("pwd=(.*?)(?=$|&)", share_url)
         password = match_password.group(1) if match_password else ""
 
-        print(f"[转存] pwd_id: {pwd_id}, password: {'******' if password else '(无密码)'}")
-
         if not pwd_id:
             raise Exception("分享链接格式不正确")
 
         # 2. 获取 stoken
-        print(f"[转存] 正在获取 stoken...")
-        stoken = await self.get_stoken(pwd_id, password)
-        print(f"[转存] stoken 获取成功")
+        with span("stoken"):
+            stoken = await self.get_stoken(pwd_id, password)
+        logger.debug("stoken 获取成功", pwd_id=pwd_id, has_password=bool(password))
 
         # 3. 获取文件详情
-        print(f"[转存] 正在获取文件详情...")
-        is_owner, data_list = await self.get_detail(pwd_id, stoken)
-        print(f"[转存] 文件详情获取成功，文件数量: {len(data_list)}, is_owner: {is_owner}")
+        with span("detail"):
+            is_owner, data_list = await self.get_detail(pwd_id, stoken)
+        logger.debug("文件详情获取成功", pwd_id=pwd_id, file_count=len(data_list), is_owner=is_owner)
 
         if not data_list:
             raise Exception("分享链接中没有文件")
@@ -656,25 +907,27 @@ class QuarkService:
         fid_list = [i["fid"] for i in data_list]
         share_fid_token_list = [i["share_fid_token"] for i in data_list]
 
-        print(f"[转存] 正在创建转存任务...")
-        task_id = await self.get_share_save_task_id(
-            pwd_id, stoken, fid_list, share_fid_token_list, to_pdir_fid=save_dir_id
-        )
-        print(f"[转存] 转存任务已创建，task_id: {task_id}")
+        with span("save.create"):
+            task_id = await self.get_share_save_task_id(
+                pwd_id, stoken, fid_list, share_fid_token_list, to_pdir_fid=save_dir_id
+            )
+        logger.debug("转存任务已创建", task_id=task_id)
 
         # 6. 等待转存完成
-        print(f"[转存] 等待转存任务完成...")
-        result = await self.submit_task(task_id)
+        with span("save.poll"):
+            result = await self.submit_task(task_id)
         save_dir_name = result['data']['save_as'].get('to_pdir_name', '根目录')
-        print(f"[转存] 转存完成，保存到: {save_dir_name}")
+        logger.info("转存完成", save_dir=save_dir_name)
 
         # 7. 获取转存后的文件 ID 列表(分享转存的文件本身,而不是保存目录)
         # 等待一小段时间，确保文件已经出现在目录中
-        await asyncio.sleep(1.0)
+        with span("settle"):
+            await asyncio.sleep(1.0)
 
         # 获取保存目录下的文件列表
         try:
-            json_data = await self.get_sorted_file_list(pdir_fid=save_dir_id, size='100')
+            with span("list"):
+                json_data = await self.get_sorted_file_list(pdir_fid=save_dir_id, size='100', coalesce=False)
         except Exception as e:
             raise Exception(f"获取目录文件列表失败：{str(e)}")
 
@@ -684,7 +937,7 @@ class QuarkService:
 
         if not json_data['data'].get('list'):
             # 如果目录为空或刚创建，list 可能为空，使用保存目录本身作为分享对象
-            print(f"[调试] 目录 {save_dir_id} 中未找到文件列表，将分享整个目录")
+            logger.debug("保存目录中未找到文件列表，将分享整个目录", save_dir_id=save_dir_id)
             share_fid_list = [save_dir_id]
             target_name = save_dir_name
         else:
@@ -692,7 +945,6 @@ class QuarkService:
             share_fid_list: List[str] = []
             share_file_names: List[str] = []
 
-            print(f"[调试] 开始匹配转存的 {len(data_list)} 个文件")
             for data in data_list:
                 target_file_name = data['file_name']
                 target_is_dir = data['dir']
@@ -704,15 +956,14 @@ class QuarkService:
                         share_fid_list.append(item['fid'])
                         share_file_names.append(item['file_name'])
                         found = True
-                        print(f"[调试] 找到文件: {target_file_name} (fid: {item['fid']})")
                         break
 
                 if not found:
-                    print(f"[调试] 未找到文件: {target_file_name}")
+                    logger.debug("未找到转存后的文件", file_name=target_file_name)
 
             # 如果没有找到任何文件,则使用保存目录(兜底方案)
             if not share_fid_list:
-                print(f"[调试] 未匹配到任何文件，将分享整个保存目录: {save_dir_name}")
+                logger.debug("未匹配到任何文件，将分享整个保存目录", save_dir=save_dir_name)
                 share_fid_list = [save_dir_id]
                 target_name = save_dir_name
             else:
@@ -721,29 +972,27 @@ class QuarkService:
                     target_name = share_file_names[0]
                 else:
                     target_name = f"{share_file_names[0]} 等{len(share_fid_list)}个文件"
-                print(f"[调试] 匹配到 {len(share_fid_list)} 个文件，准备分享")
+                logger.debug("匹配到转存后的文件", matched=len(share_fid_list))
 
         # 8. 生成分享链接
         try:
-            print(f"[调试] 开始创建分享任务，fid_list: {share_fid_list}, 标题: {target_name}")
-            share_task_id = await self.get_share_task_id(
-                fid_list=share_fid_list,
-                file_name=target_name,
-                url_type=share_url_type,
-                expired_type=share_expire_type,
-                password=share_password
-            )
-            print(f"[调试] 分享任务创建成功，task_id: {share_task_id}")
-
-            print(f"[调试] 开始获取分享 ID...")
-            share_id = await self.get_share_id(share_task_id)
-            print(f"[调试] 分享 ID 获取成功: {share_id}")
+            with span("share.create"):
+                share_task_id = await self.get_share_task_id(
+                    fid_list=share_fid_list,
+                    file_name=target_name,
+                    url_type=share_url_type,
+                    expired_type=share_expire_type,
+                    password=share_password
+                )
+            logger.debug("分享任务已创建", task_id=share_task_id, title=target_name)
 
-            print(f"[调试] 开始提交分享...")
-            new_share_url, share_title = await self.submit_share(share_id)
-            print(f"[调试] 分享链接生成成功: {new_share_url}")
+            with span("share.poll"):
+                share_id = await self.get_share_id(share_task_id)
+            with span("share.submit"):
+                new_share_url, share_title = await self.submit_share(share_id)
+            logger.info("分享链接生成成功", share_id=share_id, share_url=new_share_url)
         except Exception as e:
-            print(f"[错误] 生成分享链接失败: {str(e)}")
+            logger.error("生成分享链接失败", error=str(e))
             raise Exception(f"生成分享链接失败: {str(e)}")
 
         # 9. 返回结果
@@ -775,11 +1024,11 @@ class QuarkService:
             Exception: 查询失败时抛出异常
         """
         submit_url = (
-            f"https://drive-pc.quark.cn/1/clouddrive/task?pr=ucpro&fr=pc&uc_param_str=&"
+            f"{self._url('/1/clouddrive/task')}?pr=ucpro&fr=pc&uc_param_str=&"
             f"task_id={task_id}&retry_index=0&__dt=21192&__t={get_timestamp(13)}"
         )
 
-        async with httpx.AsyncClient() as client:
+        async with self._http() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             response = await client.get(submit_url, headers=self.headers, timeout=timeout)
             json_data = response.json()
@@ -843,24 +1092,21 @@ class QuarkService:
         success_count = 0
         failed_count = 0
 
-        print(f"\n{'='*60}")
-        print(f"[批量转存] 开始批量处理，共 {len(share_urls)} 个链接")
-        print(f"{'='*60}\n")
+        logger.info("开始批量转存", total=len(share_urls))
 
         for idx, original_url in enumerate(share_urls, 1):
-            print(f"\n{'─'*60}")
-            print(f"[批量转存] [{idx}/{len(share_urls)}] 正在处理: {original_url}")
-            print(f"{'─'*60}")
+            logger.info("批量转存处理链接", index=idx, total=len(share_urls), share_url=original_url)
 
             try:
                 # 调用单个转存并分享方法
-                result = await self.transfer_and_share(
-                    share_url=original_url,
-                    save_dir_id=save_dir_id,
-                    share_expire_type=share_expire_type,
-                    share_url_type=share_url_type,
-                    share_password=share_password
-                )
+                with span("link", index=idx):
+                    result = await self.transfer_and_share(
+                        share_url=original_url,
+                        save_dir_id=save_dir_id,
+                        share_expire_type=share_expire_type,
+                        share_url_type=share_url_type,
+                        share_password=share_password
+                    )
 
                 # 成功
                 results.append(BatchTransferResult(
@@ -872,7 +1118,7 @@ class QuarkService:
                     share_title=result.share_title
                 ))
                 success_count += 1
-                print(f"✓ [成功] 新分享链接: {result.share_url}")
+                logger.info("批量转存成功", index=idx, share_url=result.share_url)
 
             except Exception as e:
                 # 失败 - 确保错误消息不为空
@@ -886,23 +1132,16 @@ class QuarkService:
                     share_title=None
                 ))
                 failed_count += 1
-                print(f"✗ [失败] {error_msg}")
+                logger.warning("批量转存失败", index=idx, error=error_msg)
 
             # 添加随机延迟，避免请求过快
             # 每处理一个链接后都延迟（包括最后一个），确保服务器不会被限制
             if idx < len(share_urls):
-                delay = random.uniform(2.0, 4.0)  # 增加延迟到 2-4 秒
-                print(f"\n⏳ 等待 {delay:.1f} 秒后处理下一个链接...")
-                await asyncio.sleep(delay)
-
-        # 打印汇总统计
-        print(f"\n{'='*60}")
-        print(f"[批量转存] 处理完成")
-        print(f"{'='*60}")
-        print(f"总计: {len(share_urls)} 个链接")
-        print(f"✓ 成功: {success_count} 个 ({success_count/len(share_urls)*100:.1f}%)")
-        print(f"✗ 失败: {failed_count} 个 ({failed_count/len(share_urls)*100:.1f}%)")
-        print(f"{'='*60}\n")
+                delay = random.uniform(settings.BATCH_DELAY_MIN, settings.BATCH_DELAY_MAX)
+                with span("batch.delay"):
+                    await asyncio.sleep(delay)
+
+        logger.info("批量转存完成", total=len(share_urls), success=success_count, failed=failed_count)
 
         # 返回批量处理结果
         return BatchTransferAndShareResponse(
@@ -1,14 +1,23 @@
 # -*- coding: utf-8 -*-
 """
-Session 管理器 - 基于内存的 Token 和 Session 管理
+Session 管理器 - Token 和 Session 管理，Session 数据保存在可配置的存储后端中
 """
 import uuid
 import time
+import heapq
 import asyncio
 import threading
-from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from api.config import settings
+from api.log import get_logger
+from api.session_store import SessionStore, create_session_store
+
+logger = get_logger("session_manager")
+
+# 最后访问时间的写回间隔（秒），避免每个请求都写存储
+TOUCH_INTERVAL = 60
 
 
 class Session:
@@ -20,6 +29,7 @@ class Session:
         self.created_at = time.time()
         self.expire_at = time.time() + (settings.TOKEN_EXPIRE_HOURS * 3600)
         self.last_access = time.time()
+        self.stored_access = self.last_access  # 已写回存储的最后访问时间
         self.manager = None  # QuarkPanFileManager 实例
 
     def is_expired(self) -> bool:
@@ -30,9 +40,35 @@ class Session:
         """更新最后访问时间"""
         self.last_access = time.time()
 
+    def to_record(self, token: str) -> Dict[str, Any]:
+        """转换为存储记录（不包含 QuarkService 实例）"""
+        return {
+            "token": token,
+            "cookies": self.cookies,
+            "user_id": self.user_id,
+            "created_at": self.created_at,
+            "expire_at": self.expire_at,
+            "last_access": self.last_access,
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Session":
+        """从存储记录恢复 Session，QuarkService 实例在首次使用时创建"""
+        session = cls(cookies=record["cookies"], user_id=record.get("user_id"))
+        session.created_at = record["created_at"]
+        session.expire_at = record["expire_at"]
+        session.last_access = record["last_access"]
+        session.stored_access = record["last_access"]
+        return session
+
 
 class SessionManager:
-    """Session 管理器 - 单例模式"""
+    """
+    Session 管理器 - 单例模式
+
+    Session 数据保存在存储后端（默认 SQLite），多个 worker 进程共享且重启后仍然有效；
+    进程内只缓存 Session 对象及其 QuarkService 实例
+    """
 
     _instance = None
     _lock = threading.Lock()
@@ -45,13 +81,56 @@ class SessionManager:
                     cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self):
+    def __init__(self, store: Optional[SessionStore] = None):
         if self._initialized:
             return
-        self.sessions: Dict[str, Session] = {}
+        self.store = store or create_session_store()
+        # 进程内缓存的 Session，按最近访问排序（最久未访问的在最前）
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # 过期时间最小堆 (expire_at, token)，Session 续期或删除后旧条目在弹出时忽略
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
         self._cleanup_task = None
         self._initialized = True
 
+    def _cache(self, token: str, session: Session) -> None:
+        """加入进程内缓存，并登记过期时间；超出上限时按 LRU 释放最久未访问的 Session"""
+        self.sessions[token] = session
+        self.sessions.move_to_end(token)
+        heapq.heappush(self._expiry_heap, (session.expire_at, token))
+        if len(self._expiry_heap) > 2 * len(self.sessions) + 64:
+            # 旧条目过多时重建堆，避免反复释放、重建的 Session 让堆无限增长
+            self._expiry_heap = [(s.expire_at, t) for t, s in self.sessions.items()]
+            heapq.heapify(self._expiry_heap)
+        while len(self.sessions) > settings.SESSION_MAX_LIVE:
+            _, evicted = self.sessions.popitem(last=False)
+            self._release(evicted)
+        if self._wakeup is not None and self._expiry_heap[0][1] == token:
+            self._wakeup.set()
+
+    def _evict(self, token: str) -> Optional[Session]:
+        session = self.sessions.pop(token, None)
+        if session is not None:
+            self._release(session)
+        return session
+
+    @staticmethod
+    def _release(session: Session) -> None:
+        """释放 Session 的 QuarkService 及其连接池（Session 记录仍保留在存储中，再次访问时重建）"""
+        service, session.manager = session.manager, None
+        if service is None or not hasattr(service, "aclose"):
+            return
+        try:
+            asyncio.get_running_loop().create_task(service.aclose())
+        except RuntimeError:
+            pass
+
+    async def _call_store(self, method: Callable[..., Any], *args: Any) -> Any:
+        """调用存储方法，会阻塞的存储（SQLite）在线程中执行，不占用事件循环"""
+        if self.store.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
     def generate_token(self) -> str:
         """生成唯一 Token"""
         return str(uuid.uuid4())
@@ -75,11 +154,12 @@ class SessionManager:
         session = Session(cookies=cookies, user_id=user_id)
 
         # 存储 Session
-        self.sessions[token] = session
+        await self._call_store(self.store.save, session.to_record(token))
+        self._cache(token, session)
 
         return token, session
 
-    def get_session(self, token: str) -> Optional[Session]:
+    async def get_session(self, token: str) -> Optional[Session]:
         """
         获取 Session
 
@@ -89,21 +169,36 @@ class SessionManager:
         Returns:
             Session 对象或 None
         """
-        session = self.sessions.get(token)
+        # 每次都以存储为准，其他 worker 删除的 Session 在本进程同样失效
+        record = await self._call_store(self.store.load, token)
+        if record is None:
+            self._evict(token)
+            return None
 
+        session = self.sessions.get(token)
         if session is None:
-            return None
+            # 由其他 worker 创建、服务重启前创建或已被释放的 Session
+            session = Session.from_record(record)
+            self._cache(token, session)
+        else:
+            self.sessions.move_to_end(token)
+            if session.expire_at != record["expire_at"]:
+                session.expire_at = record["expire_at"]
+                heapq.heappush(self._expiry_heap, (session.expire_at, token))
 
         # 检查是否过期
         if session.is_expired():
-            self.delete_session(token)
+            await self.delete_session(token)
             return None
 
         # 更新访问时间
         session.update_access()
+        if session.last_access - session.stored_access >= TOUCH_INTERVAL:
+            session.stored_access = session.last_access
+            await self._call_store(self.store.touch, token, session.last_access)
         return session
 
-    def delete_session(self, token: str) -> bool:
+    async def delete_session(self, token: str) -> bool:
         """
         删除 Session
 
@@ -113,40 +208,103 @@ class SessionManager:
         Returns:
             是否删除成功
         """
-        if token in self.sessions:
-            del self.sessions[token]
-            return True
-        return False
-
-    def cleanup_expired_sessions(self):
-        """清理过期的 Session"""
-        current_time = time.time()
-        expired_tokens = [
-            token for token, session in self.sessions.items()
-            if session.is_expired()
-        ]
+        cached = self._evict(token) is not None
+        return await self._call_store(self.store.delete, token) or cached
 
-        for token in expired_tokens:
-            del self.sessions[token]
+    async def expire_due_sessions(self, now: Optional[float] = None) -> int:
+        """
+        从过期堆中弹出已到期的 Session 并删除，每个 Session O(log n)
 
-        if expired_tokens:
-            print(f"[{datetime.now()}] 清理了 {len(expired_tokens)} 个过期 Session")
+        Returns:
+            删除的 Session 数量
+        """
+        now = now or time.time()
+        expired = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expire_at, token = heapq.heappop(self._expiry_heap)
+            session = self.sessions.get(token)
+            # 已删除或已续期的旧条目直接忽略
+            if session is None or session.expire_at != expire_at:
+                continue
+            self._evict(token)
+            await self._call_store(self.store.delete, token)
+            expired += 1
+        return expired
+
+    def release_idle_sessions(self, now: Optional[float] = None) -> int:
+        """释放长时间未访问的 Session（从最久未访问的开始，遇到活跃的即停止）"""
+        deadline = (now or time.time()) - settings.SESSION_IDLE_SECONDS
+        released = 0
+        while self.sessions:
+            token, session = next(iter(self.sessions.items()))
+            if session.last_access > deadline:
+                break
+            self._evict(token)
+            released += 1
+        return released
+
+    async def cleanup_expired_sessions(self):
+        """清理存储中所有过期的 Session（包括其他 worker 缓存的 Session）"""
+        expired_count = await self._call_store(self.store.purge_expired) + await self.expire_due_sessions()
+        if expired_count:
+            logger.info("清理过期 Session", count=expired_count)
+
+    def _next_deadline(self, now: float) -> float:
+        deadlines = [now + settings.TOKEN_CLEANUP_INTERVAL]
+        if self._expiry_heap:
+            deadlines.append(self._expiry_heap[0][0])
+        if self.sessions:
+            deadlines.append(next(iter(self.sessions.values())).last_access + settings.SESSION_IDLE_SECONDS)
+        return min(deadlines)
 
     async def start_cleanup_task(self):
-        """启动定期清理任务"""
-        while True:
-            await asyncio.sleep(settings.TOKEN_CLEANUP_INTERVAL)
-            self.cleanup_expired_sessions()
-
-    def get_session_count(self) -> int:
-        """获取当前 Session 数量"""
+        """
+        启动清理任务：在最近一个 Session 到期或空闲超时时立即处理，
+        并按 TOKEN_CLEANUP_INTERVAL 定期清理存储中其他 worker 的过期 Session
+        """
+        self._wakeup = asyncio.Event()
+        next_purge = time.time() + settings.TOKEN_CLEANUP_INTERVAL
+        try:
+            while True:
+                delay = max(0.0, self._next_deadline(time.time()) - time.time())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+                now = time.time()
+                expired = await self.expire_due_sessions(now)
+                if expired:
+                    logger.info("清理过期 Session", count=expired)
+                self.release_idle_sessions(now)
+                if now >= next_purge:
+                    await self.cleanup_expired_sessions()
+                    next_purge = now + settings.TOKEN_CLEANUP_INTERVAL
+        finally:
+            self._wakeup = None
+
+    async def aclose(self) -> None:
+        """关闭所有缓存 Session 的连接池（服务关闭时调用）"""
+        for session in list(self.sessions.values()):
+            if session.manager is not None and hasattr(session.manager, "aclose"):
+                await session.manager.aclose()
+                session.manager = None
+
+    def get_live_session_count(self) -> int:
+        """获取当前进程内缓存的 Session 数量"""
         return len(self.sessions)
 
-    def get_session_info(self, token: str) -> Optional[Dict]:
+    async def get_session_count(self) -> int:
+        """获取当前 Session 数量（所有 worker 共享的存储中的数量）"""
+        return await self._call_store(self.store.count)
+
+    async def get_session_info(self, token: str) -> Optional[Dict]:
         """获取 Session 信息"""
-        session = self.sessions.get(token)
-        if session is None:
+        record = await self._call_store(self.store.load, token)
+        if record is None:
             return None
+        session = self.sessions.get(token) or Session.from_record(record)
 
         return {
             "token": token,
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Session 存储后端 - 内存存储（单进程）与 SQLite 存储（多 worker 共享、重启不丢失）
+"""
+import os
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+from api.config import settings
+
+
+class SessionStore(ABC):
+    """Session 存储接口，记录字段：token、cookies、user_id、created_at、expire_at、last_access"""
+
+    # 方法会阻塞（磁盘 IO）时为 True，SessionManager 在线程中调用，不占用事件循环
+    blocking = False
+
+    @abstractmethod
+    def save(self, record: Dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def load(self, token: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def delete(self, token: str) -> bool:
+        ...
+
+    @abstractmethod
+    def touch(self, token: str, last_access: float) -> None:
+        """更新最后访问时间"""
+
+    @abstractmethod
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """删除已过期的 Session，返回删除数量"""
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """内存存储 - 仅在单个进程内有效，重启后全部失效"""
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+
+    def save(self, record: Dict[str, Any]) -> None:
+        self._records[record["token"]] = dict(record)
+
+    def load(self, token: str) -> Optional[Dict[str, Any]]:
+        record = self._records.get(token)
+        return dict(record) if record else None
+
+    def delete(self, token: str) -> bool:
+        return self._records.pop(token, None) is not None
+
+    def touch(self, token: str, last_access: float) -> None:
+        if token in self._records:
+            self._records[token]["last_access"] = last_access
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        expired = [token for token, record in self._records.items() if record["expire_at"] <= now]
+        for token in expired:
+            del self._records[token]
+        return len(expired)
+
+    def count(self) -> int:
+        return len(self._records)
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    SQLite 存储 - 多个 uvicorn worker 进程共享同一个数据库文件
+
+    使用 WAL 模式，读写互不阻塞；每个进程持有一个连接，进程内通过锁串行访问。
+    Cookie 以明文保存，数据库文件（及 WAL 文件）权限设为仅所有者可读写
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        """
+        初始化存储
+
+        Args:
+            path: 数据库文件路径
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # 先以 0600 创建数据库文件，SQLite 创建的 -wal、-shm 文件沿用数据库文件的权限
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(path, 0o600)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "token TEXT PRIMARY KEY, cookies TEXT NOT NULL, user_id TEXT, "
+            "created_at REAL NOT NULL, expire_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expire_at ON sessions (expire_at)")
+
+    def save(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (token, cookies, user_id, created_at, expire_at, last_access) "
+                "VALUES (:token, :cookies, :user_id, :created_at, :expire_at, :last_access)",
+                record
+            )
+
+    def load(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT token, cookies, user_id, created_at, expire_at, last_access FROM sessions WHERE token = ?",
+                (token,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("token", "cookies", "user_id", "created_at", "expire_at", "last_access"), row))
+
+    def delete(self, token: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE token = ?", (token,)).rowcount > 0
+
+    def touch(self, token: str, last_access: float) -> None:
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET last_access = ? WHERE token = ?", (last_access, token))
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE expire_at <= ?", (now or time.time(),)).rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store() -> SessionStore:
+    """根据配置创建 Session 存储"""
+    if settings.SESSION_BACKEND == "memory":
+        return MemorySessionStore()
+    if settings.SESSION_BACKEND == "sqlite":
+        return SqliteSessionStore(settings.SESSION_DB_PATH)
+    raise Exception(f"不支持的 Session 存储类型：{settings.SESSION_BACKEND}")
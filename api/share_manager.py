@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+批量分享管理器 - 遍历网盘目录并为子文件夹批量生成分享链接（对应命令行的“批量生成分享链接”）
+"""
+import time
+import random
+import asyncio
+import dataclasses
+from typing import Any, Dict, List, Optional
+
+from api.config import settings
+from api.jobs import Job, JobManager
+from api.metrics import RETRIES, TASK_POLLS, track_job_manager, track_limiter
+from api.quark_service import QuarkService
+from api.tracing import span
+from limiter import ConcurrencyLimiter, TaskPoller
+from share_groups import ShareGroup, ShareGrouper
+from share_ops import share_once
+from share_sink import ShareResult
+from traverse import FolderNode, FolderSelector, walk_folders
+
+# 单个文件夹的最大尝试次数
+SHARE_ATTEMPTS = 3
+
+
+class ShareManager:
+    """批量分享管理器 - 单个任务内并发分享文件夹，任务之间通过 JobManager 限流"""
+
+    def __init__(self):
+        self.jobs = JobManager(max_running=settings.SHARE_MAX_JOBS)
+        track_job_manager("share", self.jobs)
+
+    def start_job(
+        self,
+        service: QuarkService,
+        folder_id: str,
+        selector: FolderSelector,
+        url_type: int = 1,
+        expired_type: int = 2,
+        password: str = '',
+        concurrency: Optional[int] = None,
+        grouper: Optional[ShareGrouper] = None
+    ) -> Job:
+        """
+        创建批量分享任务
+
+        Args:
+            service: 当前账号的 QuarkService
+            folder_id: 网盘目录 ID
+            selector: 文件夹选择器（遍历深度、分享范围、名称过滤）
+            url_type: 分享类型(1=公开 2=加密)
+            expired_type: 分享时长(1=永久 2=1天 3=7天 4=30天)
+            password: 分享密码，加密且为空时随机生成
+            concurrency: 同时分享的文件夹数
+            grouper: 分享分组规则，为空时每个文件夹单独分享
+
+        Returns:
+            Job 对象
+        """
+        concurrency = max(1, min(concurrency or settings.SHARE_CONCURRENCY, settings.SHARE_MAX_CONCURRENCY))
+        params = {
+            "folder_id": folder_id, "depth": selector.depth, "mode": selector.mode, "name_glob": selector.name_glob,
+            "url_type": url_type, "expired_type": expired_type, "concurrency": concurrency,
+            "group_mode": grouper.mode if grouper else 'none',
+        }
+        grouper = grouper or ShareGrouper()
+
+        async def runner(job: Job) -> Dict[str, Any]:
+            return await self._run_job(job, service, folder_id, selector, grouper, url_type, expired_type,
+                                       password, concurrency)
+
+        return self.jobs.submit("share", service.account_key, runner, params=params)
+
+    async def _run_job(
+        self,
+        job: Job,
+        service: QuarkService,
+        folder_id: str,
+        selector: FolderSelector,
+        grouper: ShareGrouper,
+        url_type: int,
+        expired_type: int,
+        password: str,
+        concurrency: int
+    ) -> Dict[str, Any]:
+        # 所有请求共用一个限制器；分享任务由同一个轮询器统一查询
+        limiter = ConcurrencyLimiter(concurrency, min_interval=settings.SHARE_MIN_INTERVAL,
+                                     jitter=settings.SHARE_MIN_INTERVAL)
+        poller = TaskPoller(service.query_task, limiter=limiter,
+                            on_done=lambda task_id, polls: TASK_POLLS.observe(polls, "share"))
+        track_limiter("share", limiter)
+        job.progress = {"found_folders": 0, "shared_folders": 0, "failed_folders": 0, "list_failed_folders": 0,
+                        "share_tasks": 0}
+
+        async def share_group(group: ShareGroup) -> None:
+            first = group.members[0][1]
+            result = ShareResult(seq=group.members[0][0], fid=first.fid, names=first.names, passcode=password)
+            for attempt in range(SHARE_ATTEMPTS):
+                result.attempts = attempt + 1
+                try:
+                    await share_once(service, result, limiter, poller, url_type, expired_type, password,
+                                     fids=group.fids, title=group.title, stage=lambda name: span(f"share.{name}"))
+                    job.progress["shared_folders"] += len(group.members)
+                    break
+                except Exception as e:
+                    result.error = str(e) or type(e).__name__
+                    # 失败后退避重试，不占用并发名额
+                    if attempt < SHARE_ATTEMPTS - 1:
+                        RETRIES.inc("share")
+                        await asyncio.sleep(2 ** attempt + random.random())
+            else:
+                result.status = 'failed'
+                result.timings['total'] = time.time() - result.started_at
+                job.progress["failed_folders"] += len(group.members)
+            job.progress["share_tasks"] += 1
+            # 同一分享中的每个文件夹各自返回一条结果
+            for seq, node in group.members:
+                job.add_record(dataclasses.replace(result, seq=seq, fid=node.fid, names=node.names).to_row())
+
+        def on_list_error(node: FolderNode, e: Exception) -> None:
+            job.progress["list_failed_folders"] += 1
+            job.add_record(ShareResult(seq=0, fid=node.fid, names=node.names, status='list_failed',
+                                       error=str(e) or type(e).__name__).to_row())
+
+        async def list_dirs(fid: str) -> List[Dict[str, Any]]:
+            return await service.list_child_folders(fid, limiter=limiter)
+
+        # 遍历结果以流的方式交给分享 worker，边遍历边分享
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+        async def share_worker() -> None:
+            while True:
+                group = await queue.get()
+                if group is None:
+                    return
+                await share_group(group)
+
+        workers = [asyncio.create_task(share_worker()) for _ in range(concurrency)]
+        try:
+            async for node in walk_folders(list_dirs, folder_id, selector, fan_out=concurrency,
+                                           on_error=on_list_error):
+                job.progress["found_folders"] += 1
+                # 分组装满后立即分享，未装满的分组在遍历结束后分享
+                for group in grouper.add(job.progress["found_folders"], node):
+                    await queue.put(group)
+            for group in grouper.flush():
+                await queue.put(group)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+        return {
+            "total": job.progress["found_folders"],
+            "success_count": job.progress["shared_folders"],
+            "failed_count": job.progress["failed_folders"],
+            "share_tasks": job.progress["share_tasks"],
+            "results": sorted(job.records, key=lambda r: r["seq"]),
+        }
+
+
+# 创建全局 ShareManager 实例
+share_manager = ShareManager()
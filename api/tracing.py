@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+请求追踪 - 记录每个请求/后台任务中各阶段和上游接口的耗时
+
+span 只在当前上下文存在 trace 时记录，开销是两次 perf_counter 和一次列表追加；
+结束后的 trace 交给已登记的导出器（例如发送到外部收集服务）
+"""
+import time
+import asyncio
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from api.config import settings
+from api.log import get_logger, request_id_var
+
+logger = get_logger("tracing")
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("span", default=None)
+
+
+class Trace:
+    """一次请求或后台任务的所有 span"""
+
+    def __init__(self, trace_id: str, name: str, **attrs: Any):
+        self.trace_id = trace_id
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._summary: Dict[str, Dict[str, float]] = {}
+        self._origin = time.perf_counter()
+        self._ids = itertools.count(1)
+
+    def record(self, span_id: int, parent: Optional[int], name: str, start: float, end: float,
+               attrs: Dict[str, Any]) -> None:
+        duration_ms = (end - start) * 1000
+        item = self._summary.get(name)
+        if item is None:
+            item = self._summary[name] = {"count": 0, "total_ms": 0.0}
+        item["count"] += 1
+        item["total_ms"] += duration_ms
+        # 超过上限的 span 只计入汇总，不保留明细
+        if len(self.spans) >= settings.TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append({
+            "id": span_id,
+            "parent": parent,
+            "name": name,
+            "start_ms": round((start - self._origin) * 1000, 3),
+            "duration_ms": round(duration_ms, 3),
+            **attrs,
+        })
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按 span 名称汇总：次数与总耗时（毫秒）"""
+        return {name: {"count": item["count"], "total_ms": round(item["total_ms"], 3)}
+                for name, item in self._summary.items()}
+
+    def server_timing(self) -> str:
+        """生成 Server-Timing 响应头"""
+        parts = [f'{name};dur={item["total_ms"]}' for name, item in self.summary().items()]
+        if self.duration_ms is not None:
+            parts.append(f"total;dur={self.duration_ms}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": self.spans,
+            "dropped_spans": self.dropped,
+            "summary": self.summary(),
+            **self.attrs,
+        }
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """
+    记录一个阶段的耗时，可嵌套；当前上下文没有 trace 时不做任何记录
+
+    Args:
+        name: 阶段名称，如 stoken、save.poll、upstream.detail
+        attrs: 附加到 span 上的字段
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    span_id = next(trace._ids)
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.record(span_id, parent, name, start, time.perf_counter(), attrs)
+
+
+# 已登记的导出器，每个 trace 结束时调用一次
+_exporters: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def add_exporter(exporter: Callable[[Dict[str, Any]], None]) -> None:
+    """登记导出器：接收 trace 字典，不应阻塞（耗时操作请自行放到后台）"""
+    _exporters.append(exporter)
+
+
+def start_trace(trace_id: str, name: str, **attrs: Any) -> Optional[Trace]:
+    """在当前上下文中开始一个 trace，TRACE_ENABLED 关闭时返回 None"""
+    trace = Trace(trace_id, name, **attrs) if settings.TRACE_ENABLED else None
+    _current_trace.set(trace)
+    _current_span.set(None)
+    return trace
+
+
+def finish_trace(trace: Optional[Trace]) -> None:
+    """结束 trace 并交给导出器"""
+    if trace is None or trace.duration_ms is not None:
+        return
+    trace.duration_ms = round((time.perf_counter() - trace._origin) * 1000, 3)
+    if not _exporters:
+        return
+    data = trace.to_dict()
+    for exporter in _exporters:
+        try:
+            exporter(data)
+        except Exception as e:
+            logger.warning("trace 导出失败", error=str(e))
+
+
+class HttpExporter:
+    """将 trace 以 JSON 批量 POST 到外部收集服务；队列满时丢弃，不影响请求"""
+
+    def __init__(self, url: str, batch_size: int = 50, max_queue: int = 1000, interval: float = 2.0):
+        self.url = url
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+    def __call__(self, data: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(data)
+        except asyncio.QueueFull:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            while True:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                try:
+                    await client.post(self.url, json={"traces": batch})
+                except httpx.HTTPError as e:
+                    logger.warning("trace 发送失败", url=self.url, error=type(e).__name__, dropped=len(batch))
+                await asyncio.sleep(self.interval)
+
+
+class TracingMiddleware:
+    """
+    ASGI 中间件：为每个请求创建 trace（trace ID 即请求 ID）
+
+    请求头带 X-Debug-Timing: 1（或开启 TRACE_SERVER_TIMING）时，在响应头 Server-Timing 中返回各阶段耗时
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACE_ENABLED:
+            return await self.app(scope, receive, send)
+        trace = start_trace(request_id_var.get(), f'{scope["method"]} {scope["path"]}')
+        debug = settings.TRACE_SERVER_TIMING or dict(scope["headers"]).get(b"x-debug-timing") in (b"1", b"true")
+
+        async def send_with_timing(message):
+            if debug and message["type"] == "http.response.start":
+                elapsed = round((time.perf_counter() - trace._origin) * 1000, 3)
+                timing = ", ".join(filter(None, [trace.server_timing(), f"total;dur={elapsed}"]))
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            finish_trace(trace)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+ZIP 流式打包 - 边下载边输出 ZIP 数据，内存占用与目录大小无关
+"""
+import io
+import os
+import time
+import asyncio
+import zipfile
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+
+from api.config import settings
+from api.content_cache import content_cache, content_hash
+from api.quark_service import QuarkService
+
+# 已压缩的媒体/归档格式，使用存储模式（不再压缩）以节省 CPU
+STORED_EXTENSIONS = {
+    '.zip', '.rar', '.7z', '.gz', '.tgz', '.bz2', '.xz', '.zst',
+    '.mp4', '.mkv', '.avi', '.mov', '.flv', '.wmv', '.webm', '.m4v', '.ts', '.rmvb',
+    '.mp3', '.aac', '.flac', '.m4a', '.ogg', '.opus', '.wma', '.ape',
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.avif',
+    '.pdf', '.epub', '.apk', '.ipa', '.iso', '.dmg', '.docx', '.xlsx', '.pptx',
+}
+
+# 每个预取文件最多缓存的数据块数量
+PREFETCH_QUEUE_CHUNKS = 16
+
+# 数据流结束标记
+_EOF = object()
+
+
+class _StreamBuffer(io.RawIOBase):
+    """不可 seek 的输出缓冲区，zipfile 写入的数据在每次写入后被取走"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compress_type_for(file_name: str) -> int:
+    """根据扩展名选择压缩方式"""
+    ext = os.path.splitext(file_name)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class _Prefetcher:
+    """按顺序预取后续文件，最多同时预取 prefetch 个文件，每个文件的缓存块数有上限"""
+
+    def __init__(self, service: QuarkService, entries: List[Dict[str, Any]], prefetch: int):
+        self.service = service
+        self.entries = entries
+        self.prefetch = max(0, prefetch)
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.infos: Dict[str, Dict[str, Any]] = {}
+        self._info_lock = asyncio.Lock()
+
+    async def _resolve_info(self, index: int) -> Dict[str, Any]:
+        """按批获取下载信息，减少接口调用次数"""
+        fid = self.entries[index]['fid']
+        async with self._info_lock:
+            if fid not in self.infos:
+                batch = self.entries[index:index + 50]
+                infos = await self.service.get_download_info([e['fid'] for e in batch])
+                for info in infos:
+                    self.infos[info['fid']] = info
+        return self.infos.pop(fid, {})
+
+    @staticmethod
+    async def _produce_from_file(path: str, queue: asyncio.Queue) -> None:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, settings.DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await queue.put(chunk)
+
+    async def _produce(self, index: int, queue: asyncio.Queue) -> None:
+        try:
+            info = await self._resolve_info(index)
+            cached = (await asyncio.to_thread(content_cache.get, info['fid'], content_hash(info))
+                      if content_cache and info else None)
+            if cached:
+                await self._produce_from_file(cached, queue)
+                await queue.put(_EOF)
+                return
+            url = info.get('download_url')
+            if not url:
+                raise Exception("未获取到下载地址")
+            async with httpx.AsyncClient(follow_redirects=True) as client:
+                timeout = httpx.Timeout(60.0, connect=60.0)
+                async with client.stream("GET", url, headers=self.service.headers, timeout=timeout) as response:
+                    if response.status_code != 200:
+                        raise Exception(f"HTTP 请求失败，状态码: {response.status_code}")
+                    async for chunk in response.aiter_bytes(settings.DOWNLOAD_CHUNK_SIZE):
+                        await queue.put(chunk)
+            await queue.put(_EOF)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await queue.put(e)
+
+    def _start(self, index: int) -> None:
+        if index >= len(self.entries) or index in self.tasks:
+            return
+        queue: asyncio.Queue = asyncio.Queue(maxsize=PREFETCH_QUEUE_CHUNKS)
+        self.queues[index] = queue
+        self.tasks[index] = asyncio.create_task(self._produce(index, queue))
+
+    async def iter_entry(self, index: int) -> AsyncIterator[Any]:
+        """读取第 index 个文件的数据块，同时启动后续文件的预取"""
+        for i in range(index, index + self.prefetch + 1):
+            self._start(i)
+        queue = self.queues[index]
+        try:
+            while True:
+                item = await queue.get()
+                if item is _EOF:
+                    return
+                yield item
+        finally:
+            self.tasks.pop(index, None)
+            self.queues.pop(index, None)
+
+    async def close(self) -> None:
+        for task in self.tasks.values():
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+        self.queues.clear()
+
+
+async def stream_zip(
+    service: QuarkService,
+    entries: List[Dict[str, Any]],
+    prefetch: Optional[int] = None,
+    on_chunk: Optional[Callable[[int], None]] = None
+) -> AsyncIterator[bytes]:
+    """
+    将文件列表打包为 ZIP 流（ZIP64 + 数据描述符，无需预先知道 CRC）
+
+    Args:
+        service: 当前账号的 QuarkService
+        entries: 文件列表，每项需包含 fid、file_name、path
+        prefetch: 预取的后续文件数量，默认使用服务端配置
+        on_chunk: 每下载一个数据块后的回调，参数为数据块大小
+
+    Yields:
+        ZIP 数据块
+    """
+    prefetch = settings.ZIP_PREFETCH_FILES if prefetch is None else prefetch
+    buffer = _StreamBuffer()
+    prefetcher = _Prefetcher(service, entries, prefetch)
+    zf = zipfile.ZipFile(buffer, mode='w', allowZip64=True)
+    try:
+        for index, entry in enumerate(entries):
+            arcname = '/'.join(p for p in entry['path'].replace('\\', '/').split('/') if p not in ('', '.', '..'))
+            zinfo = zipfile.ZipInfo(arcname or entry['fid'], date_time=time.localtime()[:6])
+            zinfo.compress_type = compress_type_for(entry['file_name'])
+
+            chunks = prefetcher.iter_entry(index)
+            first = await anext(chunks, b'')
+            if isinstance(first, Exception):
+                # 文件下载失败且尚未写入任何数据：写入说明文件代替，保证 ZIP 完整可用
+                await chunks.aclose()
+                error_info = zipfile.ZipInfo(f"{zinfo.filename}.下载失败.txt", date_time=zinfo.date_time)
+                zf.writestr(error_info, f"文件下载失败：{first}")
+                yield buffer.drain()
+                continue
+
+            deflate = zinfo.compress_type == zipfile.ZIP_DEFLATED
+            with zf.open(zinfo, mode='w', force_zip64=True) as dest:
+                item = first
+                while item:
+                    if isinstance(item, Exception):
+                        raise Exception(f"{arcname} 下载中断：{item}")
+                    if deflate:
+                        # 压缩计算放到线程中执行，避免阻塞事件循环
+                        await asyncio.to_thread(dest.write, item)
+                    else:
+                        dest.write(item)
+                    if on_chunk:
+                        on_chunk(len(item))
+                    data = buffer.drain()
+                    if data:
+                        yield data
+                    item = await anext(chunks, b'')
+            yield buffer.drain()
+
+        zf.close()
+        yield buffer.drain()
+    finally:
+        await prefetcher.close()
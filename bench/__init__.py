@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+性能测试工具 - 本地模拟夸克网盘服务等，用于在不访问真实服务的情况下测试性能
+"""
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+故障注入 - 按比例让上游请求返回限流、5xx、截断的 JSON、慢响应、stoken 过期、容量不足、目标文件夹不存在
+
+同一份故障配置可以注入到两处：
+- 模拟服务（MockConfig.faults / mock_server --faults）：对所有客户端生效，包括 CLI 每次新建的 httpx 客户端
+- httpx 传输层（FaultTransport）：包装 QuarkService 的连接，也可以对着真实接口使用
+
+    service = QuarkService(cookies, transport=FaultTransport(FaultInjector('throttle=0.05,slow=0.1')))
+
+配置格式为逗号分隔的 类型=比例[@接口+接口]，未指定接口时使用该类型的默认接口：
+
+    throttle=0.05,server_error=0.02,truncated=0.01,slow=0.05@detail+sort,capacity=0.02
+"""
+import json
+import random
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from bench.mock_server import ENDPOINTS, Distribution
+
+# 返回 JSON 的接口（下载地址返回文件内容）
+JSON_ENDPOINTS = tuple(name for name in ENDPOINTS if name != 'download')
+
+
+@dataclass(frozen=True)
+class FaultType:
+    """一种故障的表现"""
+    description: str
+    endpoints: Tuple[str, ...]  # 默认注入的接口
+    status: int = 0  # 直接返回的 HTTP 状态码，0 表示不替换响应（慢响应、截断）
+    code: int = 0  # 响应 JSON 中的错误码
+    message: str = ''
+
+
+# 限流与 stoken 过期的错误码为模拟值；容量不足、目标文件夹不存在与夸克网盘一致，按任务查询的格式返回（HTTP 200）
+FAULT_TYPES: Dict[str, FaultType] = {
+    'throttle': FaultType('限流（HTTP 429）', JSON_ENDPOINTS, 429, 42900, '请求过于频繁，请稍后再试'),
+    'server_error': FaultType('网关错误（HTTP 502，非 JSON 响应）', tuple(ENDPOINTS), 502),
+    'truncated': FaultType('响应体只返回前一半（JSON 无法解析）', JSON_ENDPOINTS),
+    'slow': FaultType('响应前额外等待（slow_delay 分布）', tuple(ENDPOINTS)),
+    'stoken_expired': FaultType('分享 stoken 过期', ('detail', 'save'), 400, 41012, 'stoken 已过期，请重新获取'),
+    'capacity': FaultType('网盘容量不足（32003）', ('task',), 200, 32003, 'capacity limit[{0}]'),
+    'missing_folder': FaultType('目标文件夹不存在（41013）', ('save', 'task'), 200, 41013, '目标文件夹不存在'),
+}
+
+
+@dataclass(frozen=True)
+class Fault:
+    kind: str
+    rate: float  # 注入比例（0~1）
+    endpoints: Tuple[str, ...]
+
+
+def parse_faults(spec: str) -> List[Fault]:
+    """
+    解析故障配置
+
+    Args:
+        spec: 如 throttle=0.05,slow=0.1@detail+sort
+
+    Returns:
+        故障列表
+
+    Raises:
+        ValueError: 配置格式错误、故障类型或接口名未知
+    """
+    faults = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        kind, _, rest = item.partition('=')
+        rate, _, endpoints = rest.partition('@')
+        if kind not in FAULT_TYPES:
+            raise ValueError(f'未知的故障类型：{kind}（可选：{", ".join(FAULT_TYPES)}）')
+        try:
+            rate = float(rate)
+        except ValueError:
+            raise ValueError(f'无效的故障比例：{item}')
+        if not 0 <= rate <= 1:
+            raise ValueError(f'故障比例应在 0~1 之间：{item}')
+        names = tuple(endpoints.split('+')) if endpoints else FAULT_TYPES[kind].endpoints
+        unknown = set(names) - set(ENDPOINTS)
+        if unknown:
+            raise ValueError(f'未知的接口名：{", ".join(sorted(unknown))}')
+        faults.append(Fault(kind, rate, names))
+    return faults
+
+
+def endpoint_of(path: str) -> str:
+    """请求路径 → ENDPOINTS 中的接口名"""
+    if path.startswith('/mock/download/'):
+        return 'download'
+    for name, endpoint_path in ENDPOINTS.items():
+        if endpoint_path == path:
+            return name
+    return 'other'
+
+
+class FaultInjector:
+    """按配置为每个请求抽取要注入的故障，并统计注入次数"""
+
+    def __init__(self, faults: Union[str, List[Fault]], slow_delay: str = 'fixed:3',
+                 rng: Optional[random.Random] = None):
+        """
+        Args:
+            faults: 故障配置字符串或已解析的故障列表
+            slow_delay: slow 故障额外等待的时长分布
+            rng: 随机数生成器，传入带种子的实例以复现
+        """
+        self.faults = parse_faults(faults) if isinstance(faults, str) else list(faults)
+        self.rng = rng or random.Random()
+        self.slow_delay = Distribution(slow_delay, self.rng)
+        self.injected: Counter = Counter()  # 故障类型 → 注入次数
+
+    def choose(self, endpoint: str) -> Optional[str]:
+        """为一次请求抽取故障类型，不注入时返回 None；各故障按配置顺序依次抽取，命中即停止"""
+        for fault in self.faults:
+            if endpoint in fault.endpoints and self.rng.random() < fault.rate:
+                self.injected[fault.kind] += 1
+                return fault.kind
+        return None
+
+    @staticmethod
+    def error(kind: str) -> Tuple[int, bytes, str]:
+        """替换响应的故障，返回 (HTTP 状态码, 响应体, Content-Type)"""
+        fault = FAULT_TYPES[kind]
+        if not fault.code:
+            return fault.status, b'<html><body><h1>502 Bad Gateway</h1></body></html>', 'text/html'
+        body = {'status': fault.status, 'code': fault.code, 'message': fault.message, 'data': None, 'metadata': {}}
+        return fault.status, json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json'
+
+    @staticmethod
+    def truncate(body: bytes) -> bytes:
+        return body[:len(body) // 2]
+
+
+class FaultTransport(httpx.AsyncBaseTransport):
+    """包装 httpx 传输层，按 FaultInjector 的抽取结果替换、截断或延迟上游响应"""
+
+    def __init__(self, injector: FaultInjector, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.injector = injector
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        kind = self.injector.choose(endpoint_of(request.url.path))
+        if kind == 'slow':
+            await asyncio.sleep(self.injector.slow_delay.sample())
+        elif kind == 'truncated':
+            response = await self._transport.handle_async_request(request)
+            try:
+                body = await response.aread()
+            finally:
+                await response.aclose()
+            # 已按 Content-Encoding 解码，去掉与截断后内容不符的头
+            headers = [(key, value) for key, value in response.headers.items()
+                       if key.lower() not in ('content-length', 'content-encoding')]
+            return httpx.Response(response.status_code, headers=headers, content=self.injector.truncate(body),
+                                  request=request)
+        elif kind:
+            status, body, content_type = self.injector.error(kind)
+            return httpx.Response(status, headers={'content-type': content_type}, content=body, request=request)
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
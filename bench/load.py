@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+"""
+API 压力测试 - 多个 Token 的并发客户端按比例调用登录、验证、转存分享、批量转存、任务查询接口
+
+默认在临时目录中以子进程启动模拟服务和 API 服务（与压测客户端互不抢占 GIL），
+统计每秒请求数、延迟分位数、错误率，以及 API 服务进程（含全部 worker）的 CPU、内存、线程、文件描述符占用：
+
+    python -m bench.load --tokens 50 --clients 100 --duration 60
+    python -m bench.load --workers 4 -e SESSION_MAX_LIVE=200 --baseline bench/results/load-base.json
+    python -m bench.load --target http://127.0.0.1:8007 --server-pid 12345 --upstream http://127.0.0.1:9000
+
+--target 指向已运行的 API 服务时不再启动服务，资源占用需通过 --server-pid 指定进程（仅 Linux）；
+--upstream 指向已运行的模拟服务时不再启动模拟服务
+"""
+import os
+import sys
+import json
+import time
+import socket
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench.faults import parse_faults
+from bench.report import compare, git_commit, percentiles
+
+API_PREFIX = '/api/v1'
+
+# 操作 → 默认权重
+DEFAULT_MIX = 'verify=4,task=3,transfer=2,batch=1'
+OPERATIONS = ('verify', 'task', 'transfer', 'batch')
+
+
+def free_port(host: str = '127.0.0.1') -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """解析操作比例，如 verify=4,task=3"""
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise ValueError(f'未知的操作：{name}（可选：{", ".join(OPERATIONS)}）')
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise ValueError(f'操作比例不能全部为 0：{spec}')
+    return mix
+
+
+# ==================== 资源占用 ====================
+
+def process_tree(pid: int) -> List[int]:
+    """pid 及其全部子孙进程（读取 /proc）"""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', encoding='utf-8') as f:
+                # 进程名可能含空格，ppid 在最后一个 ')' 之后的第二个字段
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        pids.append(current)
+        queue.extend(children.get(current, []))
+    return pids
+
+
+def process_usage(pid: int) -> Optional[Tuple[float, int, int, int]]:
+    """单个进程的 (CPU 秒数, RSS 字节, 线程数, 文件描述符数)，进程已退出时返回 None"""
+    try:
+        with open(f'/proc/{pid}/stat', encoding='utf-8') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        # utime、stime 为 stat 的第 14、15 个字段（')' 之后从第 3 个字段起计数）
+        cpu = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        threads = int(fields[17])
+        rss = int(fields[21]) * os.sysconf('SC_PAGE_SIZE')
+        fds = len(os.listdir(f'/proc/{pid}/fd'))
+    except (OSError, IndexError, ValueError):
+        return None
+    return cpu, rss, threads, fds
+
+
+class ResourceSampler:
+    """定时采样服务进程树的资源占用"""
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[Tuple[float, float, int, int, int, int]] = []  # (时间, CPU 秒数, RSS, 线程, fd, 进程数)
+
+    def sample(self) -> None:
+        usages = [usage for usage in map(process_usage, process_tree(self.pid)) if usage]
+        if usages:
+            self.samples.append((time.monotonic(), sum(u[0] for u in usages), sum(u[1] for u in usages),
+                                 sum(u[2] for u in usages), sum(u[3] for u in usages), len(usages)))
+
+    async def run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def summary(self) -> Dict[str, Any]:
+        if len(self.samples) < 2:
+            return {}
+        first, last = self.samples[0], self.samples[-1]
+        # 相邻采样间的 CPU 使用率（100% 为一个核）
+        rates = [(b[1] - a[1]) / (b[0] - a[0]) for a, b in zip(self.samples, self.samples[1:]) if b[0] > a[0]]
+        return {
+            'processes': max(s[5] for s in self.samples),
+            'cpu_seconds': round(last[1] - first[1], 3),
+            'cpu_percent_avg': round((last[1] - first[1]) / (last[0] - first[0]) * 100, 1),
+            'cpu_percent_max': round(max(rates) * 100, 1) if rates else 0,
+            'rss_mb_start': round(first[2] / 1024 ** 2, 1),
+            'rss_mb_max': round(max(s[2] for s in self.samples) / 1024 ** 2, 1),
+            'threads_max': max(s[3] for s in self.samples),
+            'fds_max': max(s[4] for s in self.samples),
+        }
+
+
+# ==================== 被测服务 ====================
+
+class Service:
+    """以子进程运行的服务，输出写入日志文件"""
+
+    def __init__(self, name: str, args: List[str], env: Dict[str, str], workdir: str, ready_url: str):
+        self.name = name
+        self.ready_url = ready_url
+        self.log_path = os.path.join(workdir, f'{name}.log')
+        self._log = open(self.log_path, 'wb')
+        self.process = subprocess.Popen([sys.executable, *args], cwd=workdir, env=env,
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+
+    async def wait_ready(self, client: httpx.AsyncClient, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            try:
+                if (await client.get(self.ready_url, timeout=2.0)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+        with open(self.log_path, encoding='utf-8', errors='replace') as f:
+            tail = f.read()[-2000:]
+        raise RuntimeError(f'{self.name} 启动失败（{self.ready_url}）：\n{tail}')
+
+    def stop(self) -> None:
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self._log.close()
+
+
+def start_upstream(options: argparse.Namespace, workdir: str) -> Tuple[Service, str]:
+    port = free_port()
+    args = ['-m', 'bench.mock_server', '--port', str(port), '--latency', options.latency,
+            '--task-delay', options.task_delay, '--share-folders', str(options.share_folders),
+            '--share-files', str(options.share_files), '--seed', str(options.seed)]
+    if options.faults:
+        args += ['--faults', options.faults, '--slow-delay', options.slow_delay]
+    base_url = f'http://127.0.0.1:{port}'
+    env = {**os.environ, 'PYTHONPATH': ROOT_DIR}
+    return Service('mock', args, env, workdir, f'{base_url}/mock/stats'), base_url
+
+
+def start_api(options: argparse.Namespace, upstream: str, workdir: str) -> Tuple[Service, str]:
+    port = free_port()
+    env = {
+        **os.environ,
+        'PYTHONPATH': ROOT_DIR,
+        'HOST': '127.0.0.1',
+        'PORT': str(port),
+        'WORKERS': str(options.workers),
+        'QUARK_BASE_URL': upstream,
+        'LOG_LEVEL': options.log_level,
+        # 批量转存的链接间隔是限流策略，与 bench.run 一致默认不计入（其余配置保持服务默认值）
+        'BATCH_DELAY_MIN': os.environ.get('BATCH_DELAY_MIN', '0'),
+        'BATCH_DELAY_MAX': os.environ.get('BATCH_DELAY_MAX', '0'),
+    }
+    env.update(item.split('=', 1) for item in options.env)
+    base_url = f'http://127.0.0.1:{port}'
+    return Service('api', [os.path.join(ROOT_DIR, 'api', 'main.py')], env, workdir,
+                   f'{base_url}/api/health'), base_url
+
+
+# ==================== 压测客户端 ====================
+
+@dataclass
+class OpStats:
+    latencies: List[float] = field(default_factory=list)  # 成功请求的耗时（秒）
+    errors: Counter = field(default_factory=Counter)  # 错误类型 → 次数
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies) + sum(self.errors.values())
+
+
+class LoadTest:
+    """并发客户端：先为每个 Token 登录，再按比例循环调用各接口，直到测试时长结束"""
+
+    def __init__(self, client: httpx.AsyncClient, target: str, upstream: str, options: argparse.Namespace):
+        self.client = client
+        self.target = target.rstrip('/')
+        self.upstream = upstream.rstrip('/')
+        self.options = options
+        self.mix = parse_mix(options.mix)
+        self.rng = random.Random(options.seed)
+        self.stats: Dict[str, OpStats] = {}
+        self.tokens: List[str] = []
+        self.task_ids: List[str] = []
+        self._links = 0
+
+    async def call(self, op: str, method: str, path: str, token: Optional[str] = None,
+                   **kwargs: Any) -> Optional[Dict[str, Any]]:
+        """调用 API，记录耗时；HTTP 状态码或响应中的 code 不为 200 时计为错误"""
+        stats = self.stats.setdefault(op, OpStats())
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, f'{self.target}{API_PREFIX}{path}', headers=headers,
+                                                 timeout=self.options.timeout, **kwargs)
+            elapsed = time.perf_counter() - start
+            body = response.json() if response.status_code == 200 else None
+        except (httpx.HTTPError, ValueError) as e:
+            stats.errors[type(e).__name__] += 1
+            return None
+        if body is None:
+            stats.errors[f'http_{response.status_code}'] += 1
+        elif body.get('code') != 200:
+            stats.errors[f"code_{body.get('code')}"] += 1
+        else:
+            stats.latencies.append(elapsed)
+            return body
+        return None
+
+    def share_url(self) -> str:
+        # 每次使用新的分享链接，模拟服务为其生成一份他人的分享
+        self._links += 1
+        return f'{self.upstream}/s/load{self._links:06d}'
+
+    async def login_all(self) -> None:
+        """所有 Token 同时登录"""
+        async def login(i: int) -> Optional[str]:
+            body = await self.call('login', 'POST', '/auth/login',
+                                   json={'cookies': f'load=1; __uid=load{i:05d}', 'user_id': f'load{i}'})
+            return body['data']['access_token'] if body else None
+
+        tokens = await asyncio.gather(*(login(i) for i in range(self.options.tokens)))
+        self.tokens = [token for token in tokens if token]
+
+    async def seed_tasks(self, count: int) -> None:
+        """在模拟服务中创建转存任务，供任务查询使用"""
+        for _ in range(count):
+            response = await self.client.post(f'{self.upstream}/1/clouddrive/share/sharepage/save',
+                                              json={'fid_list': [], 'to_pdir_fid': '0'})
+            task_id = (response.json().get('data') or {}).get('task_id') if response.status_code == 200 else None
+            if task_id:
+                self.task_ids.append(task_id)
+
+    async def run_op(self, op: str, token: str) -> None:
+        if op == 'verify':
+            await self.call(op, 'GET', '/auth/verify', token)
+        elif op == 'task':
+            await self.call(op, 'POST', '/task/status', token, json={'task_id': self.rng.choice(self.task_ids)})
+        elif op == 'transfer':
+            await self.call(op, 'POST', '/share/transfer-and-share', token, json={'share_url': self.share_url()})
+        elif op == 'batch':
+            urls = [self.share_url() for _ in range(self.options.batch_links)]
+            await self.call(op, 'POST', '/share/batch-transfer-and-share', token, json={'share_urls': urls})
+
+    async def worker(self, index: int, deadline: float) -> None:
+        token = self.tokens[index % len(self.tokens)]
+        ops, weights = zip(*self.mix.items())
+        while time.monotonic() < deadline:
+            await self.run_op(self.rng.choices(ops, weights)[0], token)
+            if self.options.think:
+                await asyncio.sleep(self.rng.uniform(0, 2 * self.options.think))
+
+    async def run(self) -> float:
+        """运行混合负载，返回实际时长（秒）"""
+        if 'task' in self.mix:
+            await self.seed_tasks(self.options.seed_tasks)
+            if not self.task_ids:
+                raise RuntimeError('无法在模拟服务中创建任务，请检查 --upstream 或从 --mix 中去掉 task')
+        start = time.monotonic()
+        deadline = start + self.options.duration
+        # 计时结束后等待进行中的请求完成，不再发起新请求
+        await asyncio.gather(*(self.worker(i, deadline) for i in range(self.options.clients)))
+        return time.monotonic() - start
+
+
+def op_result(stats: OpStats, duration: float) -> Dict[str, Any]:
+    return {
+        'requests': stats.count,
+        'ok': len(stats.latencies),
+        'errors': dict(stats.errors),
+        'error_rate': round(sum(stats.errors.values()) / stats.count, 4) if stats.count else 0,
+        'throughput': round(len(stats.latencies) / duration, 3) if duration else 0,
+        'latency_ms': percentiles(stats.latencies),
+    }
+
+
+async def fetch_json(client: httpx.AsyncClient, url: str) -> Dict[str, Any]:
+    try:
+        response = await client.get(url, timeout=10.0)
+        return response.json() if response.status_code == 200 else {}
+    except (httpx.HTTPError, ValueError):
+        return {}
+
+
+async def run_load(options: argparse.Namespace) -> Dict[str, Any]:
+    services: List[Service] = []
+    limits = httpx.Limits(max_connections=options.clients + options.tokens, max_keepalive_connections=options.clients)
+    with tempfile.TemporaryDirectory(prefix='bench-load-') as workdir:
+        async with httpx.AsyncClient(limits=limits) as client:
+            try:
+                upstream = options.upstream
+                if not upstream:
+                    mock, upstream = start_upstream(options, workdir)
+                    services.append(mock)
+                    await mock.wait_ready(client)
+                target, server_pid = options.target, options.server_pid
+                if not target:
+                    api, target = start_api(options, upstream, workdir)
+                    services.append(api)
+                    await api.wait_ready(client)
+                    server_pid = api.process.pid
+
+                sampler = ResourceSampler(server_pid) if server_pid and os.path.isdir('/proc') else None
+                sampling = asyncio.create_task(sampler.run()) if sampler else None
+                test = LoadTest(client, target, upstream, options)
+                try:
+                    print(f'登录 {options.tokens} 个 Token ...', flush=True)
+                    login_start = time.monotonic()
+                    await test.login_all()
+                    login_duration = time.monotonic() - login_start
+                    if not test.tokens:
+                        raise RuntimeError(f'全部登录失败：{dict(test.stats["login"].errors)}')
+                    print(f'{options.clients} 个客户端运行 {options.duration:g} 秒 ...', flush=True)
+                    duration = await test.run()
+                finally:
+                    if sampling:
+                        sampling.cancel()
+                        sampler.sample()
+                health = await fetch_json(client, f'{target}/api/health')
+                upstream_stats = await fetch_json(client, f'{upstream}/mock/stats')
+            finally:
+                for service in reversed(services):
+                    service.stop()
+
+    mixed = [stats for op, stats in test.stats.items() if op != 'login']
+    total = sum(stats.count for stats in mixed)
+    errors = sum(sum(stats.errors.values()) for stats in mixed)
+    operations = {'login': op_result(test.stats['login'], login_duration)}
+    operations.update((op, op_result(stats, duration)) for op, stats in test.stats.items() if op != 'login')
+    return {
+        'duration_s': round(duration, 3),
+        'requests': total,
+        'requests_per_s': round(total / duration, 3) if duration else 0,
+        'error_rate': round(errors / total, 4) if total else 0,
+        'scenarios': operations,  # 与 bench.run 的结果格式一致，可用同一个 compare 比较
+        'server': sampler.summary() if sampler else {},
+        'loop_lag_ms': (health.get('data') or {}).get('loop_lag_ms', {}),
+        'upstream_calls': upstream_stats.get('requests', {}),
+        'faults_injected': upstream_stats.get('faults', {}),
+    }
+
+
+def print_summary(result: Dict[str, Any]) -> None:
+    for op, stats in result['scenarios'].items():
+        latency = stats['latency_ms']
+        print(f"{op:<10} 请求={stats['requests']:<7} 成功={stats['throughput']:>9.2f}/s  "
+              f"p50={latency.get('p50', '-')}ms p90={latency.get('p90', '-')}ms p99={latency.get('p99', '-')}ms  "
+              f"错误率={stats['error_rate']:.2%} {stats['errors'] or ''}")
+    print(f"合计 {result['requests']} 个请求，{result['requests_per_s']:.2f} 请求/秒，错误率 {result['error_rate']:.2%}")
+    server = result['server']
+    if server:
+        print(f"服务端 {server['processes']} 个进程：CPU 平均 {server['cpu_percent_avg']}%（峰值 {server['cpu_percent_max']}%），"
+              f"内存 {server['rss_mb_start']} → 最高 {server['rss_mb_max']} MB，线程 {server['threads_max']}，"
+              f"文件描述符 {server['fds_max']}")
+    if result['loop_lag_ms']:
+        print(f"事件循环延迟（ms）：{result['loop_lag_ms']}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='QuarkPanTool API 压力测试')
+    parser.add_argument('--tokens', type=int, default=20, help='登录的 Token（账号）数')
+    parser.add_argument('--clients', type=int, default=50, help='并发客户端数，按顺序轮流使用各 Token')
+    parser.add_argument('--duration', type=float, default=30, help='混合负载的持续时长（秒）')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='各操作的比例')
+    parser.add_argument('--think', type=float, default=0, help='客户端两次请求之间的平均间隔（秒）')
+    parser.add_argument('--batch-links', type=int, default=3, help='每次批量转存的链接数')
+    parser.add_argument('--seed-tasks', type=int, default=200, help='预先在模拟服务中创建、供任务查询使用的任务数')
+    parser.add_argument('--timeout', type=float, default=120, help='单个请求的超时（秒）')
+    parser.add_argument('--target', help='已运行的 API 服务地址，不指定时启动一个')
+    parser.add_argument('--server-pid', type=int, help='--target 服务的进程 ID，用于统计资源占用')
+    parser.add_argument('--upstream', help='已运行的模拟服务地址，不指定时启动一个')
+    parser.add_argument('--workers', type=int, default=1, help='启动的 API 服务的 worker 数')
+    parser.add_argument('-e', '--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='启动的 API 服务的配置项（环境变量），可重复')
+    parser.add_argument('--log-level', default='WARNING', help='启动的 API 服务的日志级别')
+    parser.add_argument('--latency', default='lognormal:0.03,0.3', help='模拟服务的接口延迟分布')
+    parser.add_argument('--task-delay', default='uniform:0.2,0.6', help='模拟服务的任务完成耗时分布')
+    parser.add_argument('--share-folders', type=int, default=2, help='模拟分享中的文件夹数')
+    parser.add_argument('--share-files', type=int, default=2, help='模拟分享中每个文件夹的文件数')
+    parser.add_argument('--faults', default='', help='模拟服务注入的上游故障，格式见 bench/faults.py')
+    parser.add_argument('--slow-delay', default='fixed:3', help='slow 故障额外等待的时长分布')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='结果文件路径，默认 bench/results/load-<时间>.json')
+    parser.add_argument('--baseline', help='与该结果文件比较')
+    parser.add_argument('--threshold', type=float, default=0.1, help='吞吐量、p99 延迟允许的退化比例')
+    options = parser.parse_args(argv)
+    try:
+        parse_mix(options.mix)
+        parse_faults(options.faults)
+    except ValueError as e:
+        parser.error(str(e))
+    if options.tokens < 1 or options.clients < 1:
+        parser.error('--tokens 和 --clients 至少为 1')
+    if any('=' not in item for item in options.env):
+        parser.error('-e 的格式应为 KEY=VALUE')
+    return options
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    options = parse_args(argv)
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': {key: value for key, value in vars(options).items() if key not in ('output', 'baseline')},
+        **asyncio.run(run_load(options)),
+    }
+    print_summary(results)
+
+    output = options.output or os.path.join(BENCH_DIR, 'results', f'load-{time.strftime("%Y%m%d-%H%M%S")}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f'结果已保存：{output}')
+
+    if options.baseline:
+        with open(options.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print(f'{len(regressions)} 项指标退化超过 {options.threshold:.0%}：')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,529 @@
+# -*- coding: utf-8 -*-
+"""
+夸克网盘模拟服务 - 实现本工具用到的接口，用于端到端性能测试
+
+支持按接口配置延迟分布、分页大小、任务完成耗时，下载地址支持 Range 请求和限速。
+将 QUARK_BASE_URL 设置为本服务地址后，QuarkService 和 QuarkPanFileManager 的请求都会发往这里：
+
+    python -m bench.mock_server --port 9000 --latency lognormal:0.08,0.4 --task-delay uniform:0.5,2
+    QUARK_BASE_URL=http://127.0.0.1:9000 python api/main.py
+
+任意 pwd_id 的分享链接（如 http://127.0.0.1:9000/s/bench001）都会生成一份他人的分享，
+包含 share_folders 个文件夹、每个文件夹 share_files 个文件；--faults 可按比例注入上游故障（见 bench/faults.py）
+"""
+import time
+import uuid
+import math
+import socket
+import random
+import asyncio
+import zlib
+import argparse
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+
+CHUNK_SIZE = 64 * 1024
+# 文件内容为 0..250 循环的字节序列，起点由文件决定；周期取质数，错位的分块能被校验出来
+_PERIOD = 251
+_PATTERN = bytes(i % _PERIOD for i in range(CHUNK_SIZE + _PERIOD))
+
+
+def mock_content(seed: int, offset: int, length: int) -> bytes:
+    """模拟文件从 offset 开始的 length 个字节（length 不超过 CHUNK_SIZE）"""
+    start = (seed + offset) % _PERIOD
+    return _PATTERN[start:start + length]
+
+
+class Distribution:
+    """
+    耗时分布（秒），格式为 类型:参数
+
+    - none：0
+    - fixed:0.05
+    - uniform:0.02,0.2
+    - normal:0.1,0.03（均值, 标准差）
+    - lognormal:0.08,0.5（中位数, sigma，长尾，接近真实接口）
+    """
+
+    def __init__(self, spec: str = 'none', rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, args = spec.partition(':')
+        self.kind = kind
+        self.args = [float(a) for a in args.split(',') if a]
+        expected = {'none': 0, 'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2}
+        if kind not in expected or len(self.args) != expected[kind]:
+            raise ValueError(f'无效的分布：{spec}')
+
+    def sample(self) -> float:
+        if self.kind == 'fixed':
+            return self.args[0]
+        if self.kind == 'uniform':
+            return self.rng.uniform(*self.args)
+        if self.kind == 'normal':
+            return max(0.0, self.rng.gauss(*self.args))
+        if self.kind == 'lognormal':
+            return self.rng.lognormvariate(math.log(self.args[0]), self.args[1])
+        return 0.0
+
+
+@dataclass
+class MockConfig:
+    """模拟服务配置"""
+    latency: str = 'none'  # 所有接口默认的延迟分布
+    endpoint_latency: Dict[str, str] = field(default_factory=dict)  # 按接口覆盖延迟分布，键见 ENDPOINTS
+    task_delay: str = 'fixed:1.0'  # 转存/分享任务从创建到完成的耗时分布
+    detail_page_size: int = 50  # 分享详情每页最多返回的条目数
+    sort_page_size: int = 100  # 目录列表每页最多返回的条目数
+    share_folders: int = 20  # 他人分享中的文件夹数
+    share_files: int = 5  # 每个文件夹中的文件数
+    file_size: int = 1024 ** 2  # 每个文件的大小（字节）
+    bandwidth: int = 0  # 单个下载连接的速度上限（字节/秒），0 为不限
+    faults: str = ''  # 故障注入配置，格式见 bench/faults.py，如 throttle=0.05,slow=0.1
+    slow_delay: str = 'fixed:3'  # slow 故障额外等待的时长分布
+    seed: Optional[int] = None  # 随机数种子，便于复现
+
+
+# 接口名称 → 路径，名称用于 endpoint_latency 与请求统计
+ENDPOINTS = {
+    'account': '/account/info',
+    'stoken': '/1/clouddrive/share/sharepage/token',
+    'detail': '/1/clouddrive/share/sharepage/detail',
+    'save': '/1/clouddrive/share/sharepage/save',
+    'task': '/1/clouddrive/task',
+    'sort': '/1/clouddrive/file/sort',
+    'mkdir': '/1/clouddrive/file',
+    'share': '/1/clouddrive/share',
+    'password': '/1/clouddrive/share/password',
+    'my_shares': '/1/clouddrive/share/mypage/detail',
+    'download_info': '/1/clouddrive/file/download',
+    'download': '/mock/download/{fid}',
+}
+
+
+def ok(data: Any, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {'status': 200, 'code': 0, 'message': 'ok', 'timestamp': int(time.time()),
+            'data': data, 'metadata': metadata or {}}
+
+
+def error(code: int, message: str, status: int = 400) -> JSONResponse:
+    return JSONResponse({'status': status, 'code': code, 'message': message, 'data': None, 'metadata': {}},
+                        status_code=status)
+
+
+def page_of(items: List[Any], page: int, size: int) -> Tuple[List[Any], Dict[str, Any]]:
+    """按页切分，返回 (当页条目, metadata)"""
+    page = max(1, page)
+    chunk = items[(page - 1) * size:page * size]
+    return chunk, {'_total': len(items), '_size': size, '_page': page, '_count': len(chunk)}
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """解析单段 Range 请求头，返回 [start, end]；无法满足时抛出 ValueError"""
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition('-')
+    if first:
+        start, end = int(first), int(last) if last else size - 1
+    else:
+        start, end = max(0, size - int(last)), size - 1
+    end = min(end, size - 1)
+    if start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class MockQuark:
+    """模拟网盘的状态：网盘文件树、分享、转存/分享任务"""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        default = Distribution(config.latency, self.rng)
+        self.latency = {name: Distribution(config.endpoint_latency[name], self.rng)
+                        if name in config.endpoint_latency else default for name in ENDPOINTS}
+        self.task_delay = Distribution(config.task_delay, self.rng)
+        self.faults = None
+        if config.faults:
+            from bench.faults import FaultInjector
+
+            self.faults = FaultInjector(config.faults, config.slow_delay, self.rng)
+        self.reset()
+
+    def reset(self) -> None:
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.children: Dict[str, List[str]] = defaultdict(list)
+        self.shares: Dict[str, Dict[str, Any]] = {}  # pwd_id → 分享
+        self.share_ids: Dict[str, str] = {}  # share_id → pwd_id
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.requests: Counter = Counter()
+        if self.faults:
+            self.faults.injected.clear()
+
+    async def delay(self, endpoint: str) -> None:
+        self.requests[endpoint] += 1
+        seconds = self.latency[endpoint].sample()
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    # ---------- 文件树 ----------
+
+    def add_file(self, pdir_fid: str, name: str, is_dir: bool, size: int = 0,
+                 seed: Optional[int] = None) -> Dict[str, Any]:
+        fid = uuid.uuid4().hex
+        now = int(time.time() * 1000)
+        item = {
+            'fid': fid, 'file_name': name, 'pdir_fid': pdir_fid, 'dir': is_dir,
+            'file_type': 0 if is_dir else 1, 'size': 0 if is_dir else size,
+            'include_items': 0, 'status': 1, 'created_at': now, 'updated_at': now,
+            'seed': zlib.crc32(fid.encode()) % _PERIOD if seed is None else seed,
+        }
+        self.files[fid] = item
+        self.children[pdir_fid].append(fid)
+        if pdir_fid in self.files:
+            self.files[pdir_fid]['include_items'] += 1
+        return item
+
+    def copy_tree(self, fid: str, to_pdir_fid: str) -> str:
+        source = self.files[fid]
+        copy = self.add_file(to_pdir_fid, source['file_name'], source['dir'], source['size'], source['seed'])
+        for child in list(self.children.get(fid, [])):
+            self.copy_tree(child, copy['fid'])
+        return copy['fid']
+
+    def public(self, item: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+        data = {key: value for key, value in item.items() if key != 'seed'}
+        data['md5'] = f"mock-{item['seed']}-{item['size']}"
+        data.update(extra)
+        return data
+
+    def add_tree(self, pdir_fid: str, folders: int, files: int, file_size: int) -> List[str]:
+        """在 pdir_fid 下创建 folders 个文件夹，每个文件夹 files 个文件，返回文件夹 ID 列表"""
+        fids = []
+        for i in range(folders):
+            folder = self.add_file(pdir_fid, f'文件夹{i + 1:03d}', True)
+            for j in range(files):
+                self.add_file(folder['fid'], f'文件{j + 1:03d}.bin', False, file_size)
+            fids.append(folder['fid'])
+        return fids
+
+    def create_share(self, pwd_id: str, folders: int, files: int, file_size: int,
+                     passcode: str = '') -> Dict[str, Any]:
+        """创建一份他人的分享"""
+        fids = self.add_tree(f'share:{pwd_id}', folders, files, file_size)
+        share = self.shares[pwd_id] = {'pwd_id': pwd_id, 'fids': fids, 'is_owner': 0, 'passcode': passcode}
+        return share
+
+    def get_share(self, pwd_id: str) -> Dict[str, Any]:
+        """读取分享，未知的 pwd_id 按配置生成一份他人的分享"""
+        share = self.shares.get(pwd_id)
+        if share is None:
+            share = self.create_share(pwd_id, self.config.share_folders, self.config.share_files,
+                                      self.config.file_size)
+        return share
+
+    # ---------- 任务 ----------
+
+    def create_task(self, kind: str, title: str, payload: Dict[str, Any]) -> str:
+        task_id = uuid.uuid4().hex
+        self.tasks[task_id] = {'kind': kind, 'title': title, 'payload': payload,
+                               'ready_at': time.monotonic() + self.task_delay.sample(), 'result': None}
+        return task_id
+
+    def task_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        task = self.tasks.get(task_id)
+        if task is None:
+            return None
+        if time.monotonic() < task['ready_at']:
+            return {'task_id': task_id, 'status': 0, 'task_title': task['title']}
+        if task['result'] is None:
+            task['result'] = self.finish_task(task)
+        return {'task_id': task_id, 'status': 2, 'task_title': task['title'], **task['result']}
+
+    def finish_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        payload = task['payload']
+        if task['kind'] == 'save':
+            to_pdir_fid = payload.get('to_pdir_fid', '0')
+            top_fids = [self.copy_tree(fid, to_pdir_fid) for fid in payload.get('fid_list', []) if fid in self.files]
+            to_pdir = self.files.get(to_pdir_fid)
+            save_as = {'to_pdir_fid': to_pdir_fid, 'save_as_top_fids': top_fids}
+            if to_pdir:
+                save_as['to_pdir_name'] = to_pdir['file_name']
+            return {'save_as': save_as}
+
+        share_id = uuid.uuid4().hex
+        pwd_id = uuid.uuid4().hex[:12]
+        fids = payload.get('fid_list', [])
+        self.shares[pwd_id] = {
+            'pwd_id': pwd_id, 'share_id': share_id, 'fids': fids, 'is_owner': 1,
+            'title': payload.get('title', ''), 'passcode': payload.get('passcode', '') if payload.get('url_type') == 2 else '',
+            'url_type': payload.get('url_type', 1), 'expired_type': payload.get('expired_type', 1),
+            'created_at': int(time.time() * 1000),
+        }
+        self.share_ids[share_id] = pwd_id
+        return {'share_id': share_id}
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    """创建模拟服务应用"""
+    mock = MockQuark(config or MockConfig())
+    app = FastAPI(title='Quark Mock Server')
+    app.state.mock = mock
+
+    if mock.faults:
+        from bench.faults import endpoint_of
+
+        @app.middleware('http')
+        async def inject_faults(request: Request, call_next):
+            endpoint = endpoint_of(request.url.path)
+            kind = mock.faults.choose(endpoint)
+            if kind == 'slow':
+                await asyncio.sleep(mock.faults.slow_delay.sample())
+            elif kind == 'truncated':
+                response = await call_next(request)
+                body = b''.join([chunk async for chunk in response.body_iterator])
+                return Response(mock.faults.truncate(body), status_code=response.status_code,
+                                headers={'content-type': response.headers.get('content-type', 'application/json')})
+            elif kind:
+                # 被替换的请求不会进入接口，在这里计数
+                mock.requests[endpoint] += 1
+                status, body, content_type = mock.faults.error(kind)
+                return Response(body, status_code=status, headers={'content-type': content_type})
+            return await call_next(request)
+
+    @app.get(ENDPOINTS['account'])
+    async def account_info():
+        await mock.delay('account')
+        return {'success': True, 'code': 'OK', 'msg': '', 'data': {'nickname': 'mock-user'}}
+
+    @app.post(ENDPOINTS['stoken'])
+    async def stoken(body: Dict[str, Any]):
+        await mock.delay('stoken')
+        share = mock.get_share(body.get('pwd_id', ''))
+        if share['passcode'] and body.get('passcode') != share['passcode']:
+            return error(41008, '提取码错误')
+        return ok({'stoken': f"stoken-{share['pwd_id']}", 'title': share.get('title', '')})
+
+    @app.get(ENDPOINTS['detail'])
+    async def detail(pwd_id: str, pdir_fid: str = '0', _page: int = 1, _size: int = 50):
+        await mock.delay('detail')
+        share = mock.get_share(pwd_id)
+        fids = share['fids'] if pdir_fid == '0' else mock.children.get(pdir_fid, [])
+        items, metadata = page_of(fids, _page, min(_size, mock.config.detail_page_size))
+        data = [mock.public(mock.files[fid], share_fid_token=f'token-{fid}') for fid in items]
+        return ok({'is_owner': share['is_owner'], 'list': data}, metadata)
+
+    @app.post(ENDPOINTS['save'])
+    async def save(body: Dict[str, Any]):
+        await mock.delay('save')
+        to_pdir_fid = body.get('to_pdir_fid', '0')
+        if to_pdir_fid != '0' and to_pdir_fid not in mock.files:
+            return error(41013, '目标文件夹不存在')
+        return ok({'task_id': mock.create_task('save', '分享-转存', body)})
+
+    @app.get(ENDPOINTS['task'])
+    async def task(task_id: str, retry_index: int = 0):
+        await mock.delay('task')
+        status = mock.task_status(task_id)
+        if status is None:
+            return error(32001, '任务不存在')
+        return ok(status)
+
+    @app.get(ENDPOINTS['sort'])
+    async def sort(pdir_fid: str = '0', _page: int = 1, _size: int = 100):
+        await mock.delay('sort')
+        items = sorted((mock.files[fid] for fid in mock.children.get(pdir_fid, [])),
+                       key=lambda i: (i['file_type'], i['file_name']))
+        items, metadata = page_of(items, _page, min(_size, mock.config.sort_page_size))
+        return ok({'list': [mock.public(item) for item in items]}, metadata)
+
+    @app.post(ENDPOINTS['mkdir'])
+    async def mkdir(body: Dict[str, Any]):
+        await mock.delay('mkdir')
+        pdir_fid = body.get('pdir_fid', '0')
+        name = body.get('file_name', '新建文件夹')
+        if any(mock.files[fid]['file_name'] == name for fid in mock.children.get(pdir_fid, [])):
+            return error(23008, 'file is doloading[同名冲突]')
+        return ok({'fid': mock.add_file(pdir_fid, name, True)['fid'], 'finish': True})
+
+    @app.post(ENDPOINTS['share'])
+    async def share(body: Dict[str, Any]):
+        await mock.delay('share')
+        if not body.get('fid_list') or any(fid not in mock.files for fid in body['fid_list']):
+            return error(41004, '分享的文件不存在')
+        return ok({'task_id': mock.create_task('share', '分享', body)})
+
+    @app.post(ENDPOINTS['password'])
+    async def password(body: Dict[str, Any], request: Request):
+        await mock.delay('password')
+        pwd_id = mock.share_ids.get(body.get('share_id', ''))
+        if pwd_id is None:
+            return error(41005, '分享不存在')
+        share = mock.shares[pwd_id]
+        data = {'share_url': f"{str(request.base_url).rstrip('/')}/s/{pwd_id}", 'title': share['title'],
+                'pwd_id': pwd_id}
+        if share['passcode']:
+            data['passcode'] = share['passcode']
+        return ok(data)
+
+    @app.get(ENDPOINTS['my_shares'])
+    async def my_shares(request: Request, _page: int = 1, _size: int = 50):
+        await mock.delay('my_shares')
+        base = str(request.base_url).rstrip('/')
+        owned = sorted((s for s in mock.shares.values() if s['is_owner']), key=lambda s: -s['created_at'])
+        items, metadata = page_of(owned, _page, _size)
+        return ok({'list': [{
+            'share_id': s['share_id'], 'pwd_id': s['pwd_id'], 'title': s['title'], 'first_fid': s['fids'][0],
+            'file_num': len(s['fids']),
+            'share_url': f"{base}/s/{s['pwd_id']}", 'passcode': s['passcode'], 'url_type': s['url_type'],
+            'expired_type': s['expired_type'], 'expired_at': 0, 'created_at': s['created_at'], 'status': 1,
+        } for s in items]}, metadata)
+
+    @app.post(ENDPOINTS['download_info'])
+    async def download_info(body: Dict[str, Any], request: Request):
+        await mock.delay('download_info')
+        base = str(request.base_url).rstrip('/')
+        items = [mock.public(mock.files[fid], download_url=f'{base}/mock/download/{fid}')
+                 for fid in body.get('fids', []) if fid in mock.files and not mock.files[fid]['dir']]
+        if not items:
+            return error(41004, '文件不存在')
+        return ok(items)
+
+    @app.get(ENDPOINTS['download'])
+    async def download(fid: str, request: Request):
+        await mock.delay('download')
+        item = mock.files.get(fid)
+        if item is None or item['dir']:
+            return Response(status_code=404)
+        size = item['size']
+        try:
+            byte_range = parse_range(request.headers.get('range'), size)
+        except ValueError:
+            return Response(status_code=416, headers={'content-range': f'bytes */{size}'})
+        start, end = byte_range or (0, size - 1)
+        headers = {'accept-ranges': 'bytes', 'content-length': str(end - start + 1),
+                   'etag': f'"{fid}"', 'last-modified': time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime())}
+        if byte_range:
+            headers['content-range'] = f'bytes {start}-{end}/{size}'
+
+        async def body():
+            offset = start
+            while offset <= end:
+                length = min(CHUNK_SIZE, end - offset + 1)
+                yield mock_content(item['seed'], offset, length)
+                offset += length
+                if mock.config.bandwidth:
+                    await asyncio.sleep(length / mock.config.bandwidth)
+
+        return StreamingResponse(body(), status_code=206 if byte_range else 200,
+                                 media_type='application/octet-stream', headers=headers)
+
+    @app.get('/mock/stats')
+    async def stats():
+        """各接口的请求次数与当前状态规模"""
+        return {'requests': dict(mock.requests), 'files': len(mock.files), 'shares': len(mock.shares),
+                'tasks': len(mock.tasks), 'faults': dict(mock.faults.injected) if mock.faults else {}}
+
+    @app.post('/mock/reset')
+    async def reset():
+        mock.reset()
+        return {'ok': True}
+
+    return app
+
+
+class MockServer:
+    """
+    在后台线程中运行模拟服务（供性能测试在同一进程中启动，并直接读取请求统计）
+
+        with MockServer(MockConfig(latency='fixed:0.05')) as server:
+            service = QuarkService(cookies, base_url=server.base_url)
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        import uvicorn
+
+        self.app = create_app(config)
+        self.mock: MockQuark = self.app.state.mock
+        if not port:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self.host = host
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level='warning',
+                                                    lifespan='off'))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def __enter__(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self.server.run, name='mock-quark', daemon=True)
+        self._thread.start()
+        while not self.server.started:
+            if not self._thread.is_alive():
+                raise RuntimeError(f'模拟服务启动失败：{self.base_url}')
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.should_exit = True
+        if self._thread:
+            self._thread.join()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='夸克网盘模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency', default='none', help='所有接口的延迟分布，如 lognormal:0.08,0.4')
+    parser.add_argument('--endpoint-latency', action='append', default=[], metavar='NAME=SPEC',
+                        help=f'按接口覆盖延迟分布，可重复；接口名：{", ".join(ENDPOINTS)}')
+    parser.add_argument('--task-delay', default='fixed:1.0', help='任务完成耗时分布')
+    parser.add_argument('--detail-page-size', type=int, default=50)
+    parser.add_argument('--sort-page-size', type=int, default=100)
+    parser.add_argument('--share-folders', type=int, default=20)
+    parser.add_argument('--share-files', type=int, default=5)
+    parser.add_argument('--file-size', type=int, default=1024 ** 2)
+    parser.add_argument('--bandwidth', type=int, default=0, help='单个下载连接的速度上限（字节/秒）')
+    parser.add_argument('--faults', default='', help='故障注入配置，如 throttle=0.05,server_error=0.02,slow=0.1@detail')
+    parser.add_argument('--slow-delay', default='fixed:3', help='slow 故障额外等待的时长分布')
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    endpoint_latency = dict(item.split('=', 1) for item in args.endpoint_latency)
+    unknown = set(endpoint_latency) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f'未知的接口名：{", ".join(sorted(unknown))}')
+    if args.faults:
+        from bench.faults import parse_faults
+
+        try:
+            parse_faults(args.faults)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    return MockConfig(
+        latency=args.latency, endpoint_latency=endpoint_latency, task_delay=args.task_delay,
+        detail_page_size=args.detail_page_size, sort_page_size=args.sort_page_size,
+        share_folders=args.share_folders, share_files=args.share_files, file_size=args.file_size,
+        bandwidth=args.bandwidth, faults=args.faults, slow_delay=args.slow_delay, seed=args.seed,
+    )
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    cli_args = parse_args()
+    uvicorn.run(create_app(config_from_args(cli_args)), host=cli_args.host, port=cli_args.port, log_level='warning')
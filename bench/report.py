@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+性能测试结果 - 延迟分位数、与基准结果比较（bench.run 与 bench.load 共用，导入时没有副作用）
+"""
+import os
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 比较结果时检查的指标：(指标路径, 是否越大越好)
+COMPARED_METRICS: Tuple[Tuple[str, bool], ...] = (
+    ('throughput', True),
+    ('latency_ms.p99', False),
+    ('upstream_total', False),
+)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """秒 → 毫秒分位数"""
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pick(q: float) -> float:
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 3)
+
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': round(values[-1] * 1000, 3)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def metric(result: Dict[str, Any], path: str) -> Optional[float]:
+    value: Any = result
+    for key in path.split('.'):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    与基准结果比较，打印各指标变化
+
+    Returns:
+        超过阈值的退化项
+    """
+    regressions: List[str] = []
+    for name, result in current['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            print(f'{name}: 基准中没有该场景')
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            new, old = metric(result, path), metric(base, path)
+            if new is None or old is None or old == 0:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = '退化' if worse > threshold else ''
+            print(f'{name:<26} {path:<16} {old:>12.3f} → {new:>12.3f} {change:>+8.1%} {flag}')
+            if flag:
+                regressions.append(f'{name} {path} {old} → {new} ({change:+.1%})')
+    return regressions
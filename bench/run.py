@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+性能测试 - 在本地模拟服务上运行转存、分享、下载场景，统计吞吐量、延迟分位数和上游请求次数
+
+结果保存为 JSON（默认 bench/results/<时间>.json），可与之前的结果比较，性能下降超过阈值时以状态码 1 退出：
+
+    python -m bench.run                                     # 运行全部场景
+    python -m bench.run -s get_detail -s download_small     # 只运行部分场景
+    python -m bench.run --baseline bench/results/base.json --threshold 0.15
+    python -m bench.run --compare new.json --baseline base.json
+    python -m bench.run --faults throttle=0.05,server_error=0.02,slow=0.05 --baseline bench/results/base.json
+
+--faults 注入上游故障（格式见 bench/faults.py），此时吞吐量只计算成功的条目，即故障下的有效吞吐量（goodput）；
+--fault-layer transport 改为在 QuarkService 的 httpx 传输层注入，只影响使用 QuarkService 的场景
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import contextlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from bench.faults import FaultInjector, FaultTransport, parse_faults
+from bench.mock_server import CHUNK_SIZE, MockConfig, MockServer, mock_content
+from bench.report import compare, git_commit, percentiles
+from api.config import settings
+from api.quark_service import QuarkService
+from api.tracing import Trace, finish_trace, start_trace
+
+COOKIES = 'bench=1; __uid=bench'
+
+# 性能测试使用的配置（环境变量未指定时）：批量转存的链接间隔是限流策略而不是性能，默认不计入；
+# trace 需保留全部 span 才能统计每个操作的耗时
+BENCH_SETTINGS = {'BATCH_DELAY_MIN': 0.0, 'BATCH_DELAY_MAX': 0.0, 'TRACE_MAX_SPANS': 1000000}
+
+# --scale 缩放的场景参数（数量类参数）
+SCALED_PARAMS = ('links', 'folders', 'files', 'entries', 'repeats')
+
+@dataclass
+class Measurement:
+    """场景运行中收集的数据"""
+    ops: List[float] = field(default_factory=list)  # 每次操作的耗时（秒）
+    items: int = 0  # 完成的条目数（链接、文件夹、文件、列表项）
+    errors: int = 0
+    bytes: int = 0
+    upstream_latency: Dict[str, List[float]] = field(default_factory=dict)  # 客户端测得的各上游接口耗时（秒）
+    faults: Optional[FaultInjector] = None  # 传输层故障注入（--fault-layer transport）
+
+    def add_trace(self, trace: Optional[Trace], op: Optional[str] = None) -> None:
+        """从 trace 中读取名为 op 的 span 作为操作耗时，upstream.* span 作为上游接口耗时"""
+        if trace is None:
+            return
+        for item in trace.spans:
+            if item['name'] == op:
+                self.ops.append(item['duration_ms'] / 1000)
+            elif item['name'].startswith('upstream.'):
+                self.upstream_latency.setdefault(item['name'][9:], []).append(item['duration_ms'] / 1000)
+
+
+@dataclass
+class Scenario:
+    func: Callable
+    params: Dict[str, int]  # 默认参数，其中 SCALED_PARAMS 按 --scale 缩放
+    mock: Dict[str, Any] = field(default_factory=dict)  # 覆盖的 MockConfig 字段
+
+    @property
+    def description(self) -> str:
+        return (self.func.__doc__ or '').strip()
+
+
+SCENARIOS: Dict[str, Scenario] = {}
+
+
+def scenario(mock: Optional[Dict[str, Any]] = None, **params: int):
+    def register(func: Callable) -> Callable:
+        SCENARIOS[func.__name__] = Scenario(func, params, mock or {})
+        return func
+    return register
+
+
+def verify_download(server: MockServer, fid: str, save_path: str) -> bool:
+    """下载的文件与模拟服务中的文件大小一致，且首尾内容相同（故障注入时错误页面会被保存为文件）"""
+    item = server.mock.files.get(fid)
+    size = os.path.getsize(save_path)
+    if item is None or size != item['size']:
+        return False
+    length = min(CHUNK_SIZE, size)
+    with open(save_path, 'rb') as f:
+        head = f.read(length)
+        f.seek(size - length)
+        tail = f.read(length)
+    return (head == mock_content(item['seed'], 0, length)
+            and tail == mock_content(item['seed'], size - length, length))
+
+
+def file_manager(server: MockServer, m: Measurement):
+    """指向模拟服务的 QuarkPanFileManager，逐个记录文件下载耗时；只有内容正确的文件计入完成数"""
+    from quark import QuarkPanFileManager
+
+    class TimedFileManager(QuarkPanFileManager):
+        async def download_file(self, download_url: str, save_path: str, headers: dict, on_chunk=None) -> None:
+            start = time.perf_counter()
+            await QuarkPanFileManager.download_file(download_url, save_path, headers, on_chunk)
+            elapsed = time.perf_counter() - start
+            if not verify_download(server, download_url.rsplit('/', 1)[-1], save_path):
+                return
+            m.ops.append(elapsed)
+            m.items += 1
+            m.bytes += os.path.getsize(save_path)
+
+    return TimedFileManager(cookies=COOKIES, base_url=server.base_url)
+
+
+def quark_service(server: MockServer, m: Measurement) -> QuarkService:
+    """指向模拟服务的 QuarkService，传输层故障注入时包装其连接"""
+    transport = FaultTransport(m.faults) if m.faults else None
+    return QuarkService(COOKIES, base_url=server.base_url, transport=transport)
+
+
+# ==================== 场景 ====================
+
+@scenario(mock={'share_folders': 5, 'share_files': 3}, links=5)
+async def batch_transfer_and_share(server: MockServer, m: Measurement, links: int) -> None:
+    """依次转存 N 个他人分享链接并重新分享（QuarkService.batch_transfer_and_share），操作为单个链接"""
+    service = quark_service(server, m)
+    save_dir = server.mock.add_file('0', 'bench', True)['fid']
+    urls = [f'{server.base_url}/s/bench{i:04d}' for i in range(links)]
+    trace = start_trace('bench', 'batch_transfer_and_share')
+    try:
+        result = await service.batch_transfer_and_share(urls, save_dir_id=save_dir)
+    finally:
+        finish_trace(trace)
+        await service.aclose()
+    m.items, m.errors = result.success_count, result.failed_count
+    m.add_trace(trace, op='link')
+
+
+@scenario(folders=30, concurrency=5)
+async def share_run(server: MockServer, m: Measurement, folders: int, concurrency: int) -> None:
+    """遍历网盘中的合成目录并为每个子文件夹创建分享（QuarkPanFileManager.share_run），操作为单个文件夹"""
+    from quark import QuarkPanFileManager
+
+    root = server.mock.add_file('0', 'bench', True)['fid']
+    server.mock.add_tree(root, folders, files=2, file_size=1024)
+    manager = QuarkPanFileManager(cookies=COOKIES, base_url=server.base_url)
+    await manager.share_run(f'https://pan.quark.cn/list#/list/all/{root}-bench', folder_id=root,
+                            traverse_depth=1, concurrency=concurrency, resume=False, result_format='jsonl')
+    with open('share/share_result.jsonl', encoding='utf-8') as f:
+        for line in f:
+            row = json.loads(line)
+            if row['status'] == 'success':
+                m.items += 1
+                m.ops.append(row['total_seconds'])
+            else:
+                m.errors += 1
+
+
+@scenario(files=200, size=16 * 1024)
+async def download_small(server: MockServer, m: Measurement, files: int, size: int) -> None:
+    """下载大量小文件（QuarkPanFileManager.quark_file_download），操作为单个文件"""
+    fids = [server.mock.add_file('0', f'small{i:05d}.bin', False, size)['fid'] for i in range(files)]
+    await file_manager(server, m).quark_file_download(fids, folder='.')
+    m.errors = files - m.items
+
+
+@scenario(files=2, size=32 * 1024 ** 2)
+async def download_large(server: MockServer, m: Measurement, files: int, size: int) -> None:
+    """下载少量大文件（QuarkPanFileManager.quark_file_download），操作为单个文件"""
+    fids = [server.mock.add_file('0', f'large{i:02d}.bin', False, size)['fid'] for i in range(files)]
+    await file_manager(server, m).quark_file_download(fids, folder='.')
+    m.errors = files - m.items
+
+
+@scenario(entries=5000, repeats=3)
+async def get_detail(server: MockServer, m: Measurement, entries: int, repeats: int) -> None:
+    """分页读取大分享的完整文件列表（QuarkService.get_stoken + get_detail，每页 50 条），操作为一次完整读取"""
+    server.mock.create_share('large', folders=entries, files=0, file_size=0)
+    service = quark_service(server, m)
+    trace = start_trace('bench', 'get_detail')
+    try:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            try:
+                stoken = await service.get_stoken('large')
+                _, items = await service.get_detail('large', stoken)
+            except Exception:
+                # 故障注入时一次读取失败不影响后续读取
+                m.errors += 1
+                continue
+            m.ops.append(time.perf_counter() - start)
+            m.items += len(items)
+    finally:
+        finish_trace(trace)
+        await service.aclose()
+    m.add_trace(trace)
+
+
+# ==================== 运行与比较 ====================
+
+def run_scenario(name: str, options: argparse.Namespace) -> Dict[str, Any]:
+    """在临时目录中启动模拟服务并运行一个场景"""
+    spec = SCENARIOS[name]
+    params = {key: max(1, round(value * options.scale)) if key in SCALED_PARAMS else value
+              for key, value in spec.params.items()}
+    server_faults = options.faults if options.fault_layer == 'server' else ''
+    config = MockConfig(latency=options.latency, task_delay=options.task_delay, faults=server_faults,
+                        slow_delay=options.slow_delay, seed=options.seed, **spec.mock)
+    m = Measurement()
+    failure = None
+    if options.faults and options.fault_layer == 'transport':
+        m.faults = FaultInjector(options.faults, options.slow_delay, random.Random(options.seed))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=f'bench-{name}-') as workdir, MockServer(config) as server:
+        # CLI 场景会在当前目录写入 share/、downloads/ 等文件，在临时目录中运行
+        os.chdir(workdir)
+        try:
+            with contextlib.ExitStack() as quiet:
+                if not options.verbose:
+                    # CLI 场景会打印大量进度信息，默认不输出
+                    quiet.enter_context(contextlib.redirect_stdout(io.StringIO()))
+                    quiet.enter_context(contextlib.redirect_stderr(io.StringIO()))
+                start = time.perf_counter()
+                try:
+                    asyncio.run(spec.func(server, m, **params))
+                except Exception as e:
+                    # 场景中途失败（如故障注入下未处理的异常）时仍保存已收集的数据
+                    failure = f'{type(e).__name__}: {e}'
+                duration = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+        upstream = dict(server.mock.requests)
+        injected = (m.faults or server.mock.faults).injected if options.faults else {}
+
+    return {
+        'description': spec.description,
+        'params': params,
+        'duration_s': round(duration, 3),
+        'items': m.items,
+        'errors': m.errors,
+        'error_rate': round(m.errors / (m.items + m.errors), 4) if m.items + m.errors else 0,
+        'throughput': round(m.items / duration, 3) if duration else 0,
+        'bytes': m.bytes,
+        'bytes_per_s': round(m.bytes / duration) if duration else 0,
+        'latency_ms': percentiles(m.ops),
+        'upstream_calls': upstream,
+        'upstream_total': sum(upstream.values()),
+        'upstream_latency_ms': {endpoint: percentiles(values) for endpoint, values in m.upstream_latency.items()},
+        'faults_injected': dict(injected),
+        'failure': failure,
+    }
+
+
+def print_summary(results: Dict[str, Any]) -> None:
+    for name, result in results['scenarios'].items():
+        latency = result['latency_ms']
+        print(f"{name:<26} {result['duration_s']:>8.2f}s  {result['throughput']:>10.2f}/s  "
+              f"p50={latency.get('p50', '-')}ms p99={latency.get('p99', '-')}ms  "
+              f"上游请求={result['upstream_total']}  失败={result['errors']}"
+              + (f"  注入故障={sum(result['faults_injected'].values())}" if result.get('faults_injected') else '')
+              + (f"  场景中断：{result['failure']}" if result.get('failure') else ''))
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='QuarkPanTool 性能测试')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='要运行的场景，可重复，默认全部')
+    parser.add_argument('--scale', type=float, default=1.0, help='按比例缩放各场景的链接、文件夹、文件数量')
+    parser.add_argument('--latency', default='lognormal:0.03,0.3', help='模拟服务的接口延迟分布')
+    parser.add_argument('--task-delay', default='uniform:0.2,0.6', help='模拟服务的任务完成耗时分布')
+    parser.add_argument('--faults', default='', help='注入上游故障，如 throttle=0.05,server_error=0.02,slow=0.05')
+    parser.add_argument('--fault-layer', choices=('server', 'transport'), default='server',
+                        help='在模拟服务（影响全部场景）或 QuarkService 的 httpx 传输层注入故障')
+    parser.add_argument('--slow-delay', default='fixed:3', help='slow 故障额外等待的时长分布')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='结果文件路径，默认 bench/results/<时间>.json')
+    parser.add_argument('--baseline', help='与该结果文件比较')
+    parser.add_argument('--threshold', type=float, default=0.1, help='吞吐量、p99 延迟、上游请求数允许的退化比例')
+    parser.add_argument('--compare', metavar='RESULT', help='不运行场景，直接比较该结果文件与 --baseline')
+    parser.add_argument('--verbose', action='store_true', help='输出场景运行中的日志和进度')
+    options = parser.parse_args(argv)
+    try:
+        parse_faults(options.faults)
+    except ValueError as e:
+        parser.error(str(e))
+    return options
+
+
+def apply_bench_settings() -> None:
+    """在 main 中调用，导入本模块不改变配置"""
+    for key, value in BENCH_SETTINGS.items():
+        if key not in os.environ:
+            setattr(settings, key, value)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    options = parse_args(argv)
+    apply_bench_settings()
+    if options.compare:
+        if not options.baseline:
+            print('--compare 需要同时指定 --baseline')
+            return 2
+        with open(options.compare, encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'options': {'scale': options.scale, 'latency': options.latency, 'task_delay': options.task_delay,
+                        'faults': options.faults, 'fault_layer': options.fault_layer,
+                        'slow_delay': options.slow_delay, 'seed': options.seed, 'batch_delay': [settings.BATCH_DELAY_MIN,
+                                                              settings.BATCH_DELAY_MAX]},
+            'scenarios': {},
+        }
+        for name in options.scenario or list(SCENARIOS):
+            print(f'运行场景 {name} ...', flush=True)
+            results['scenarios'][name] = run_scenario(name, options)
+        print_summary(results)
+
+        output = options.output or os.path.join(BENCH_DIR, 'results', f'{time.strftime("%Y%m%d-%H%M%S")}.json')
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'结果已保存：{output}')
+
+    if options.baseline:
+        with open(options.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print(f'{len(regressions)} 项指标退化超过 {options.threshold:.0%}：')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import time
+import heapq
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# 每个文件的固定开销（建立连接、首字节等待），单位：秒
+PER_FILE_OVERHEAD = 0.3
+
+# 小于该大小的文件走快速通道（字节）
+SMALL_FILE_BYTES = 8 * 1024 ** 2
+
+# 单个连接的预估下载速度（字节/秒），用于预估完成时间
+EST_BYTES_PER_SEC = 5 * 1024 ** 2
+
+# 实测吞吐的平滑系数
+EWMA_ALPHA = 0.3
+
+
+class SizeAwareScheduler:
+    """
+    按大小调度下载任务（CLI 与 API 下载共用）
+
+    - 大文件按从大到小的顺序分配（LPT），避免最后剩一个超大文件拖长整体耗时
+    - 小文件走快速通道，由专门的 worker 优先处理，保证小文件尽快完成
+    - 任一通道空闲时会从另一通道取任务，worker 不会闲置
+    """
+
+    def __init__(
+        self,
+        items: List[Dict[str, Any]],
+        workers: int,
+        small_file_bytes: int = SMALL_FILE_BYTES,
+        bytes_per_sec: float = EST_BYTES_PER_SEC
+    ):
+        """
+        初始化调度器
+
+        Args:
+            items: 待下载文件列表，每项需包含 size
+            workers: 并发 worker 数量
+            small_file_bytes: 小文件阈值（字节），小于该值的文件进入快速通道
+            bytes_per_sec: 单个 worker 的预估下载速度（字节/秒），用于预估完成时间
+        """
+        self.workers = max(1, workers)
+        self.bytes_per_sec = bytes_per_sec
+        small = [i for i in items if self._size(i) < small_file_bytes]
+        large = [i for i in items if self._size(i) >= small_file_bytes]
+        self.large: Deque[Dict[str, Any]] = deque(sorted(large, key=self._size, reverse=True))
+        self.small: Deque[Dict[str, Any]] = deque(sorted(small, key=self._size))
+        # 至少 2 个 worker 且存在小文件时，预留 1 个 worker 作为快速通道
+        self.fast_lane_workers = 1 if self.workers >= 2 and self.small else 0
+        self.remaining_bytes = sum(self._size(i) for i in items)
+        self.estimated_seconds = self.estimate_makespan(items)
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @staticmethod
+    def _size(item: Dict[str, Any]) -> int:
+        return int(item.get('size') or 0)
+
+    def lane_of(self, worker_index: int) -> str:
+        """worker 所属通道：small（快速通道）或 large"""
+        return 'small' if worker_index < self.fast_lane_workers else 'large'
+
+    def next_item(self, lane: str) -> Optional[Dict[str, Any]]:
+        """取出下一个任务，本通道为空时从另一通道获取"""
+        primary, secondary = (self.small, self.large) if lane == 'small' else (self.large, self.small)
+        if primary:
+            return primary.popleft()
+        if secondary:
+            return secondary.popleft()
+        return None
+
+    def estimate_makespan(self, items: List[Dict[str, Any]]) -> float:
+        """按 LPT 策略模拟分配，预估全部完成所需秒数"""
+        loads = [0.0] * self.workers
+        for item in sorted(items, key=self._size, reverse=True):
+            cost = self._size(item) / self.bytes_per_sec + PER_FILE_OVERHEAD
+            heapq.heapreplace(loads, loads[0] + cost)
+        return round(max(loads), 2) if items else 0.0
+
+    def record(self, size: int, elapsed: float) -> None:
+        """记录单个文件的实际下载耗时，用于修正吞吐估计"""
+        self.remaining_bytes -= size
+        if elapsed > PER_FILE_OVERHEAD and size > 0:
+            measured = size / (elapsed - PER_FILE_OVERHEAD)
+            self.bytes_per_sec = EWMA_ALPHA * measured + (1 - EWMA_ALPHA) * self.bytes_per_sec
+
+    def eta_seconds(self) -> float:
+        """根据剩余任务和实测吞吐预估剩余时间"""
+        pending = list(self.large) + list(self.small)
+        in_flight_bytes = max(0, self.remaining_bytes - sum(self._size(i) for i in pending))
+        return round(self.estimate_makespan(pending) + in_flight_bytes / self.bytes_per_sec / self.workers, 2)
+
+    def report(self) -> Dict[str, Any]:
+        """调度统计：预估耗时、剩余时间、实际耗时"""
+        end = self.finished_at or time.time()
+        return {
+            "estimated_seconds": self.estimated_seconds,
+            "eta_seconds": 0.0 if self.finished_at else self.eta_seconds(),
+            "elapsed_seconds": round(end - self.started_at, 2),
+            "actual_seconds": round(end - self.started_at, 2) if self.finished_at else None,
+            "bytes_per_sec_per_worker": round(self.bytes_per_sec, 1),
+            "fast_lane_workers": self.fast_lane_workers,
+        }
@@ -0,0 +1,164 @@
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class ConcurrencyLimiter:
+    """并发限制器：限制同时进行的请求数；创建类请求额外保证相邻两次之间的最小间隔（替代每个文件夹的随机等待）"""
+
+    def __init__(self, max_concurrency: int = 5, min_interval: float = 0.0, jitter: float = 0.0) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_interval = min_interval
+        self.jitter = jitter
+        self.in_use = 0
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._pace_lock = asyncio.Lock()
+        self._next_start = 0.0
+
+    async def __aenter__(self) -> 'ConcurrencyLimiter':
+        await self._semaphore.acquire()
+        self.in_use += 1
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.in_use -= 1
+        self._semaphore.release()
+
+    async def pace(self) -> None:
+        """等待到下一个允许的请求发起时间（不占用并发名额）"""
+        if not (self.min_interval or self.jitter):
+            return
+        async with self._pace_lock:
+            delay = self._next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = time.monotonic() + self.min_interval + random.uniform(0, self.jitter)
+
+    async def run(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        async with self:
+            return await func(*args, **kwargs)
+
+    async def run_paced(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """按最小间隔节奏发起请求，用于创建分享、转存等写操作"""
+        await self.pace()
+        return await self.run(func, *args, **kwargs)
+
+
+class TaskPoller:
+    """共享任务轮询器：所有等待中的任务由同一个循环按固定节奏统一查询，避免每个任务各自休眠轮询"""
+
+    def __init__(self, query: Callable[[str, int], Awaitable[Dict[str, Any]]],
+                 limiter: Optional[ConcurrencyLimiter] = None, interval: float = 0.5,
+                 max_polls: int = 30, on_done: Optional[Callable[[str, int], None]] = None) -> None:
+        """
+        Args:
+            query: 查询函数，参数为 (task_id, retry_index)，返回接口原始 JSON
+            limiter: 查询请求共用的并发限制器
+            interval: 两轮查询之间的间隔（秒）
+            max_polls: 单个任务的最大查询次数
+            on_done: 任务结束（完成、失败或超时）时的回调，参数为 (task_id, 查询次数)
+        """
+        self.query = query
+        self.limiter = limiter
+        self.interval = interval
+        self.max_polls = max_polls
+        self.on_done = on_done
+        self.poll_count = 0
+        self._pending: Dict[str, Tuple[asyncio.Future, int]] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def wait(self, task_id: str) -> Dict[str, Any]:
+        """等待任务完成（status == 2），返回任务数据；任务失败或超时抛出异常"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending[task_id] = (future, 0)
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.interval + random.uniform(0, self.interval))
+            task_ids = list(self._pending)
+            # 单个任务查询出错只结束该任务的等待，不影响其他任务继续轮询
+            results = await asyncio.gather(*(self._poll_once(task_id) for task_id in task_ids),
+                                           return_exceptions=True)
+            for task_id, result in zip(task_ids, results):
+                if isinstance(result, Exception):
+                    self._finish(task_id, error=result)
+
+    def _finish(self, task_id: str, future: Optional[asyncio.Future] = None, data: Optional[Dict[str, Any]] = None,
+                error: Optional[Exception] = None) -> bool:
+        """
+        移除等待中的任务并设置结果；等待方已取消（或任务已由新的等待替换）时只移除，不设置结果
+
+        Returns:
+            是否设置了结果
+        """
+        entry = self._pending.get(task_id)
+        if entry is None or (future is not None and entry[0] is not future):
+            return False
+        del self._pending[task_id]
+        future = entry[0]
+        if future.done():
+            return False
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(data)
+        return True
+
+    async def _poll_once(self, task_id: str) -> None:
+        future, polls = self._pending[task_id]
+        if future.done():
+            self._finish(task_id, future)
+            return
+        self._pending[task_id] = (future, polls + 1)
+        self.poll_count += 1
+        try:
+            if self.limiter:
+                json_data = await self.limiter.run(self.query, task_id, polls)
+            else:
+                json_data = await self.query(task_id, polls)
+        except Exception:
+            json_data = {}
+
+        # 查询期间等待方可能已取消（任务被取消、wait_for 超时），此时只移除，不再设置结果
+        if future.done():
+            self._finish(task_id, future)
+            return
+        data = json_data.get('data') if json_data.get('message') == 'ok' else None
+        if data and data.get('status') == 2:
+            finished = self._finish(task_id, future, data=data)
+        elif data and data.get('status') == 1:
+            finished = self._finish(task_id, future,
+                                    error=Exception(f"任务失败：{data.get('task_title', '未知错误')}"))
+        elif polls + 1 >= self.max_polls:
+            finished = self._finish(task_id, future,
+                                    error=Exception(f"任务超时，可能仍在处理中（task_id: {task_id}）"))
+        else:
+            return
+        if finished and self.on_done:
+            self.on_done(task_id, polls + 1)
+
+
+class OrderedWriter:
+    """按序号顺序写出结果：乱序完成的结果先缓存，等前面的序号都到齐后再依次写出"""
+
+    def __init__(self, write: Callable[[Any], None], start: int = 1) -> None:
+        self.write = write
+        self.next_seq = start
+        self._buffer: Dict[int, Any] = {}
+
+    def put(self, seq: int, item: Any = None) -> None:
+        """提交序号 seq 的结果，item 为 None 表示该序号没有输出（例如分享失败）"""
+        self._buffer[seq] = item
+        while self.next_seq in self._buffer:
+            item = self._buffer.pop(self.next_seq)
+            if item is not None:
+                self.write(item)
+            self.next_seq += 1
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
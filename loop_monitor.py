@@ -0,0 +1,79 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+
+class LoopLagMonitor:
+    """事件循环延迟监控：定时测量调度延迟；看门狗线程发现事件循环长时间没有响应时抓取其调用栈，定位阻塞代码"""
+
+    def __init__(self, interval: float = 0.1, slow_threshold: float = 0.1, window: int = 600,
+                 on_lag: Optional[Callable[[float], None]] = None,
+                 on_slow: Optional[Callable[[float, str], None]] = None) -> None:
+        """
+        Args:
+            interval: 测量间隔（秒）
+            slow_threshold: 事件循环阻塞超过该时长（秒）时抓取调用栈
+            window: 计算分位数时保留的最近测量次数
+            on_lag: 每次测量后的回调（在事件循环线程中调用），参数为延迟秒数
+            on_slow: 发现阻塞时的回调（在看门狗线程中调用），参数为 (已阻塞秒数, 事件循环线程的调用栈)
+        """
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.on_lag = on_lag
+        self.on_slow = on_slow
+        self.lags: deque = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._heartbeat = 0.0
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+
+    async def run(self) -> None:
+        """在事件循环中持续测量，取消时停止看门狗线程"""
+        loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                start = loop.time()
+                await asyncio.sleep(self.interval)
+                self.record(max(0.0, loop.time() - start - self.interval))
+                self._heartbeat = time.monotonic()
+        finally:
+            self._stop.set()
+
+    def record(self, lag: float) -> None:
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if self.on_lag:
+            self.on_lag(lag)
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(min(self.interval, self.slow_threshold) / 2):
+            beat = self._heartbeat
+            blocked = time.monotonic() - beat - self.interval
+            # 同一次阻塞只报告一次
+            if blocked < self.slow_threshold or beat == reported:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.stalls += 1
+            if self.on_slow:
+                self.on_slow(blocked, ''.join(traceback.format_stack(frame)))
+
+    def percentiles(self, quantiles: Tuple[float, ...] = (0.5, 0.9, 0.99, 1.0)) -> Dict[float, float]:
+        """最近 window 次测量的延迟分位数（秒），1.0 即最大值"""
+        lags = sorted(self.lags)
+        if not lags:
+            return {}
+        return {q: lags[min(len(lags) - 1, int(q * len(lags)))] for q in quantiles}
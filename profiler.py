@@ -0,0 +1,110 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+# 同一时间只允许一个 cProfile（Python 3.12 起同时启用多个会报错）
+_cprofile_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """采样分析器：后台线程定时抓取目标线程的调用栈，输出 folded stacks 格式（可直接用 flamegraph.pl / speedscope 打开）"""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005) -> None:
+        """
+        Args:
+            thread_id: 采样的线程，默认为当前线程
+            interval: 采样间隔（秒）
+        """
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class Profile:
+    """一次性能分析：cprofile 模式输出 .prof（pstats 格式），sample 模式输出 .folded"""
+
+    def __init__(self, mode: str = 'cprofile', label: str = 'profile', directory: str = 'logs',
+                 interval: float = 0.005) -> None:
+        if mode not in PROFILE_MODES:
+            raise ValueError(f'不支持的分析模式：{mode}')
+        self.mode = mode
+        self.label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)[:60]
+        self.directory = directory
+        self.interval = interval
+        suffix = 'prof' if mode == 'cprofile' else 'folded'
+        now = time.time()
+        stamp = f'{time.strftime("%Y%m%d-%H%M%S", time.localtime(now))}{int(now * 1000) % 1000:03d}'
+        self.path = os.path.join(directory, f'profile-{self.label}-{stamp}-{os.getpid()}.{suffix}')
+        self._profiler = None
+
+    def start(self) -> None:
+        if self.mode == 'cprofile':
+            if not _cprofile_lock.acquire(blocking=False):
+                raise RuntimeError('已有 cProfile 分析正在进行')
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler(interval=self.interval)
+            self._profiler.start()
+
+    def stop(self) -> str:
+        """停止分析并写入文件，返回文件路径"""
+        os.makedirs(self.directory, exist_ok=True)
+        if self.mode == 'cprofile':
+            try:
+                self._profiler.disable()
+                self._profiler.dump_stats(self.path)
+            finally:
+                _cprofile_lock.release()
+        else:
+            self._profiler.stop()
+            self._profiler.dump(self.path)
+        return self.path
+
+
+@contextmanager
+def profiled(mode: Optional[str], label: str, directory: str = 'logs') -> Iterator[Optional[Profile]]:
+    """mode 为空时不做分析；否则在退出时写入分析文件"""
+    if not mode:
+        yield None
+        return
+    profile = Profile(mode, label, directory)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
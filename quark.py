@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
+import dataclasses
 import re
 import sys
 import httpx
@@ -9,24 +10,44 @@ from tqdm import tqdm
 from quark_login import QuarkLogin, CONFIG_DIR
 from utils import (
     custom_print, get_timestamp, read_config,
-    save_config, get_datetime, generate_random_code,
-    safe_copy
+    save_config, get_datetime, generate_random_code, quark_url, safe_copy
 )
+from limiter import ConcurrencyLimiter, TaskPoller, OrderedWriter
+from traverse import FolderNode, FolderSelector, walk_folders
+from share_checkpoint import ShareCheckpoint
+from share_registry import ShareRegistry
+from share_sink import SINK_FORMATS, ShareResult, open_sink
+from retry_queue import RetryItem, RetryQueue
+from share_groups import GROUP_MODES, ShareGroup, ShareGrouper
+import share_ops
+from download_scheduler import SizeAwareScheduler
+from profiler import PROFILE_MODES, profiled
+from loop_monitor import LoopLagMonitor
+import argparse
 import json
 import os
 import random
-from typing import List, Dict, Union, Tuple, Any
+import time
+from typing import List, Dict, Union, Tuple, Any, Optional, Callable
+
+# 批量下载时同时下载的文件数
+DOWNLOAD_CONCURRENCY = 3
+# 下载写入文件的数据块大小（字节）
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
 
 class QuarkPanFileManager:
-    def __init__(self, headless: bool = False, slow_mo: int = 0) -> None:
+    def __init__(self, headless: bool = False, slow_mo: int = 0, cookies: Optional[str] = None,
+                 base_url: Optional[str] = None) -> None:
         self.headless: bool = headless
         self.slow_mo: int = slow_mo
+        # 接口地址，为空时读取环境变量 QUARK_BASE_URL（均未设置时请求夸克网盘）
+        self.base_url: Optional[str] = base_url
         self.folder_id: Union[str, None] = None
         self.user: Union[str, None] = '用户A'
         self.pdir_id: Union[str, None] = '0'
         self.dir_name: Union[str, None] = '根目录'
-        self.cookies: str = self.get_cookies()
+        self.cookies: str = cookies or self.get_cookies()
         self.headers: Dict[str, str] = {
             'user-agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko)'
                           ' Chrome/94.0.4606.71 Safari/537.36 Core/1.94.225.400 QQBrowser/12.2.5544.400',
@@ -41,6 +62,9 @@ class QuarkPanFileManager:
         cookies: str = quark_login.get_cookies()
         return cookies
 
+    def _url(self, path: str, host: str = 'drive-pc.quark.cn') -> str:
+        return quark_url(path, host, self.base_url)
+
     @staticmethod
     def get_pwd_id(share_url: str) -> str:
         return share_url.split('?')[0].split('/s/')[-1]
@@ -58,7 +82,7 @@ class QuarkPanFileManager:
             '__dt': random.randint(100, 9999),
             '__t': get_timestamp(13),
         }
-        api = "https://drive-pc.quark.cn/1/clouddrive/share/sharepage/token"
+        api = self._url('/1/clouddrive/share/sharepage/token')
         data = {"pwd_id": pwd_id, "passcode": password}
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
@@ -73,7 +97,7 @@ class QuarkPanFileManager:
 
     async def get_detail(self, pwd_id: str, stoken: str, pdir_fid: str = '0') -> Tuple[
         str, List[Dict[str, Union[int, str]]]]:
-        api = "https://drive-pc.quark.cn/1/clouddrive/share/sharepage/detail"
+        api = self._url('/1/clouddrive/share/sharepage/detail')
         page = 1
         file_list: List[Dict[str, Union[int, str]]] = []
 
@@ -143,7 +167,7 @@ class QuarkPanFileManager:
 
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
-            response = await client.get('https://drive-pc.quark.cn/1/clouddrive/file/sort', params=params,
+            response = await client.get(self._url('/1/clouddrive/file/sort'), params=params,
                                         headers=self.headers, timeout=timeout)
             json_data = response.json()
             return json_data
@@ -157,7 +181,7 @@ class QuarkPanFileManager:
 
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
-            response = await client.get('https://pan.quark.cn/account/info', params=params,
+            response = await client.get(self._url('/account/info', 'pan.quark.cn'), params=params,
                                         headers=self.headers, timeout=timeout)
             json_data = response.json()
             if json_data['data']:
@@ -186,7 +210,7 @@ class QuarkPanFileManager:
 
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
-            response = await client.post('https://drive-pc.quark.cn/1/clouddrive/file', params=params,
+            response = await client.post(self._url('/1/clouddrive/file'), params=params,
                                          json=json_data, headers=self.headers, timeout=timeout)
             json_data = response.json()
             if json_data["code"] == 0:
@@ -304,7 +328,7 @@ class QuarkPanFileManager:
 
     async def get_share_save_task_id(self, pwd_id: str, stoken: str, first_ids: List[str], share_fid_tokens: List[str],
                                      to_pdir_fid: str = '0') -> str:
-        task_url = "https://drive.quark.cn/1/clouddrive/share/sharepage/save"
+        task_url = self._url('/1/clouddrive/share/sharepage/save', 'drive.quark.cn')
         params = {
             "pr": "ucpro",
             "fr": "pc",
@@ -326,21 +350,34 @@ class QuarkPanFileManager:
             return task_id
 
     @staticmethod
-    async def download_file(download_url: str, save_path: str, headers: dict) -> None:
+    async def download_file(download_url: str, save_path: str, headers: dict,
+                            on_chunk: Union[Callable[[int], Any], None] = None) -> None:
+        """
+        下载单个文件，文件写入在线程中执行，多个文件并发下载时不阻塞事件循环
+
+        Args:
+            on_chunk: 每写入一个数据块后的回调，参数为数据块大小；为空时显示该文件的进度条
+        """
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             async with client.stream("GET", download_url, headers=headers, timeout=timeout) as response:
                 if response.headers.get("content-length") is None:
                     response.headers["content-length"] = "0"
-                with open(save_path, "wb") as f:
-                    with tqdm(unit="B", unit_scale=True,
-                              desc=os.path.basename(save_path),
-                              ncols=80) as pbar:
-                        async for chunk in response.aiter_bytes():
-                            f.write(chunk)
-                            pbar.update(len(chunk))
-
-    async def quark_file_download(self, fids: List[str], folder: str = '', folders_map=None) -> None:
+                f = await asyncio.to_thread(open, save_path, "wb")
+                try:
+                    with tqdm(unit="B", unit_scale=True, desc=os.path.basename(save_path), ncols=80,
+                              disable=on_chunk is not None) as pbar:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            await asyncio.to_thread(f.write, chunk)
+                            if on_chunk:
+                                on_chunk(len(chunk))
+                            else:
+                                pbar.update(len(chunk))
+                finally:
+                    await asyncio.to_thread(f.close)
+
+    async def quark_file_download(self, fids: List[str], folder: str = '', folders_map=None,
+                                  concurrency: int = DOWNLOAD_CONCURRENCY) -> None:
         folders_map = folders_map or {}
         params = {
             'pr': 'ucpro',
@@ -366,7 +403,7 @@ class QuarkPanFileManager:
             "cookie": self.cookies
         }
 
-        download_api = 'https://drive-pc.quark.cn/1/clouddrive/file/download'
+        download_api = self._url('/1/clouddrive/file/download')
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
             response = await client.post(download_api, json=data, headers=headers, params=params, timeout=timeout)
@@ -380,11 +417,9 @@ class QuarkPanFileManager:
 
             save_folder = 'downloads'  # if folder else 'downloads'
             os.makedirs(save_folder, exist_ok=True)
-            n = 0
-            for i in data_list:
-                n += 1
+            items = []
+            for n, i in enumerate(data_list or [], 1):
                 filename = i["file_name"]
-                custom_print(f'开始下载第{n}个文件-{filename}')
 
                 # build save path start
                 base_path = ""
@@ -397,10 +432,35 @@ class QuarkPanFileManager:
                 os.makedirs(final_save_folder, exist_ok=True)
                 # build save path stop
 
-                download_url = i["download_url"]
-                save_path = os.path.join(final_save_folder, filename)
+                items.append({'seq': n, 'file_name': filename, 'size': int(i.get('size') or 0),
+                              'download_url': i["download_url"],
+                              'save_path': os.path.join(final_save_folder, filename)})
+
+        # 按文件大小调度：大文件从大到小分配，小文件走快速通道，并发下载
+        scheduler = SizeAwareScheduler(items, workers=concurrency)
+        failed = 0
+        with tqdm(total=scheduler.remaining_bytes, unit="B", unit_scale=True, desc='下载', ncols=80) as pbar:
+            async def worker(index: int) -> None:
+                nonlocal failed
+                lane = scheduler.lane_of(index)
+                while True:
+                    item = scheduler.next_item(lane)
+                    if item is None:
+                        return
+                    tqdm.write(f"[{get_datetime()}] 开始下载第{item['seq']}个文件-{item['file_name']}")
+                    started = time.time()
+                    try:
+                        await self.download_file(item['download_url'], item['save_path'], headers=self.headers,
+                                                 on_chunk=pbar.update)
+                    except Exception as e:
+                        failed += 1
+                        tqdm.write(f"[{get_datetime()}] 第{item['seq']}个文件下载失败-{item['file_name']}：{e}")
+                        continue
+                    scheduler.record(item['size'], time.time() - started)
 
-                await self.download_file(download_url, save_path, headers=self.headers)
+            await asyncio.gather(*(worker(index) for index in range(scheduler.workers)))
+        if failed:
+            custom_print(f'共 {len(items)} 个文件，{failed} 个下载失败', error_msg=True)
 
     async def submit_task(self, task_id: str, retry: int = 50) -> Union[
         bool, Dict[str, Union[str, Dict[str, Union[int, str]]]]]:
@@ -409,7 +469,7 @@ class QuarkPanFileManager:
             # 随机暂停100-50毫秒
             await asyncio.sleep(random.randint(500, 1000) / 1000)
             custom_print(f'第{i + 1}次提交任务')
-            submit_url = (f"https://drive-pc.quark.cn/1/clouddrive/task?pr=ucpro&fr=pc&uc_param_str=&task_id={task_id}"
+            submit_url = (f"{self._url('/1/clouddrive/task')}?pr=ucpro&fr=pc&uc_param_str=&task_id={task_id}"
                           f"&retry_index={i}&__dt=21192&__t={get_timestamp(13)}")
 
             async with httpx.AsyncClient() as client:
@@ -494,13 +554,11 @@ class QuarkPanFileManager:
 
         return self.pdir_id, self.dir_name
 
-    async def get_share_task_id(self, fid: str, file_name: str, url_type: int = 1, expired_type: int = 2,
-                                password: str = '') -> str:
+    async def get_share_task_id(self, fid: Union[str, List[str]], file_name: str, url_type: int = 1,
+                                expired_type: int = 2, password: str = '') -> str:
 
         json_data = {
-            "fid_list": [
-                fid
-            ],
+            "fid_list": fid if isinstance(fid, list) else [fid],
             "title": file_name,
 
             "url_type": url_type,
@@ -520,11 +578,26 @@ class QuarkPanFileManager:
 
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
-            response = await client.post('https://drive-pc.quark.cn/1/clouddrive/share', params=params,
+            response = await client.post(self._url('/1/clouddrive/share'), params=params,
                                          json=json_data, headers=self.headers, timeout=timeout)
             json_data = response.json()
             return json_data['data']['task_id']
 
+    async def query_task(self, task_id: str, retry_index: int = 0) -> Dict[str, Any]:
+        params = {
+            'pr': 'ucpro',
+            'fr': 'pc',
+            'uc_param_str': '',
+            'task_id': task_id,
+            'retry_index': str(retry_index),
+        }
+
+        async with httpx.AsyncClient() as client:
+            timeout = httpx.Timeout(60.0, connect=60.0)
+            response = await client.get(self._url('/1/clouddrive/task'), params=params,
+                                        headers=self.headers, timeout=timeout)
+            return response.json()
+
     async def get_share_id(self, task_id: str, retry: int = 30) -> str:
         """
         获取分享 ID（带轮询机制）
@@ -543,36 +616,24 @@ class QuarkPanFileManager:
             # 等待任务处理
             await asyncio.sleep(random.randint(500, 1000) / 1000)
 
-            params = {
-                'pr': 'ucpro',
-                'fr': 'pc',
-                'uc_param_str': '',
-                'task_id': task_id,
-                'retry_index': str(i),
-            }
-
-            async with httpx.AsyncClient() as client:
-                timeout = httpx.Timeout(60.0, connect=60.0)
-                response = await client.get('https://drive-pc.quark.cn/1/clouddrive/task', params=params,
-                                            headers=self.headers, timeout=timeout)
-                json_data = response.json()
-
-                # 检查响应状态
-                if json_data.get('message') == 'ok' and json_data.get('data'):
-                    data = json_data['data']
-                    status = data.get('status')
-
-                    # status = 2 表示任务完成
-                    if status == 2 and data.get('share_id'):
-                        return data['share_id']
-                    # status = 1 表示任务失败
-                    elif status == 1:
-                        custom_print(f"分享任务失败：{data.get('task_title', '未知错误')}", error_msg=True)
-                        raise Exception(f"分享任务失败：{data.get('task_title', '未知错误')}")
-                    # status = 0 或其他表示任务进行中，继续轮询
-                else:
-                    # 如果响应异常，继续重试
-                    continue
+            json_data = await self.query_task(task_id, i)
+
+            # 检查响应状态
+            if json_data.get('message') == 'ok' and json_data.get('data'):
+                data = json_data['data']
+                status = data.get('status')
+
+                # status = 2 表示任务完成
+                if status == 2 and data.get('share_id'):
+                    return data['share_id']
+                # status = 1 表示任务失败
+                elif status == 1:
+                    custom_print(f"分享任务失败：{data.get('task_title', '未知错误')}", error_msg=True)
+                    raise Exception(f"分享任务失败：{data.get('task_title', '未知错误')}")
+                # status = 0 或其他表示任务进行中，继续轮询
+            else:
+                # 如果响应异常，继续重试
+                continue
 
         # 超过重试次数
         custom_print(f"获取分享 ID 超时，任务可能仍在处理中（task_id: {task_id}）", error_msg=True)
@@ -590,7 +651,7 @@ class QuarkPanFileManager:
         }
         async with httpx.AsyncClient() as client:
             timeout = httpx.Timeout(60.0, connect=60.0)
-            response = await client.post('https://drive-pc.quark.cn/1/clouddrive/share/password', params=params,
+            response = await client.post(self._url('/1/clouddrive/share/password'), params=params,
                                          json=json_data, headers=self.headers, timeout=timeout)
             json_data = response.json()
             share_url = json_data['data']['share_url']
@@ -599,186 +660,287 @@ class QuarkPanFileManager:
                 share_url = share_url + f"?pwd={json_data['data']['passcode']}"
             return share_url, title
 
+    async def get_my_shares(self, page: int = 1, size: int = 50) -> Dict[str, Any]:
+        params = {
+            'pr': 'ucpro',
+            'fr': 'pc',
+            'uc_param_str': '',
+            '_page': page,
+            '_size': size,
+            '_order_field': 'created_at',
+            '_order_type': 'desc',
+            '_fetch_total': 1,
+            '_fetch_notify_follow': 1,
+        }
+
+        async with httpx.AsyncClient() as client:
+            timeout = httpx.Timeout(60.0, connect=60.0)
+            response = await client.get(self._url('/1/clouddrive/share/mypage/detail'), params=params,
+                                        headers=self.headers, timeout=timeout)
+            return response.json()
+
+    async def list_my_shares(self, limiter: Union[ConcurrencyLimiter, None] = None) -> List[Dict[str, Any]]:
+        """
+        获取账号中已有的全部分享（首页返回总数后，其余分页并发获取）
+
+        Returns:
+            mypage/detail 接口返回的分享条目列表
+        """
+        async def fetch(page: int) -> Dict[str, Any]:
+            if limiter:
+                return await limiter.run(self.get_my_shares, page)
+            return await self.get_my_shares(page)
+
+        first = await fetch(1)
+        if first.get('code') != 0:
+            raise Exception(f"获取分享列表失败：{first.get('message')}")
+        pages = [first]
+        total = first['metadata']['_total']
+        size = first['metadata']['_size']
+        if size and total > size:
+            pages += await asyncio.gather(*(fetch(page) for page in range(2, (total + size - 1) // size + 1)))
+        return [i for json_data in pages for i in (json_data.get('data') or {}).get('list', [])]
+
+    async def load_share_registry(self, checkpoint: ShareCheckpoint,
+                                  limiter: Union[ConcurrencyLimiter, None] = None) -> ShareRegistry:
+        """创建分享登记表，并载入账号已有的分享（载入失败时只使用本地断点记录）"""
+        registry = ShareRegistry(checkpoint)
+        try:
+            count = await registry.seed(lambda: self.list_my_shares(limiter), account=self.cookies)
+            custom_print(f'已载入账号中的 {count} 个分享，参数相同且未过期的文件夹将直接复用')
+        except Exception as e:
+            custom_print(f'获取账号分享列表失败，仅使用本地断点记录：{e}', error_msg=True)
+        return registry
+
+    async def list_child_folders(self, pdir_fid: str, limiter: Union[ConcurrencyLimiter, None] = None
+                                 ) -> List[Dict[str, Any]]:
+        """列出目录下的所有子文件夹，按名称排序"""
+        return await share_ops.list_child_folders(self.get_sorted_file_list, pdir_fid, limiter)
+
     async def share_run(self, share_url: str, folder_id: Union[str, None] = None, url_type: int = 1,
-                        expired_type: int = 2, password: str = '', traverse_depth: int = 2) -> None:
-        first_dir = ''
-        second_dir = ''
+                        expired_type: int = 2, password: str = '', traverse_depth: int = 2,
+                        concurrency: int = 5, selector: Union[FolderSelector, None] = None,
+                        resume: bool = True, result_format: str = 'text',
+                        grouper: Union[ShareGrouper, None] = None) -> None:
         try:
             self.folder_id = folder_id
             custom_print(f'文件夹网页地址：{share_url}')
             pwd_id = share_url.rsplit('/', maxsplit=1)[1].split('-')[0]
 
-            first_page = 1
-            n = 0
-            error = 0
             os.makedirs('share', exist_ok=True)
-            save_share_path = 'share/share_url.txt'
-
-            safe_copy(save_share_path, 'share/share_url_backup.txt')
-            with open(save_share_path, 'w', encoding='utf-8'):
-                pass
 
-            # 如果遍历深度为0，直接分享根目录
-            if traverse_depth == 0:
+            # 已分享的文件夹记录在断点文件中，text 格式的 share_url.txt 每次根据断点记录和本次结果完整重写
+            grouper = grouper or ShareGrouper()
+            checkpoint = ShareCheckpoint('share/checkpoint.jsonl')
+            params = checkpoint.params_key(url_type, expired_type, password, grouper.signature)
+            if resume and len(checkpoint):
+                custom_print(f'已加载 {len(checkpoint)} 条分享断点记录，参数相同且未过期的文件夹将直接跳过')
+            # 多次尝试仍失败的文件夹进入重试队列
+            retry_queue = RetryQueue()
+
+            # 所有请求共用一个限制器；分享任务由同一个轮询器统一查询
+            limiter = ConcurrencyLimiter(concurrency, min_interval=0.2, jitter=0.3)
+            poller = TaskPoller(self.query_task, limiter=limiter)
+            # 断点记录和账号中已有的分享一起组成登记表，已存在且未过期的分享直接复用
+            registry = await self.load_share_registry(checkpoint, limiter) if resume else None
+            error = 0
+            skipped = 0
+            n = 0
+            # 本次分享成功的文件夹需从重试队列中移除，结束时统一写回
+            retry_changed = False
+
+            # text 格式每次重写 share_url.txt，先备份上次的结果
+            if result_format == 'text':
+                safe_copy('share/share_url.txt', 'share/share_url_backup.txt')
+            async with open_sink(result_format, 'share') as sink:
+                # 分享乱序完成，按序号顺序写入结果
+                writer = OrderedWriter(sink.write)
+
+                async def share_folder(group: ShareGroup) -> None:
+                    nonlocal error, retry_changed
+                    seqs = [seq for seq, _ in group.members]
+                    tag = str(seqs[0]) if len(seqs) == 1 else f'{seqs[0]}~{seqs[-1]}'
+                    label = group.members[0][1].path if len(seqs) == 1 else group.title
+                    result = ShareResult(seq=seqs[0], fid=group.fids[0], names=group.members[0][1].names,
+                                         passcode=password)
+                    last_error: Exception = Exception('未知错误')
+                    for attempt in range(3):
+                        result.attempts = attempt + 1
+                        try:
+                            custom_print(f'{tag}.开始分享 {label} 文件夹')
+                            share_title = await share_ops.share_once(self, result, limiter, poller, url_type,
+                                                                     expired_type, password, fids=group.fids,
+                                                                     title=group.title)
+                            if traverse_depth == 0 and share_title:
+                                # 与旧版一致，根目录分享以接口返回的分享标题记录
+                                group.members[0][1].names = [share_title]
+                            # 同一分享中的每个文件夹各自记录一条结果，链接相同
+                            for seq, node in group.members:
+                                checkpoint.record(node.fid, node.names, result.url, params, expired_type,
+                                                  share_id=result.share_id, group_fids=group.fids)
+                                retry_changed = retry_queue.done(node.fid) or retry_changed
+                                writer.put(seq, dataclasses.replace(result, seq=seq, fid=node.fid, names=node.names))
+                            custom_print(f'{tag}.分享成功 {label} 文件夹')
+                            return
+                        except Exception as e:
+                            last_error = e
+                            result.error = str(e) or type(e).__name__
+                            # 失败后退避重试，不占用并发名额
+                            if attempt < 2:
+                                await asyncio.sleep(2 ** attempt + random.random())
+
+                    print('分享失败：', result.error)
+                    error += 1
+                    result.status = 'failed'
+                    result.timings['total'] = time.time() - result.started_at
+                    # 失败的文件夹逐个进入重试队列，重试时单独分享
+                    for seq, node in group.members:
+                        writer.put(seq, dataclasses.replace(result, seq=seq, fid=node.fid, names=node.names))
+                        retry_queue.push(node.fid, node.names, seq, last_error, attempts=result.attempts)
+                    retry_queue.save()
+
+                def on_list_error(node: FolderNode, e: Exception) -> None:
+                    print(f'获取 {node.path or "根目录"} 子文件夹失败：', e)
+                    sink.write(ShareResult(seq=0, fid=node.fid, names=node.names, status='list_failed',
+                                           error=str(e) or type(e).__name__))
+
+                async def list_dirs(fid: str) -> List[Dict[str, Any]]:
+                    return await self.list_child_folders(fid, limiter=limiter)
+
+                async def iter_folders():
+                    # 遍历深度为0时直接分享根目录
+                    if traverse_depth == 0:
+                        custom_print('开始分享页面中所有根目录')
+                        yield FolderNode(fid=pwd_id, names=['根目录'])
+                        return
+                    custom_print(f'开始遍历文件夹，并发数：{concurrency}')
+                    async for folder in walk_folders(list_dirs, pwd_id, selector or FolderSelector(
+                            'depth', depth=traverse_depth), fan_out=concurrency, on_error=on_list_error):
+                        yield folder
+
+                # 遍历结果以流的方式交给分享 worker，边遍历边分享
+                queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+                async def share_worker() -> None:
+                    while True:
+                        group = await queue.get()
+                        if group is None:
+                            return
+                        await share_folder(group)
+
+                workers = [asyncio.create_task(share_worker()) for _ in range(concurrency)]
                 try:
-                    custom_print('开始分享页面中所有根目录')
-                    task_id = await self.get_share_task_id(pwd_id, "根目录", url_type=url_type,
-                                                           expired_type=expired_type,
-                                                           password=password)
-                    share_id = await self.get_share_id(task_id)
-                    share_url, title = await self.submit_share(share_id)
-                    with open(save_share_path, 'a', encoding='utf-8') as f:
-                        content = f'1 | {title} | {share_url}'
-                        f.write(content + '\n')
-                        custom_print(f'分享 {title} 成功')
-                    return
-                except Exception as e:
-                    print('分享失败：', e)
-                    return
-
-            while True:
-                json_data = await self.get_sorted_file_list(pwd_id, page=str(first_page), size='50', fetch_total='1',
-                                                            sort='file_type:asc,file_name:asc')
-                for i1 in json_data['data']['list']:
-                    if i1['dir']:
-                        first_dir = i1['file_name']
-                        # 如果遍历深度为1，直接分享一级目录
-                        if traverse_depth == 1:
-                            n += 1
-                            share_success = False
-                            share_error_msg = ''
-                            fid = ''
-                            for i in range(3):
-                                try:
-                                    custom_print(f'{n}.开始分享 {first_dir} 文件夹')
-                                    random_time = random.choice([0.5, 1, 1.5, 2])
-                                    await asyncio.sleep(random_time)
-                                    fid = i1['fid']
-                                    task_id = await self.get_share_task_id(fid, first_dir, url_type=url_type,
-                                                                           expired_type=expired_type,
-                                                                           password=password)
-                                    share_id = await self.get_share_id(task_id)
-                                    share_url, title = await self.submit_share(share_id)
-                                    with open(save_share_path, 'a', encoding='utf-8') as f:
-                                        content = f'{n} | {first_dir} | {share_url}'
-                                        f.write(content + '\n')
-                                        custom_print(f'{n}.分享成功 {first_dir} 文件夹')
-                                        share_success = True
-                                        break
-                                except Exception as e:
-                                    share_error_msg = e
-                                    error += 1
-
-                            if not share_success:
-                                print('分享失败：', share_error_msg)
-                                save_config('./share/share_error.txt',
-                                            content=f'{error}.{first_dir} 文件夹\n', mode='a')
-                                save_config('./share/retry.txt',
-                                            content=f'{n} | {first_dir} | {fid}\n', mode='a')
+                    async for node in iter_folders():
+                        n += 1
+                        done = registry.get(node.fid, url_type, expired_type, password, grouper.signature) if registry is not None else None
+                        if done:
+                            skipped += 1
+                            writer.put(n, ShareResult(seq=n, fid=node.fid, names=node.names, url=done['share_url'],
+                                                      share_id=done.get('share_id', ''),
+                                                      passcode=done.get('passcode') or password, resumed=True))
                             continue
-
-                        # 遍历深度为2，遍历二级目录
-                        second_page = 1
-                        while True:
-                            # print(f'正在获取{first_dir}第{first_page}页，二级目录第{second_page}页，目前共分享{n}文件')
-                            json_data2 = await self.get_sorted_file_list(i1['fid'], page=str(second_page),
-                                                                         size='50', fetch_total='1',
-                                                                         sort='file_type:asc,file_name:asc')
-                            for i2 in json_data2['data']['list']:
-                                if i2['dir']:
-                                    n += 1
-                                    share_success = False
-                                    share_error_msg = ''
-                                    fid = ''
-                                    for i in range(3):
-                                        try:
-                                            second_dir = i2['file_name']
-                                            custom_print(f'{n}.开始分享 {first_dir}/{second_dir} 文件夹')
-                                            random_time = random.choice([0.5, 1, 1.5, 2])
-                                            await asyncio.sleep(random_time)
-                                            # print('获取到文件夹ID：', i2['fid'])
-                                            fid = i2['fid']
-                                            task_id = await self.get_share_task_id(fid, second_dir, url_type=url_type,
-                                                                                   expired_type=expired_type,
-                                                                                   password=password)
-                                            share_id = await self.get_share_id(task_id)
-                                            share_url, title = await self.submit_share(share_id)
-                                            with open(save_share_path, 'a', encoding='utf-8') as f:
-                                                content = f'{n} | {first_dir} | {second_dir} | {share_url}'
-                                                f.write(content + '\n')
-                                                custom_print(f'{n}.分享成功 {first_dir}/{second_dir} 文件夹')
-                                                share_success = True
-                                                break
-
-                                        except Exception as e:
-                                            share_error_msg = e
-                                            error += 1
-
-                                    if not share_success:
-                                        print('分享失败：', share_error_msg)
-                                        save_config('./share/share_error.txt',
-                                                    content=f'{error}.{first_dir}/{second_dir} 文件夹\n', mode='a')
-                                        save_config('./share/retry.txt',
-                                                    content=f'{n} | {first_dir} | {second_dir} | {fid}\n', mode='a')
-                            second_total = json_data2['metadata']['_total']
-                            second_size = json_data2['metadata']['_size']
-                            second_page = json_data2['metadata']['_page']
-                            if second_size * second_page >= second_total:
-                                break
-                            second_page += 1
-
-                second_total = json_data['metadata']['_total']
-                second_size = json_data['metadata']['_size']
-                second_page = json_data['metadata']['_page']
-                if second_size * second_page >= second_total:
-                    break
-                first_page += 1
-            custom_print(f"总共分享了 {n} 个文件夹，已经保存至 {save_share_path}")
+                        # 分组装满后立即分享，未装满的分组在遍历结束后分享
+                        for group in grouper.add(n, node):
+                            await queue.put(group)
+                    for group in grouper.flush():
+                        await queue.put(group)
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+                finally:
+                    for task in workers:
+                        task.cancel()
+                    checkpoint.close()
+                    if retry_changed:
+                        retry_queue.save()
+
+            custom_print(f"总共分享了 {n} 个文件夹（其中 {skipped} 个复用已有分享，{error} 个分享失败），已经保存至 {sink.path}")
+            if len(retry_queue):
+                custom_print(f"重试队列中有 {len(retry_queue)} 个分享失败的文件夹，可选择【重试分享】处理")
 
         except Exception as e:
             print('分享失败：', e)
             with open('./share/share_error.txt', 'a', encoding='utf-8') as f:
-                f.write(f'{first_dir}/{second_dir} 文件夹')
-
-    async def share_run_retry(self, retry_url: str, url_type: int = 1, expired_type: int = 2, password: str = ''):
-
-        data_list = retry_url.split('\n')
-        n = 0
-        error = 0
-        save_share_path = 'share/retry_share_url.txt'
-        error_data = []
-        for i1 in data_list:
-            data = i1.split(' | ')
-            if data and len(data) == 4:
-                first_dir = data[-3]
-                second_dir = data[-2]
-                fid = data[-1]
-                share_error_msg = ''
-                for i in range(3):
-                    try:
-                        task_id = await self.get_share_task_id(fid, second_dir, url_type=url_type,
-                                                               expired_type=expired_type,
-                                                               password=password)
-                        # print('获取到任务ID：', task_id)
-                        share_id = await self.get_share_id(task_id)
-                        # print('获取到分享ID：', share_id)
-                        share_url, title = await self.submit_share(share_id)
-                        with open(save_share_path, 'a', encoding='utf-8') as f:
-                            content = f'{n} | {first_dir} | {second_dir} | {share_url}'
-                            f.write(content + '\n')
-                            custom_print(f'{n}.分享成功 {first_dir}/{second_dir} 文件夹')
-                            share_success = True
-                            break
-                    except Exception as e:
-                        # print('分享失败：', e)
-                        share_error_msg = e
-                        error += 1
+                f.write(f'{share_url} 文件夹\n')
 
-                if not share_success:
-                    print('分享失败：', share_error_msg)
-                    error_data.append(i1)
-        error_content = '\n'.join(error_data)
-        save_config(path='./share/retry.txt', content=error_content, mode='w')
+    async def share_run_retry(self, url_type: int = 1, expired_type: int = 2, password: str = '',
+                              concurrency: int = 5, result_format: str = 'text') -> None:
+        """
+        重试失败队列中的文件夹：到达退避时间的文件夹并发重试，仍然失败的按退避时间重新排队，
+        超过最大尝试次数的移入死信列表（share/dead_letter.jsonl）
+        """
+        os.makedirs('share', exist_ok=True)
+        retry_queue = RetryQueue()
+        imported = retry_queue.import_legacy('share/retry.txt')
+        if imported:
+            custom_print(f'已从 retry.txt 导入 {imported} 个待重试的文件夹')
+        if not len(retry_queue):
+            custom_print('重试队列为空，没有需要重试的分享')
+            return
+
+        custom_print(f'开始重试 {len(retry_queue)} 个文件夹，并发数：{concurrency}')
+        checkpoint = ShareCheckpoint('share/checkpoint.jsonl')
+        params = checkpoint.params_key(url_type, expired_type, password)
+        limiter = ConcurrencyLimiter(concurrency, min_interval=0.2, jitter=0.3)
+        poller = TaskPoller(self.query_task, limiter=limiter)
+        slots = asyncio.Semaphore(max(1, concurrency))
+        registry = await self.load_share_registry(checkpoint, limiter)
+        succeeded = 0
+
+        # text 格式下成功的链接追加到 retry_share_url.txt
+        sink_options = {'path': 'share/retry_share_url.txt', 'url_mode': 'a'} if result_format == 'text' else {}
+        async with open_sink(result_format, 'share', **sink_options) as sink:
+            async def retry_item(item: RetryItem) -> None:
+                nonlocal succeeded
+                result = ShareResult(seq=item.seq, fid=item.fid, names=item.names, passcode=password)
+                # 之前超时的分享可能已在服务端创建成功，已存在时直接复用
+                done = registry.get(item.fid, url_type, expired_type, password)
+                if done:
+                    result.url, result.share_id, result.resumed = done['share_url'], done.get('share_id', ''), True
+                    result.passcode = done.get('passcode') or password
+                    retry_queue.done(item.fid)
+                    retry_queue.save()
+                    sink.write(result)
+                    succeeded += 1
+                    custom_print(f'{item.seq}.复用已有分享 {item.path} 文件夹')
+                    return
+                while True:
+                    delay = item.next_attempt_at - time.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    async with slots:
+                        result.attempts = item.attempts + 1
+                        try:
+                            await share_ops.share_once(self, result, limiter, poller, url_type, expired_type, password)
+                        except Exception as e:
+                            item = retry_queue.push(item.fid, item.names, item.seq, e)
+                            retry_queue.save()
+                            if item.attempts < retry_queue.max_attempts:
+                                custom_print(f'{item.seq}.分享失败 {item.path} 文件夹（第 {item.attempts} 次，'
+                                             f'{item.error_class}），{round(item.next_attempt_at - time.time(), 1)} 秒后重试')
+                                continue
+                            custom_print(f'{item.seq}.分享失败 {item.path} 文件夹，已移入死信列表：{item.error}',
+                                         error_msg=True)
+                            result.status, result.error = 'failed', item.error
+                            result.timings['total'] = time.time() - result.started_at
+                            sink.write(result)
+                            return
+                    checkpoint.record(item.fid, item.names, result.url, params, expired_type,
+                                      share_id=result.share_id)
+                    retry_queue.done(item.fid)
+                    retry_queue.save()
+                    sink.write(result)
+                    succeeded += 1
+                    custom_print(f'{item.seq}.分享成功 {item.path} 文件夹')
+                    return
+
+            try:
+                await asyncio.gather(*(retry_item(item) for item in retry_queue.items()))
+            finally:
+                checkpoint.close()
+
+        custom_print(f'重试完成：成功 {succeeded} 个，移入死信列表 {len(retry_queue.dead)} 个，'
+                     f'剩余 {len(retry_queue)} 个，结果已保存至 {sink.path}')
 
 
 def load_url_file(fpath: str) -> List[str]:
@@ -790,6 +952,35 @@ def load_url_file(fpath: str) -> List[str]:
     return url_pattern.findall(content)
 
 
+def report_loop_stall(blocked: float, stack: str) -> None:
+    custom_print(f'事件循环已阻塞 {blocked * 1000:.0f}ms，当前调用栈：\n{stack}', error_msg=True)
+
+
+async def run_monitored(coro) -> Any:
+    """运行 coro 的同时监控事件循环延迟，结束后输出延迟分位数和阻塞次数"""
+    monitor = LoopLagMonitor(on_slow=report_loop_stall)
+    monitor_task = asyncio.create_task(monitor.run())
+    try:
+        return await coro
+    finally:
+        monitor_task.cancel()
+        lags = '，'.join(f'p{q * 100:g}={lag * 1000:.1f}ms' for q, lag in monitor.percentiles().items())
+        custom_print(f'事件循环延迟：{lags or "无数据"}，阻塞 {monitor.stalls} 次')
+
+
+def run_session(coro, profile_mode: Optional[str] = None, monitor_loop: bool = False) -> Any:
+    """
+    运行一次转存/分享/下载操作
+
+    指定 profile_mode 时对其做性能分析，结果保存到 logs/ 目录；monitor_loop 为 True 时监控事件循环阻塞
+    """
+    with profiled(profile_mode, coro.cr_code.co_name) as profile:
+        result = asyncio.run(run_monitored(coro) if monitor_loop else coro)
+    if profile:
+        custom_print(f'性能分析结果已保存：{profile.path}')
+    return result
+
+
 def print_ascii():
     print(r"""║                                     _                                  _                     _       ║    
 ║       __ _   _   _    __ _   _ __  | | __    _ __     __ _   _ __     | |_    ___     ___   | |      ║
@@ -812,6 +1003,14 @@ def print_menu() -> None:
 
 
 if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='夸克网盘批量转存、分享、下载工具')
+    arg_parser.add_argument('--profile', nargs='?', const='cprofile', choices=PROFILE_MODES,
+                            help='对转存、分享、下载操作做性能分析，结果保存到 logs/ 目录（默认 cprofile）')
+    arg_parser.add_argument('--loop-monitor', action='store_true',
+                            help='监控事件循环延迟，阻塞超过 100ms 时输出当时的调用栈')
+    cli_args = arg_parser.parse_args()
+    session_options = {'profile_mode': cli_args.profile, 'monitor_loop': cli_args.loop_monitor}
+
     quark_file_manager = QuarkPanFileManager(headless=False, slow_mo=500)
     while True:
         print_menu()
@@ -839,14 +1038,14 @@ if __name__ == '__main__':
                         if ok and ok.strip() == '2':
                             for index, url in enumerate(urls):
                                 print(f"正在转存第{index + 1}个")
-                                asyncio.run(quark_file_manager.run(url.strip(), to_dir_id))
+                                run_session(quark_file_manager.run(url.strip(), to_dir_id), **session_options)
                     except FileNotFoundError:
                         with open('url.txt', 'w', encoding='utf-8'):
                             sys.exit(-1)
                 else:
                     url = input("请输入夸克文件分享地址：")
                     if url and len(url.strip()) > 20:
-                        asyncio.run(quark_file_manager.run(url.strip(), to_dir_id))
+                        run_session(quark_file_manager.run(url.strip(), to_dir_id), **session_options)
 
             elif input_text.strip() == '2':
                 share_option = input("请输入你的选择(1分享 2重试分享)：")
@@ -855,14 +1054,10 @@ if __name__ == '__main__':
                     if not url or len(url.strip()) < 20:
                         continue
                 else:
-                    try:
-                        url = read_config(path='./share/retry.txt', mode='r')
-                        if not url:
-                            print('\nretry.txt 为空！请检查文件')
-                            continue
-                    except FileNotFoundError:
-                        save_config('./share/retry.txt', content='')
-                        print('\nshare/retry.txt 文件为空！')
+                    retry_queue = RetryQueue()
+                    retry_queue.import_legacy('./share/retry.txt')
+                    if not len(retry_queue):
+                        print('\n重试队列为空！没有需要重试的分享')
                         continue
 
                 expired_option = {"1": 2, "2": 3, "3": 4, "4": 1}
@@ -876,19 +1071,59 @@ if __name__ == '__main__':
                 print("\n\r请选择遍历深度：")
                 print("0.不遍历（只分享根目录-默认）")
                 print("1.遍历只分享一级目录")
-                print("2.遍历只分享两级目录\n")
-                traverse_option = input("请输入选项(0/1/2)：")
+                print("2.遍历只分享两级目录")
+                print("N.遍历只分享第N级目录（可输入任意深度）\n")
+                traverse_option = input("请输入选项(0/1/2/N)：")
                 _traverse_depth = 0  # 默认只分享根目录
-                if traverse_option in ['1', '2']:
-                    _traverse_depth = int(traverse_option)
+                if traverse_option.strip().isdigit():
+                    _traverse_depth = int(traverse_option.strip())
+
+                _selector = None
+                if _traverse_depth > 0:
+                    print("\n\r请选择分享范围：")
+                    print("1.只分享第N级目录（默认）")
+                    print("2.只分享叶子目录（没有子文件夹的目录，N为最大深度）")
+                    print("3.分享1到N级的所有目录\n")
+                    mode_option = input("请输入选项(1/2/3)：")
+                    _mode = {'2': 'leaf', '3': 'all'}.get(mode_option.strip(), 'depth')
+                    _name_glob = input("请输入文件夹名称过滤规则(如 *2024*，直接回车不过滤)：").strip()
+                    _selector = FolderSelector(_mode, depth=_traverse_depth, name_glob=_name_glob)
+
+                _grouper = None
+                if _traverse_depth > 0 and share_option == '1':
+                    print("\n\r请选择分享分组方式：")
+                    print("1.每个文件夹单独分享（默认）")
+                    print("2.同一父目录下的文件夹合并为一个分享")
+                    print("3.同一父目录下每N个文件夹合并为一个分享")
+                    print("4.同一父目录下名称前缀相同的文件夹合并为一个分享\n")
+                    group_option = input("请输入选项(1/2/3/4)：")
+                    _group_mode = dict(zip('1234', GROUP_MODES)).get(group_option.strip(), 'none')
+                    _group_size, _prefix_len = 50, 1
+                    if _group_mode == 'chunk':
+                        size_option = input("请输入每个分享包含的文件夹数量(直接回车，默认50)：")
+                        _group_size = int(size_option) if size_option.strip().isdigit() else 50
+                    elif _group_mode == 'prefix':
+                        prefix_option = input("请输入比较的名称前缀长度(直接回车，默认1)：")
+                        _prefix_len = int(prefix_option) if prefix_option.strip().isdigit() else 1
+                    _grouper = ShareGrouper(_group_mode, size=_group_size, prefix_len=_prefix_len)
+
+                concurrency_option = input("请输入同时分享的文件夹数量(直接回车，默认5)：")
+                _concurrency = int(concurrency_option) if concurrency_option.strip().isdigit() else 5
+
+                format_option = input("请选择结果保存格式(1 txt-默认 2 jsonl 3 csv 4 sqlite)：")
+                _result_format = dict(zip('1234', SINK_FORMATS)).get(format_option.strip(), 'text')
 
                 if share_option and share_option == '1':
-                    asyncio.run(quark_file_manager.share_run(
+                    resume_option = input("是否复用已分享且未过期的文件夹链接(1是-默认 2否)：")
+                    run_session(quark_file_manager.share_run(
                         url.strip(), folder_id=to_dir_id, url_type=int(url_encrypt),
-                        expired_type=int(_expired_type), password=passcode, traverse_depth=_traverse_depth))
+                        expired_type=int(_expired_type), password=passcode, traverse_depth=_traverse_depth,
+                        concurrency=max(1, _concurrency), selector=_selector, resume=resume_option.strip() != '2',
+                        result_format=_result_format, grouper=_grouper), **session_options)
                 else:
-                    asyncio.run(quark_file_manager.share_run_retry(url.strip(), url_type=url_encrypt,
-                                                                   expired_type=_expired_type, password=passcode))
+                    run_session(quark_file_manager.share_run_retry(url_type=url_encrypt, expired_type=_expired_type,
+                                                                   password=passcode, concurrency=max(1, _concurrency),
+                                                                   result_format=_result_format), **session_options)
 
             elif input_text.strip() == '3':
                 to_dir_id, to_dir_name = asyncio.run(quark_file_manager.load_folder_id(renew=True))
@@ -907,7 +1142,7 @@ if __name__ == '__main__':
                     if is_batch:
                         if is_batch.strip() == '1':
                             url = input("请输入夸克文件分享地址：")
-                            asyncio.run(quark_file_manager.run(url.strip(), to_dir_id, download=True))
+                            run_session(quark_file_manager.run(url.strip(), to_dir_id, download=True), **session_options)
                         elif is_batch.strip() == '2':
                             urls = load_url_file('./url.txt')
                             if not urls:
@@ -915,7 +1150,7 @@ if __name__ == '__main__':
                                 continue
 
                             for index, url in enumerate(urls):
-                                asyncio.run(quark_file_manager.run(url.strip(), to_dir_id, download=True))
+                                run_session(quark_file_manager.run(url.strip(), to_dir_id, download=True), **session_options)
 
                 except FileNotFoundError:
                     with open('url.txt', 'w', encoding='utf-8'):
@@ -0,0 +1,137 @@
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class RetryItem:
+    fid: str
+    names: List[str] = field(default_factory=list)
+    seq: int = 0
+    attempts: int = 0
+    error_class: str = ''
+    error: str = ''
+    first_failed_at: float = field(default_factory=time.time)
+    last_failed_at: float = field(default_factory=time.time)
+    next_attempt_at: float = 0.0
+
+    @property
+    def path(self) -> str:
+        return '/'.join(self.names)
+
+
+class RetryQueue:
+    """分享失败队列：记录失败原因和尝试次数，按退避时间重试，超过最大尝试次数的移入死信列表"""
+
+    def __init__(self, path: str = 'share/retry_queue.jsonl', dead_letter_path: str = 'share/dead_letter.jsonl',
+                 max_attempts: int = 6, base_delay: float = 2.0, max_delay: float = 300.0) -> None:
+        """
+        Args:
+            path: 失败队列文件
+            dead_letter_path: 死信文件，追加写入
+            max_attempts: 单个文件夹的最大尝试次数（包含批量分享时的尝试）
+            base_delay: 第一次重试前的等待秒数，之后每次翻倍
+            max_delay: 单次等待的上限（秒）
+        """
+        self.path = path
+        self.dead_letter_path = dead_letter_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead: List[RetryItem] = []
+        self._items: Dict[str, RetryItem] = {}
+        self.load()
+
+    def load(self) -> None:
+        self._items.clear()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    item = RetryItem(**json.loads(line))
+                    self._items[item.fid] = item
+                except (json.JSONDecodeError, TypeError):
+                    continue
+
+    def save(self) -> None:
+        """整体重写队列文件，先写临时文件再替换，避免中断时留下半个文件"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for item in self._items.values():
+                f.write(json.dumps(asdict(item), ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def items(self) -> List[RetryItem]:
+        return sorted(self._items.values(), key=lambda i: (i.next_attempt_at, i.seq))
+
+    def backoff(self, attempts: int) -> float:
+        """指数退避加随机抖动"""
+        delay = min(self.max_delay, self.base_delay * 2 ** max(0, attempts - 1))
+        return delay + random.uniform(0, delay / 2)
+
+    def push(self, fid: str, names: List[str], seq: int, error: BaseException, attempts: int = 1) -> RetryItem:
+        """记录一次失败：已在队列中的累加尝试次数，否则新建；超过最大尝试次数时移入死信列表"""
+        now = time.time()
+        item = self._items.get(fid)
+        if item is None:
+            item = RetryItem(fid=fid, names=names, seq=seq, first_failed_at=now)
+            self._items[fid] = item
+        item.attempts += attempts
+        item.error_class = type(error).__name__
+        item.error = str(error) or item.error_class
+        item.last_failed_at = now
+        item.next_attempt_at = now + self.backoff(item.attempts)
+        if item.attempts >= self.max_attempts:
+            self.bury(item)
+        return item
+
+    def done(self, fid: str) -> bool:
+        """移除已成功的文件夹，返回其是否在队列中"""
+        return self._items.pop(fid, None) is not None
+
+    def bury(self, item: RetryItem) -> None:
+        """移入死信列表，不再自动重试"""
+        self._items.pop(item.fid, None)
+        self.dead.append(item)
+        os.makedirs(os.path.dirname(self.dead_letter_path) or '.', exist_ok=True)
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(asdict(item), ensure_ascii=False) + '\n')
+
+    def import_legacy(self, path: str = 'share/retry.txt') -> int:
+        """
+        导入旧版 retry.txt（序号 | 各级目录 | fid），导入后清空该文件
+
+        Returns:
+            导入的条数
+        """
+        if not os.path.exists(path):
+            return 0
+        count = 0
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = [i.strip() for i in line.strip().split(' | ')]
+                if len(fields) < 3 or fields[-1] in self._items:
+                    continue
+                seq = int(fields[0]) if fields[0].isdigit() else 0
+                self._items[fields[-1]] = RetryItem(fid=fields[-1], names=fields[1:-1], seq=seq, attempts=0,
+                                                    error_class='Legacy', error='旧版 retry.txt 导入')
+                count += 1
+        if count:
+            self.save()
+        open(path, 'w', encoding='utf-8').close()
+        return count
+
+    def next_due(self) -> Optional[float]:
+        """最早一个待重试项的时间戳，队列为空时返回 None"""
+        items = self.items()
+        return items[0].next_attempt_at if items else None
@@ -0,0 +1,97 @@
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# 分享时长（expired_type）对应的有效秒数，1 为永久
+EXPIRE_SECONDS = {1: None, 2: 86400, 3: 7 * 86400, 4: 30 * 86400}
+
+
+class ShareCheckpoint:
+    """分享断点记录：记录已分享的文件夹 fid 及分享链接，中断后重新运行时跳过参数相同且未过期的文件夹"""
+
+    def __init__(self, path: str = 'share/checkpoint.jsonl', fsync_interval: float = 5.0) -> None:
+        """
+        Args:
+            path: 断点文件路径
+            fsync_interval: 两次 fsync 的最小间隔（秒）；每条记录都会立即写入文件，进程中断不会丢失
+        """
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._records: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._file = None
+        self._last_fsync = time.monotonic()
+        self.load()
+
+    @staticmethod
+    def params_key(url_type: int, expired_type: int, password: str = '', group: str = 'none') -> str:
+        """
+        分享参数的标识，参数不同的记录互不复用
+
+        Args:
+            group: 分组方式（ShareGrouper.signature）；合并分享的链接包含其他文件夹，不能当作单个文件夹的分享复用
+        """
+        key = f'{url_type}|{expired_type}|{password}'
+        # 单独分享沿用原格式，已有的断点记录仍然有效
+        return key if group == 'none' else f'{key}|{group}'
+
+    def load(self) -> None:
+        """读取断点文件，同一文件夹同一参数只保留最新的一条；损坏的行（如写入时中断）直接跳过"""
+        self._records.clear()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    self._records[(record['fid'], record['params'])] = record
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, fid: str, params: str, min_remaining: float = 0) -> Optional[Dict[str, Any]]:
+        """返回参数相同且剩余有效期不少于 min_remaining 秒的记录"""
+        record = self._records.get((fid, params))
+        if record is None:
+            return None
+        ttl = EXPIRE_SECONDS.get(record.get('expired_type'))
+        if ttl is not None and time.time() + min_remaining > record.get('created_at', 0) + ttl:
+            return None
+        return record
+
+    def record(self, fid: str, names: List[str], share_url: str, params: str, expired_type: int,
+               share_id: str = '', group_fids: Optional[List[str]] = None) -> None:
+        """
+        追加一条分享记录，立即写入文件，保证中断后不会重复创建分享；group_fids 为同一分享中的全部文件夹
+
+        记录在事件循环中写入，fsync 按 fsync_interval 合并执行，关闭时再执行一次
+        """
+        record = {
+            'fid': fid,
+            'names': names,
+            'share_url': share_url,
+            'share_id': share_id,
+            'params': params,
+            'expired_type': expired_type,
+            'created_at': int(time.time()),
+        }
+        if group_fids and len(group_fids) > 1:
+            record['group_fids'] = group_fids
+        self._records[(fid, params)] = record
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+from traverse import FolderNode
+
+GROUP_MODES = ('none', 'parent', 'chunk', 'prefix')
+
+# 单个分享包含的文件夹数上限
+MAX_FIDS_PER_SHARE = 200
+
+
+@dataclass
+class ShareGroup:
+    key: str
+    members: List[Tuple[int, FolderNode]] = field(default_factory=list)  # (序号, 文件夹)
+
+    @property
+    def fids(self) -> List[str]:
+        return [node.fid for _, node in self.members]
+
+    @property
+    def title(self) -> str:
+        """分享标题：单个文件夹用文件夹名，多个文件夹用“第一个文件夹名等N个文件夹”"""
+        first = self.members[0][1].name
+        return first if len(self.members) == 1 else f'{first}等{len(self.members)}个文件夹'
+
+
+class ShareGrouper:
+    """
+    分享分组：把多个文件夹打包进同一个分享任务，减少创建分享和轮询的次数
+
+    - none: 每个文件夹单独分享
+    - parent: 同一父目录下的文件夹合并分享
+    - chunk: 同一父目录下的文件夹按遍历顺序每 size 个合并分享
+    - prefix: 同一父目录下名称前 prefix_len 个字符相同的文件夹合并分享
+    与网页端一致，一个分享只包含同一目录下的文件夹
+    """
+
+    def __init__(self, mode: str = 'none', size: int = 50, prefix_len: int = 1) -> None:
+        """
+        Args:
+            mode: 分组模式
+            size: chunk 模式下每个分享的文件夹数
+            prefix_len: prefix 模式下比较的名称前缀长度
+        """
+        if mode not in GROUP_MODES:
+            raise ValueError(f'不支持的分组模式：{mode}')
+        self.mode = mode
+        self.size = {'none': 1, 'chunk': max(1, min(size, MAX_FIDS_PER_SHARE))}.get(mode, MAX_FIDS_PER_SHARE)
+        self.prefix_len = max(1, prefix_len)
+        self._open: 'OrderedDict[str, ShareGroup]' = OrderedDict()
+
+    @property
+    def signature(self) -> str:
+        """分组方式的标识，记入分享断点：不同分组方式创建的分享互不复用"""
+        if self.mode == 'chunk':
+            return f'chunk:{self.size}'
+        if self.mode == 'prefix':
+            return f'prefix:{self.prefix_len}'
+        return self.mode
+
+    def key_of(self, node: FolderNode) -> str:
+        if self.mode == 'prefix':
+            return f'{node.pdir_fid or ""}/{node.name[:self.prefix_len]}'
+        return node.pdir_fid or ''
+
+    def add(self, seq: int, node: FolderNode) -> List[ShareGroup]:
+        """加入一个文件夹，返回已装满、可以立即分享的分组"""
+        key = self.key_of(node)
+        group = self._open.setdefault(key, ShareGroup(key=key))
+        group.members.append((seq, node))
+        if len(group.members) >= self.size:
+            return [self._open.pop(key)]
+        return []
+
+    def flush(self) -> List[ShareGroup]:
+        """遍历结束后返回所有未装满的分组"""
+        groups = list(self._open.values())
+        self._open.clear()
+        return groups
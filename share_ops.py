@@ -0,0 +1,86 @@
+import asyncio
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Awaitable, Callable, ContextManager, Dict, Iterator, List, Optional
+
+from limiter import ConcurrencyLimiter, TaskPoller
+from share_sink import ShareResult
+
+# 分享的各阶段：stage(name) 返回包住该阶段的上下文管理器（API 用于记录 trace span）
+StageHook = Callable[[str], ContextManager]
+
+
+@contextmanager
+def _timed(result: ShareResult, name: str, stage: Optional[StageHook]) -> Iterator[None]:
+    """记录一个阶段的耗时，阶段失败时不记录"""
+    start = time.monotonic()
+    with stage(name) if stage else nullcontext():
+        yield
+    result.timings[name] = time.monotonic() - start
+
+
+async def share_once(client: Any, result: ShareResult, limiter: ConcurrencyLimiter, poller: TaskPoller,
+                     url_type: int = 1, expired_type: int = 2, password: str = '',
+                     fids: Optional[List[str]] = None, title: Optional[str] = None,
+                     stage: Optional[StageHook] = None) -> str:
+    """
+    创建一次分享：创建分享任务 → 等待任务完成 → 获取分享链接（CLI 与 API 共用）
+
+    Args:
+        client: 提供 get_share_task_id、submit_share 的客户端（QuarkPanFileManager 或 QuarkService）
+        result: 分享结果，成功后写入 share_id、url，并记录各阶段耗时
+        limiter: 共用的并发限制器
+        poller: 共用的任务轮询器
+        fids: 同一分享中的多个文件夹 ID，默认只分享 result.fid
+        title: 分享标题，默认使用文件夹名
+        stage: 各阶段（create / poll / submit）的上下文管理器工厂
+
+    Returns:
+        分享标题（获取分享链接时接口返回）
+
+    Raises:
+        Exception: 任一步骤失败时抛出异常
+    """
+    with _timed(result, 'create', stage):
+        task_id = await limiter.run_paced(client.get_share_task_id, fids or [result.fid], title or result.names[-1],
+                                          url_type=url_type, expired_type=expired_type, password=password)
+    with _timed(result, 'poll', stage):
+        data = await poller.wait(task_id)
+    if not data.get('share_id'):
+        raise Exception(f"分享任务未返回分享 ID（task_id: {task_id}）")
+    with _timed(result, 'submit', stage):
+        share_url, share_title = await limiter.run(client.submit_share, data['share_id'])
+    result.share_id, result.url = data['share_id'], share_url
+    if '?pwd=' in share_url:
+        result.passcode = share_url.split('?pwd=', 1)[1]
+    result.timings['total'] = time.time() - result.started_at
+    return share_title
+
+
+async def list_child_folders(list_page: Callable[..., Awaitable[Dict[str, Any]]], pdir_fid: str,
+                             limiter: Optional[ConcurrencyLimiter] = None) -> List[Dict[str, Any]]:
+    """
+    列出目录下的所有子文件夹（首页返回总数后，其余分页并发获取；CLI 与 API 共用）
+
+    Args:
+        list_page: 获取一页文件列表的方法（get_sorted_file_list）
+        pdir_fid: 目录 ID
+        limiter: 共用的并发限制器
+
+    Returns:
+        子文件夹列表，按名称排序
+    """
+    async def fetch(page: int) -> Dict[str, Any]:
+        kwargs = dict(page=str(page), size='50', fetch_total='1', sort='file_type:asc,file_name:asc')
+        json_data = await (limiter.run(list_page, pdir_fid, **kwargs) if limiter else list_page(pdir_fid, **kwargs))
+        if not json_data.get('data'):
+            raise Exception(f"获取目录文件列表失败：{json_data.get('message', '未知错误')}")
+        return json_data
+
+    first = await fetch(1)
+    pages = [first]
+    total = first['metadata']['_total']
+    size = first['metadata']['_size']
+    if size and total > size:
+        pages += await asyncio.gather(*(fetch(page) for page in range(2, (total + size - 1) // size + 1)))
+    return [i for json_data in pages for i in json_data['data']['list'] if i.get('dir')]
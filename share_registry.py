@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from share_checkpoint import ShareCheckpoint
+
+# 剩余有效期不足该秒数的分享不再复用，避免拿到即将失效的链接
+MIN_REMAINING_SECONDS = 3600
+
+
+class ShareRegistry:
+    """
+    分享登记表：按 (fid, url_type, expired_type, passcode) 查找可复用的分享
+
+    先查本地断点记录，再查账号中已有的分享列表；账号分享列表只在缓存过期时分页拉取一次
+    """
+
+    def __init__(self, checkpoint: ShareCheckpoint, cache_path: str = 'share/account_shares.json',
+                 cache_ttl: float = 6 * 3600, min_remaining: float = MIN_REMAINING_SECONDS) -> None:
+        """
+        Args:
+            checkpoint: 本地断点记录
+            cache_path: 账号分享列表的缓存文件
+            cache_ttl: 缓存有效期（秒）
+            min_remaining: 复用分享要求的最短剩余有效期（秒）
+        """
+        self.checkpoint = checkpoint
+        self.cache_path = cache_path
+        self.cache_ttl = cache_ttl
+        self.min_remaining = min_remaining
+        self._shares: Dict[Tuple[str, int, int], List[Dict[str, Any]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(i) for i in self._shares.values())
+
+    async def seed(self, list_shares: Callable[[], Awaitable[List[Dict[str, Any]]]], account: str = '',
+                   refresh: bool = False) -> int:
+        """
+        载入账号已有的分享：缓存未过期且属于同一账号时直接读取缓存，否则调用 list_shares 拉取并写入缓存
+
+        Args:
+            list_shares: 拉取账号全部分享的函数，返回 mypage/detail 接口的原始条目
+            account: 账号标识（如 Cookie），只保存其摘要，用于区分不同账号的缓存
+            refresh: 忽略缓存重新拉取
+
+        Returns:
+            载入的分享数量
+        """
+        account_key = hashlib.sha256(account.encode('utf-8')).hexdigest()[:16]
+        items = None if refresh else self._read_cache(account_key)
+        if items is None:
+            items = await list_shares()
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'account': account_key, 'fetched_at': time.time(), 'items': items}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+
+        self._shares.clear()
+        for item in items:
+            share = self._normalize(item)
+            if share:
+                self._shares.setdefault((share['fid'], share['url_type'], share['expired_type']), []).append(share)
+        return len(self)
+
+    def _read_cache(self, account_key: str) -> Optional[List[Dict[str, Any]]]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if cache.get('account') != account_key or time.time() - cache.get('fetched_at', 0) > self.cache_ttl:
+            return None
+        return cache.get('items') or []
+
+    @staticmethod
+    def _normalize(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """将 mypage/detail 的条目转换为登记表记录；已失效、已删除或包含多个文件（夹）的分享返回 None"""
+        fid = item.get('first_fid') or item.get('fid')
+        if not fid or not item.get('share_url') or item.get('status', 1) != 1:
+            return None
+        # 包含多个文件（夹）的分享（如合并分享）不能当作 first_fid 单独的分享复用
+        if int(item.get('file_num') or 1) > 1 or len(item.get('fid_list') or []) > 1:
+            return None
+        passcode = item.get('passcode') or ''
+        share_url = item['share_url']
+        if passcode and '?pwd=' not in share_url:
+            share_url = share_url + f'?pwd={passcode}'
+        # 接口时间为毫秒，永久分享的 expired_at 为 0 或缺失
+        expired_at = (item.get('expired_at') or 0) / 1000 if item.get('expired_type') != 1 else 0
+        return {
+            'fid': fid,
+            'share_id': item.get('share_id', ''),
+            'share_url': share_url,
+            'url_type': int(item.get('url_type') or (2 if passcode else 1)),
+            'expired_type': int(item.get('expired_type') or 1),
+            'passcode': passcode,
+            'expired_at': expired_at,
+        }
+
+    def get(self, fid: str, url_type: int, expired_type: int, passcode: str = '',
+            group: str = 'none') -> Optional[Dict[str, Any]]:
+        """
+        查找可复用的分享
+
+        Args:
+            fid: 文件夹 ID
+            url_type: 1 公开 / 2 加密
+            expired_type: 分享时长
+            passcode: 提取码；加密分享未指定提取码（随机生成）时，任意提取码都可复用
+            group: 分组方式，只复用同一分组方式创建的断点记录
+
+        Returns:
+            记录（包含 share_url、share_id），没有可复用的分享时返回 None
+        """
+        record = self.checkpoint.get(fid, self.checkpoint.params_key(url_type, expired_type, passcode, group),
+                                     min_remaining=self.min_remaining)
+        if record:
+            return record
+        deadline = time.time() + self.min_remaining
+        for share in self._shares.get((fid, url_type, expired_type), []):
+            if url_type == 2 and passcode and share['passcode'] != passcode:
+                continue
+            if share['expired_at'] and share['expired_at'] < deadline:
+                continue
+            return share
+        return None
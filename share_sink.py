@@ -0,0 +1,273 @@
+import asyncio
+import csv
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+SINK_FORMATS = ('text', 'jsonl', 'csv', 'sqlite')
+
+# 结构化结果的字段顺序（CSV 表头、SQLite 列）
+RESULT_FIELDS = ('seq', 'status', 'fid', 'path', 'share_id', 'url', 'passcode', 'attempts', 'error', 'resumed',
+                 'started_at', 'create_seconds', 'poll_seconds', 'submit_seconds', 'total_seconds')
+
+SQLITE_TYPES = {'seq': 'INTEGER', 'attempts': 'INTEGER', 'resumed': 'INTEGER', 'started_at': 'REAL',
+                'create_seconds': 'REAL', 'poll_seconds': 'REAL', 'submit_seconds': 'REAL', 'total_seconds': 'REAL'}
+
+
+@dataclass
+class ShareResult:
+    seq: int
+    fid: str
+    names: List[str] = field(default_factory=list)
+    status: str = 'success'  # success / failed / list_failed（列子目录失败）
+    share_id: str = ''
+    url: str = ''
+    passcode: str = ''
+    attempts: int = 0
+    error: str = ''
+    resumed: bool = False  # 复用已有分享（断点记录或账号中已有的分享），本次未重新创建
+    started_at: float = field(default_factory=time.time)
+    timings: Dict[str, float] = field(default_factory=dict)  # create / poll / submit / total 各阶段耗时（秒）
+
+    @property
+    def path(self) -> str:
+        return '/'.join(self.names)
+
+    def to_row(self) -> Dict[str, Any]:
+        row = {k: v for k, v in asdict(self).items() if k not in ('names', 'timings')}
+        row['path'] = self.path
+        for stage in ('create', 'poll', 'submit', 'total'):
+            row[f'{stage}_seconds'] = round(self.timings[stage], 3) if stage in self.timings else None
+        return row
+
+
+class ResultSink(ABC):
+    """分享结果输出：结果先写入内存缓冲区，由后台任务定时批量写盘并周期性 fsync，不阻塞分享流程"""
+
+    def __init__(self, path: str, flush_interval: float = 1.0, fsync_interval: float = 5.0,
+                 buffer_size: int = 100) -> None:
+        """
+        Args:
+            path: 输出文件路径
+            flush_interval: 缓冲区写盘间隔（秒）
+            fsync_interval: fsync 间隔（秒），关闭时总会 fsync
+            buffer_size: 缓冲条数达到该值时立即写盘
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.buffer_size = buffer_size
+        self.written = 0
+        self._buffer: List[ShareResult] = []
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._last_fsync = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> 'ResultSink':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def open(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        await asyncio.to_thread(self._open)
+        self._task = asyncio.create_task(self._run())
+
+    def write(self, result: ShareResult) -> None:
+        """写入一条结果（只进入缓冲区，可在同步回调中调用）"""
+        self._buffer.append(result)
+        if len(self._buffer) >= self.buffer_size:
+            self._wakeup.set()
+
+    async def flush(self, fsync: bool = False) -> None:
+        async with self._lock:
+            results, self._buffer = self._buffer, []
+            if results:
+                await asyncio.to_thread(self._write, results)
+                self.written += len(results)
+            if fsync or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                await asyncio.to_thread(self._sync)
+                self._last_fsync = time.monotonic()
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush(fsync=True)
+        finally:
+            await asyncio.to_thread(self._close)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    # 以下方法在线程中执行
+    @abstractmethod
+    def _open(self) -> None:
+        ...
+
+    @abstractmethod
+    def _write(self, results: List[ShareResult]) -> None:
+        ...
+
+    @abstractmethod
+    def _sync(self) -> None:
+        ...
+
+    @abstractmethod
+    def _close(self) -> None:
+        ...
+
+
+class _FileSink(ResultSink):
+    mode = 'a'
+
+    def __init__(self, path: str, **kwargs) -> None:
+        super().__init__(path, **kwargs)
+        self._file = None
+
+    def _open(self) -> None:
+        self._file = open(self.path, self.mode, encoding='utf-8', newline='')
+
+    def _sync(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JsonlSink(_FileSink):
+    """每行一条 JSON 结果，追加写入"""
+
+    def _write(self, results: List[ShareResult]) -> None:
+        self._file.write(''.join(json.dumps(r.to_row(), ensure_ascii=False) + '\n' for r in results))
+
+
+class CsvSink(_FileSink):
+    """CSV 结果，追加写入，新文件写入表头"""
+
+    def _open(self) -> None:
+        super()._open()
+        self._writer = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS)
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def _write(self, results: List[ShareResult]) -> None:
+        self._writer.writerows(r.to_row() for r in results)
+
+
+class SqliteSink(ResultSink):
+    """SQLite 结果表 share_results，每次写盘一个事务"""
+
+    def __init__(self, path: str, **kwargs) -> None:
+        super().__init__(path, **kwargs)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _open(self) -> None:
+        # 连接只在持有写锁的线程中使用
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        columns = ', '.join(f'{name} {SQLITE_TYPES.get(name, "TEXT")}' for name in RESULT_FIELDS)
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS share_results ({columns})')
+        self._conn.commit()
+
+    def _write(self, results: List[ShareResult]) -> None:
+        placeholders = ', '.join('?' for _ in RESULT_FIELDS)
+        rows = [tuple(r.to_row()[name] for name in RESULT_FIELDS) for r in results]
+        self._conn.executemany(f'INSERT INTO share_results ({", ".join(RESULT_FIELDS)}) VALUES ({placeholders})',
+                               rows)
+        self._conn.commit()
+
+    def _sync(self) -> None:
+        if self._conn is not None:
+            self._conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class TextSink(ResultSink):
+    """
+    兼容旧版的文本输出：
+    成功写入 share_url.txt（序号 | 各级目录 | 链接），失败写入 share_error.txt；失败的文件夹由重试队列负责记录
+    """
+
+    def __init__(self, path: str = 'share/share_url.txt', error_path: Optional[str] = 'share/share_error.txt',
+                 url_mode: str = 'w', **kwargs) -> None:
+        """
+        Args:
+            path: 分享链接文件
+            error_path: 失败记录文件，None 表示不写
+            url_mode: 分享链接文件的打开方式，w 为每次重写，a 为追加
+        """
+        super().__init__(path, **kwargs)
+        self.error_path = error_path
+        self.url_mode = url_mode
+        self._files: Dict[str, Any] = {}
+
+    def _open(self) -> None:
+        self._files = {'url': open(self.path, self.url_mode, encoding='utf-8')}
+        if self.error_path:
+            self._files['error'] = open(self.error_path, 'a', encoding='utf-8')
+
+    def _write(self, results: List[ShareResult]) -> None:
+        error_file = self._files.get('error')
+        for r in results:
+            if r.status == 'success':
+                self._files['url'].write(' | '.join([str(r.seq)] + r.names + [r.url]) + '\n')
+            elif not error_file:
+                continue
+            elif r.status == 'list_failed':
+                error_file.write(f'{r.path or "根目录"} 文件夹列表获取失败\n')
+            else:
+                error_file.write(f'{r.seq}.{r.path} 文件夹（{r.error}）\n')
+
+    def _sync(self) -> None:
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+def open_sink(fmt: str = 'text', directory: str = 'share', **kwargs) -> ResultSink:
+    """
+    按格式创建结果输出
+
+    Args:
+        fmt: text（兼容旧版的 share_url.txt / share_error.txt）/ jsonl / csv / sqlite
+        directory: 输出目录，结构化格式写入 share_result.jsonl / share_result.csv / share_result.db
+        kwargs: 传给具体输出类的参数
+    """
+    if fmt == 'text':
+        kwargs.setdefault('error_path', os.path.join(directory, 'share_error.txt'))
+        return TextSink(kwargs.pop('path', os.path.join(directory, 'share_url.txt')), **kwargs)
+    sinks = {'jsonl': (JsonlSink, 'share_result.jsonl'), 'csv': (CsvSink, 'share_result.csv'),
+             'sqlite': (SqliteSink, 'share_result.db')}
+    if fmt not in sinks:
+        raise ValueError(f'不支持的结果格式：{fmt}')
+    cls, filename = sinks[fmt]
+    return cls(kwargs.pop('path', os.path.join(directory, filename)), **kwargs)
@@ -0,0 +1,135 @@
+import asyncio
+import fnmatch
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+@dataclass
+class FolderNode:
+    fid: str
+    names: List[str] = field(default_factory=list)  # 从遍历起点开始的各级目录名（不含起点）
+    depth: int = 0
+    is_leaf: Optional[bool] = None  # 未列出子目录时为 None
+    pdir_fid: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.names[-1] if self.names else ''
+
+    @property
+    def path(self) -> str:
+        return '/'.join(self.names)
+
+
+class FolderSelector:
+    """文件夹选择器：决定遍历到多深，以及哪些文件夹需要输出"""
+
+    def __init__(self, mode: str = 'depth', depth: Optional[int] = None, name_glob: str = '') -> None:
+        """
+        Args:
+            mode: depth 只输出第 depth 级目录；leaf 只输出叶子目录；all 输出 1..depth 级的所有目录
+            depth: depth 模式下为目标深度；leaf/all 模式下为最大深度，None 表示不限
+            name_glob: 文件夹名称通配符（如 *2024*），包含 / 时匹配相对路径
+        """
+        if mode not in ('depth', 'leaf', 'all'):
+            raise ValueError(f'不支持的选择模式：{mode}')
+        if mode == 'depth' and depth is None:
+            raise ValueError('depth 模式必须指定遍历深度')
+        self.mode = mode
+        self.depth = depth
+        self.name_glob = name_glob
+
+    def should_list(self, node: FolderNode) -> bool:
+        """是否需要列出该目录的子目录"""
+        if self.mode == 'depth':
+            return node.depth < self.depth
+        if self.mode == 'all':
+            return self.depth is None or node.depth < self.depth
+        # leaf 模式需要列出边界层目录，才能判断它是不是叶子
+        return self.depth is None or node.depth <= self.depth
+
+    def match(self, node: FolderNode) -> bool:
+        if node.depth == 0:
+            return False
+        if self.mode == 'depth' and node.depth != self.depth:
+            return False
+        if self.mode == 'leaf' and (node.is_leaf is not True or (self.depth is not None and node.depth > self.depth)):
+            return False
+        if self.mode == 'all' and self.depth is not None and node.depth > self.depth:
+            return False
+        if self.name_glob:
+            target = node.path if '/' in self.name_glob else node.name
+            return fnmatch.fnmatch(target, self.name_glob)
+        return True
+
+
+async def walk_folders(list_dirs: Callable[[str], Awaitable[List[Dict[str, Any]]]], root_fid: str,
+                       selector: FolderSelector, fan_out: int = 4,
+                       on_error: Optional[Callable[[FolderNode, Exception], None]] = None
+                       ) -> AsyncIterator[FolderNode]:
+    """
+    广度优先并发遍历文件夹，边遍历边输出匹配的文件夹
+
+    Args:
+        list_dirs: 列出子目录的函数，参数为目录 fid，返回 [{'fid', 'file_name'}, ...]
+        root_fid: 遍历起点目录 ID
+        selector: 文件夹选择器
+        fan_out: 同时列目录的数量上限
+        on_error: 列目录失败时的回调，失败的目录不再向下遍历
+
+    Yields:
+        匹配的 FolderNode，输出顺序取决于列目录的完成顺序
+    """
+    frontier: asyncio.Queue = asyncio.Queue()
+    output: asyncio.Queue = asyncio.Queue(maxsize=max(1, fan_out) * 100)
+    done = object()
+    unfinished = 1
+    frontier.put_nowait(FolderNode(fid=root_fid))
+
+    async def visit(node: FolderNode) -> None:
+        nonlocal unfinished
+        try:
+            children = await list_dirs(node.fid)
+        except Exception as e:
+            if on_error:
+                on_error(node, e)
+            return
+        node.is_leaf = not children
+        # 列出过的目录在此时输出（此时已知是否为叶子），未列出的目录在发现时输出
+        if selector.match(node):
+            await output.put(node)
+        for child in children:
+            child_node = FolderNode(fid=child['fid'], names=node.names + [child['file_name']],
+                                    depth=node.depth + 1, pdir_fid=node.fid)
+            if selector.should_list(child_node):
+                unfinished += 1
+                frontier.put_nowait(child_node)
+            elif selector.match(child_node):
+                await output.put(child_node)
+
+    async def worker() -> None:
+        nonlocal unfinished
+        while True:
+            node = await frontier.get()
+            if node is done:
+                return
+            try:
+                await visit(node)
+            finally:
+                unfinished -= 1
+                if unfinished == 0:
+                    await output.put(done)
+                    for _ in range(max(1, fan_out)):
+                        frontier.put_nowait(done)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, fan_out))]
+    try:
+        while True:
+            node = await output.get()
+            if node is done:
+                break
+            yield node
+    finally:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
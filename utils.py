@@ -5,7 +5,7 @@ import shutil
 import string
 import time
 from datetime import datetime
-from typing import Union
+from typing import Optional, Union
 from colorama import Fore, Style
 
 
@@ -32,6 +32,13 @@ def get_timestamp(length: int) -> int:
         return int(time.time())
 
 
+# 拼接夸克网盘接口地址；base_url 为空时读取环境变量 QUARK_BASE_URL，
+# 设置后所有域名都替换为该地址（例如指向本地模拟服务 http://127.0.0.1:9000）
+def quark_url(path: str, host: str = 'drive-pc.quark.cn', base_url: Optional[str] = None) -> str:
+    base_url = base_url or os.environ.get('QUARK_BASE_URL')
+    return f'{base_url.rstrip("/")}{path}' if base_url else f'https://{host}{path}'
+
+
 def save_config(path: str, content: str, mode: str = 'w'):
     with open(path, mode, encoding='utf-8') as f:
         f.write(content)